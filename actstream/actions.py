@@ -4,7 +4,15 @@ from django.utils.translation import ugettext_lazy as _
 from django.utils.six import text_type
 
 from mongoengine.base import get_document
-
+from mongoengine.errors import NotUniqueError
+
+from actstream import recency
+from actstream import rollups
+from actstream import schemas
+from actstream import settings as actstream_settings
+from actstream import unread
+from actstream.audience import tokens
+from actstream.backends import get_backend
 from actstream.signals import action
 from actstream.registry import check
 
@@ -37,10 +45,7 @@ def follow(user, obj, send_action=True, actor_only=True, **kwargs):
     """
     check(obj)
 
-    instance = get_document('actstream.Follow').objects(
-        user=user, follow_object=obj, actor_only=actor_only).modify(
-        new=True, upsert=True, set__user=user, set__follow_object=obj,
-        set__actor_only=actor_only)
+    instance, created = get_backend().upsert_follow(user, obj, actor_only)
     if send_action:
         action.send(user, verb=_('started following'), target=obj, **kwargs)
     return instance
@@ -58,9 +63,7 @@ def unfollow(user, obj, send_action=False):
         unfollow(request.user, other_user)
     """
     check(obj)
-    get_document('actstream.Follow').objects.filter(
-        user=user, follow_object=obj
-    ).delete()
+    get_backend().delete_follow(user, obj)
     if send_action:
         action.send(user, verb=_('stopped following'), target=obj)
 
@@ -69,24 +72,36 @@ def is_following(user, obj):
     """
     Checks if a "follow" relationship exists.
 
-    Returns True if exists, False otherwise.
+    Returns True if exists, False otherwise. With
+    ``ACTSTREAM_SETTINGS['FOLLOW_FILTER_SIZE']`` set, follows made by other
+    processes may be reported missing for up to ``FOLLOW_FILTER_TTL``
+    seconds.
 
     Example::
 
         is_following(request.user, group)
     """
     check(obj)
-    return get_document('actstream.Follow').objects.filter(
-        user=user, follow_object=obj
-    ).exists()
+    return get_backend().is_following(user, obj)
 
 
 def action_handler(verb, **kwargs):
     """
     Handler function to create Action instance upon action signal call.
+
+    Pass ``idempotency_key`` to make retried sends of the same action return
+    the stored action instead of inserting it again. Pass ``audience`` to
+    restrict the action to viewers holding one of its tokens, see
+    ``actstream.audience``. Extra keyword arguments are stored in ``data``,
+    coerced by the schema of the verb if it has one (see
+    ``actstream.schemas``). Verbs listed in
+    ``ACTSTREAM_SETTINGS['COALESCE_VERBS']`` are coalesced with recent
+    identical actions by the storage backend.
     """
     kwargs.pop('signal', None)
     actor = kwargs.pop('sender')
+    idempotency_key = kwargs.pop('idempotency_key', None)
+    audience = kwargs.pop('audience', None)
 
     # We must store the unstranslated string
     # If verb is an ugettext_lazyed string, fetch the original string
@@ -96,9 +111,11 @@ def action_handler(verb, **kwargs):
     newaction = get_document('actstream.Action')(
         actor=actor,
         verb=text_type(verb),
-        public=bool(kwargs.pop('public', True)),
+        public=bool(kwargs.pop('public', audience is None)),
         description=kwargs.pop('description', None),
-        timestamp=kwargs.pop('timestamp', now())
+        timestamp=kwargs.pop('timestamp', now()),
+        idempotency_key=idempotency_key,
+        audience=tokens(audience or ())
     )
 
     for opt in ('target', 'action_object'):
@@ -107,6 +124,24 @@ def action_handler(verb, **kwargs):
             check(obj)
             setattr(newaction, opt, obj)
     if len(kwargs):
-        newaction.data = kwargs
-    newaction.save(force_insert=True)
-    return newaction
+        newaction.data = schemas.coerce(newaction.verb, kwargs)
+
+    backend = get_backend()
+    window = actstream_settings.COALESCE_VERBS.get(newaction.verb)
+    if window and idempotency_key is None:
+        stored = backend.coalesce_action(newaction, window)
+    else:
+        try:
+            backend.insert_action(newaction)
+        except NotUniqueError:
+            if idempotency_key is None:
+                raise
+            return backend.idempotent_action(idempotency_key)
+        stored = newaction
+    if actstream_settings.ROLLUPS:
+        rollups.record(newaction)
+    if actstream_settings.UNREAD_COUNTS:
+        unread.record(stored)
+    if actstream_settings.LAST_ACTIVITY:
+        recency.record(stored)
+    return stored
@@ -0,0 +1,162 @@
+"""
+Follow sets of users as adjacency lists.
+
+``Follow`` holds one document per follow, so loading everything a user
+follows reads as many documents as the user has follows. With
+``ACTSTREAM_SETTINGS['FOLLOW_ADJACENCY']`` on, the mongoengine backend also
+keeps the follow set of every user in ``FollowAdjacency`` documents of up to
+``CHUNK_SIZE`` compact ``{'c': class name, 'i': id, 'a': actor_only}``
+entries, updated by ``follow`` and ``unfollow``. ``user_stream``,
+``following`` and the follow filters of ``is_following`` then load a follow
+set with one query returning one or a few documents.
+
+``Follow`` stays the source of truth: ``rebuild()`` recomputes the adjacency
+documents from it, eg. when the feature is switched on for existing data or
+after follows were changed without going through the backend.
+"""
+from bson import DBRef, SON
+
+from mongoengine.base import get_document
+
+from actstream.registry import metadata
+from actstream.utils import db_field, ref_key
+
+# Entries per adjacency document
+CHUNK_SIZE = 5000
+
+BATCH_SIZE = 1000
+
+
+def _collection():
+    return get_document('actstream.FollowAdjacency')._get_collection()
+
+
+def entry(obj, actor_only):
+    cls_name, pk = ref_key(obj)
+    return {'c': cls_name, 'i': pk, 'a': bool(actor_only)}
+
+
+def add(user, obj, actor_only=True):
+    """
+    Adds obj to the follow set of user, or updates its ``actor_only`` flag.
+    """
+    item = entry(obj, actor_only)
+    match = {'$elemMatch': {'c': item['c'], 'i': item['i']}}
+    collection = _collection()
+    update = {'$set': {'entries.$.a': item['a']}}
+    if collection.update({'user': user.pk, 'entries': match}, update).get('n'):
+        return
+    # The push skips chunks a concurrent add pushed the entry to meanwhile
+    result = collection.update(
+        {'user': user.pk, 'size': {'$lt': CHUNK_SIZE},
+         'entries': {'$not': match}},
+        {'$push': {'entries': item}, '$inc': {'size': 1}})
+    if result.get('n'):
+        return
+    if collection.update({'user': user.pk, 'entries': match}, update).get('n'):
+        return
+    collection.insert({'user': user.pk, 'size': 1, 'entries': [item]})
+
+
+def remove(user, obj):
+    """
+    Removes obj from the follow set of user.
+    """
+    cls_name, pk = ref_key(obj)
+    _collection().update(
+        {'user': user.pk, 'entries': {'$elemMatch': {'c': cls_name, 'i': pk}}},
+        {'$pull': {'entries': {'c': cls_name, 'i': pk}}, '$inc': {'size': -1}})
+
+
+def forget(user):
+    """
+    Removes the follow set of a deleted user.
+    """
+    _collection().remove({'user': user.pk})
+
+
+def follow_set(user, *documents):
+    """
+    Returns ``(class name, id, actor_only)`` tuples of the objects followed
+    by user, of the classes documents if any are passed.
+    """
+    names = set(document._class_name for document in documents)
+    follows = []
+    for doc in _collection().find({'user': user.pk}, {'entries': 1}):
+        follows.extend((item['c'], item['i'], item['a'])
+                       for item in doc['entries']
+                       if not names or item['c'] in names)
+    return follows
+
+
+def collection_name(cls_name):
+    info = metadata(cls_name)
+    if info is not None:
+        return info.collection_name
+    return get_document(cls_name)._get_collection_name()
+
+
+def followed_refs(user, *documents):
+    """
+    Returns ``(raw reference, actor_only)`` tuples of the objects followed
+    by user, as stored by ``Follow.follow_object``.
+    """
+    return [(SON((('_cls', cls_name),
+                  ('_ref', DBRef(collection_name(cls_name), pk)))),
+             actor_only)
+            for cls_name, pk, actor_only in follow_set(user, *documents)]
+
+
+def _write(collection, user_id, items):
+    for start in range(0, len(items), CHUNK_SIZE):
+        chunk = items[start:start + CHUNK_SIZE]
+        collection.insert({'user': user_id, 'size': len(chunk),
+                           'entries': chunk})
+
+
+def _rebuild_collection():
+    """
+    Returns an empty collection with the indexes of ``FollowAdjacency``.
+    """
+    FollowAdjacency = get_document('actstream.FollowAdjacency')
+    collection = _collection()
+    rebuilt = collection.database['%s_rebuild' % collection.name]
+    rebuilt.drop()
+    for spec in FollowAdjacency._meta['index_specs']:
+        options = dict(spec)
+        fields = options.pop('fields')
+        options.pop('cls', None)
+        options.pop('types', None)
+        rebuilt.ensure_index(fields, **options)
+    return rebuilt
+
+
+def rebuild():
+    """
+    Recomputes the follow sets of all users from the ``Follow`` collection.
+
+    The follow sets are written to a temporary collection renamed over the
+    ``FollowAdjacency`` collection once complete, so readers keep seeing the
+    previous follow sets meanwhile. Follows changed during the rebuild may
+    be missing from it.
+    """
+    Follow = get_document('actstream.Follow')
+    user = db_field(Follow, 'user')
+    follow_object = db_field(Follow, 'follow_object')
+    actor_only = db_field(Follow, 'actor_only')
+    collection = _rebuild_collection()
+    cursor = Follow._get_collection().find(
+        {}, {user: 1, follow_object: 1, actor_only: 1}
+    ).sort(user, 1).batch_size(BATCH_SIZE)
+    current, items = None, []
+    for follow in cursor:
+        user_id = getattr(follow[user], 'id', follow[user])
+        if user_id != current:
+            if items:
+                _write(collection, current, items)
+            current, items = user_id, []
+        items.append(entry(follow[follow_object],
+                           follow.get(actor_only, True)))
+    if items:
+        _write(collection, current, items)
+    collection.rename(_collection().name, dropTarget=True)
@@ -0,0 +1,189 @@
+from __future__ import unicode_literals
+
+from datetime import datetime
+
+from django.utils.encoding import python_2_unicode_compatible
+from django.utils.translation import ugettext as _
+
+from mongoengine.base import get_document
+
+from actstream import partitions
+from actstream import settings as actstream_settings
+from actstream.utils import bulk_dereference, db_field, ref_key
+
+EPOCH = datetime(1970, 1, 1)
+
+# Partitions start at midnight, groups of windows dividing a day never
+# straddle two partitions
+DAY = 86400
+
+
+@python_2_unicode_compatible
+class ActionGroup(object):
+    """
+    A run of similar actions (same verb on the same target within one time
+    window) collapsed by ``aggregate_actions``.
+
+    ``actors`` only holds a sample of the most recently active actors,
+    ``actor_count`` is the number of distinct actors in the group and
+    ``count`` the number of actions.
+    """
+
+    def __init__(self, verb, target, actors, actor_count, count, timestamp,
+                 first_timestamp, action_id):
+        self.verb = verb
+        self.target = target
+        self.actors = actors
+        self.actor_count = actor_count
+        self.count = count
+        self.timestamp = timestamp
+        self.first_timestamp = first_timestamp
+        self.action_id = action_id
+
+    def __str__(self):
+        ctx = {
+            'actor': self.actors[0] if self.actors else '',
+            'others': self.actor_count - 1,
+            'verb': self.verb,
+            'target': self.target,
+        }
+        if self.actor_count == 2:
+            if self.target:
+                return _('%(actor)s and 1 other %(verb)s %(target)s') % ctx
+            return _('%(actor)s and 1 other %(verb)s') % ctx
+        if self.actor_count > 1:
+            if self.target:
+                return _('%(actor)s and %(others)d others %(verb)s %(target)s') % ctx
+            return _('%(actor)s and %(others)d others %(verb)s') % ctx
+        if self.target:
+            return _('%(actor)s %(verb)s %(target)s') % ctx
+        return _('%(actor)s %(verb)s') % ctx
+
+    def __repr__(self):
+        return '<ActionGroup: %s (%d)>' % (self.verb, self.count)
+
+
+def aggregate_actions(queryset, window=3600, samples=3, offset=0, limit=20):
+    """
+    Groups the actions matched by queryset by verb, target and ``window``
+    seconds wide time buckets inside MongoDB.
+
+    Returns a list of at most ``limit`` ``ActionGroup`` items, most recent
+    first, with up to ``samples`` dereferenced actors each, most recently
+    active first.
+    """
+    if getattr(queryset, '_none', False):
+        return []
+    Action = get_document('actstream.Action')
+    verb, target, actor, timestamp = [
+        '$' + db_field(Action, name)
+        for name in ('verb', 'target', 'actor', 'timestamp')]
+
+    age = {'$subtract': [timestamp, EPOCH]}
+    # Actions are grouped per actor first so that the groups push their
+    # distinct actors most recently active first
+    pipeline = [
+        {'$sort': {timestamp[1:]: -1}},
+        {'$group': {
+            '_id': {
+                'verb': verb,
+                'target': target,
+                'bucket': {'$subtract': [age, {'$mod': [age, window * 1000]}]},
+                'actor': actor,
+            },
+            'count': {'$sum': 1},
+            'timestamp': {'$max': timestamp},
+            'first_timestamp': {'$min': timestamp},
+            'action_id': {'$first': '$_id'},
+        }},
+        {'$sort': {'timestamp': -1}},
+        {'$group': {
+            '_id': {
+                'verb': '$_id.verb',
+                'target': '$_id.target',
+                'bucket': '$_id.bucket',
+            },
+            'count': {'$sum': '$count'},
+            'actors': {'$push': '$_id.actor'},
+            'timestamp': {'$max': '$timestamp'},
+            'first_timestamp': {'$min': '$first_timestamp'},
+            'action_id': {'$first': '$action_id'},
+        }},
+        {'$sort': {'timestamp': -1}},
+    ]
+    if actstream_settings.PARTITION_ACTIONS:
+        rows = partitioned_rows(queryset, pipeline, window, offset, limit)
+        for row in rows:
+            row['actor_count'] = len(row['actors'])
+            row['actors'] = row['actors'][:samples]
+    else:
+        if offset:
+            pipeline.append({'$skip': offset})
+        if limit:
+            pipeline.append({'$limit': limit})
+        pipeline.append({'$project': {
+            'count': 1,
+            'timestamp': 1,
+            'first_timestamp': 1,
+            'action_id': 1,
+            'actor_count': {'$size': '$actors'},
+            'actors': {'$slice': ['$actors', samples]},
+        }})
+        rows = list(queryset.aggregate(*pipeline))
+
+    refs = []
+    for row in rows:
+        refs.extend(row['actors'])
+        refs.append(row['_id'].get('target'))
+    resolved = bulk_dereference(refs)
+
+    to_verb = Action._fields['verb'].to_python
+    groups = []
+    for row in rows:
+        actors = [resolved[ref_key(ref)] for ref in row['actors']
+                  if ref_key(ref) in resolved]
+        groups.append(ActionGroup(
+            verb=to_verb(row['_id']['verb']),
+            target=resolved.get(ref_key(row['_id'].get('target'))),
+            actors=actors,
+            actor_count=row['actor_count'],
+            count=row['count'],
+            timestamp=row['timestamp'],
+            first_timestamp=row['first_timestamp'],
+            action_id=row['action_id'],
+        ))
+    return groups
+
+
+def partitioned_rows(queryset, pipeline, window, offset, limit):
+    """
+    Runs pipeline over the partitions of queryset, newest first, and merges
+    the groups of a time bucket straddling two partitions, keeping their
+    actors most recently active first.
+    """
+    straddles = DAY % window != 0
+    if limit and not straddles:
+        pipeline = pipeline + [{'$limit': offset + limit}]
+    groups = {}
+    for qs in partitions.action_querysets(queryset):
+        if limit and not straddles and len(groups) >= offset + limit:
+            break
+        for row in qs.aggregate(*pipeline):
+            key = (row['_id']['verb'], ref_key(row['_id'].get('target')),
+                   row['_id']['bucket'])
+            merged = groups.get(key)
+            if merged is None:
+                groups[key] = row
+                continue
+            merged['count'] += row['count']
+            keys = set(ref_key(ref) for ref in merged['actors'])
+            merged['actors'].extend(ref for ref in row['actors']
+                                    if ref_key(ref) not in keys)
+            merged['first_timestamp'] = min(merged['first_timestamp'],
+                                            row['first_timestamp'])
+            if row['timestamp'] > merged['timestamp']:
+                merged['timestamp'] = row['timestamp']
+                merged['action_id'] = row['action_id']
+    rows = sorted(groups.values(), key=lambda row: row['timestamp'],
+                  reverse=True)
+    return rows[offset:offset + limit if limit else None]
@@ -0,0 +1,71 @@
+"""
+Audience restricted actions.
+
+Actions sent with an ``audience`` are only shown to viewers holding one of
+its tokens. Tokens are strings, eg. ``"team:42"`` or ``"role:staff"``;
+documents passed as tokens are turned into ``"ClassName:id"`` strings::
+
+    action.send(request.user, verb='shared', target=report,
+                audience=[team_token, manager])
+
+Such actions are not public unless ``public=True`` is passed as well. Streams
+take a ``_viewer`` option to include the non-public actions the viewer may
+see; the filtering happens in the query, so pages keep their size::
+
+    actor_stream(user, _viewer=request.user)
+
+The tokens of a viewer come from the function named by
+``ACTSTREAM_SETTINGS['AUDIENCE_TOKENS']``, which by default only returns the
+viewer's own token.
+"""
+from django.utils.six import string_types, text_type
+
+from actstream import settings as actstream_settings
+from actstream.utils import ref_string
+
+
+def token(value):
+    """
+    Returns the audience token of a string or document.
+    """
+    if isinstance(value, string_types):
+        return text_type(value)
+    return ref_string(value)
+
+
+def tokens(values):
+    return [token(value) for value in values]
+
+
+def user_tokens(viewer):
+    """
+    Default ``AUDIENCE_TOKENS`` function, returns the token of the viewer
+    itself.
+    """
+    if viewer is None or not getattr(viewer, 'pk', None):
+        return []
+    return [token(viewer)]
+
+
+def viewer_tokens(viewer):
+    """
+    Returns the audience tokens of viewer.
+    """
+    return tokens(actstream_settings.get_audience_tokens()(viewer))
+
+
+def viewer_option(kwargs):
+    """
+    Replaces the ``_viewer`` stream option in kwargs with the ``_audience``
+    option of ``ActionQuerySet.public``.
+    """
+    if '_viewer' in kwargs:
+        kwargs['_audience'] = viewer_tokens(kwargs.pop('_viewer'))
+    return kwargs
+
+
+def visible(action, audience):
+    """
+    Returns True if action is public or shares a token with audience.
+    """
+    return action.public or bool(set(action.audience or ()) & set(audience or ()))
@@ -0,0 +1,117 @@
+"""
+Storage backends.
+
+Everything ``actstream.actions`` and the stream accessors of
+``actstream.models`` store or query goes through the backend configured with
+``ACTSTREAM_SETTINGS['BACKEND']``. ``MongoEngineBackend`` is the default and
+``InMemoryBackend`` keeps everything in process for tests and benchmarks.
+"""
+from actstream import settings as actstream_settings
+
+
+class BaseBackend(object):
+    """
+    Interface of a storage backend.
+
+    Stream methods take the same arguments as the builtin streams of
+    ``actstream.managers.ActionQuerySet``, including ``_offset`` and
+    ``_limit``, and return a list of actions, most recent first.
+    """
+
+    def insert_action(self, action):
+        """
+        Stores a new action. Raises ``mongoengine.errors.NotUniqueError``
+        if its ``idempotency_key`` is already taken.
+        """
+        raise NotImplementedError
+
+    def idempotent_action(self, key):
+        """
+        Returns the action stored with ``idempotency_key`` key.
+        """
+        raise NotImplementedError
+
+    def coalesce_action(self, action, window):
+        """
+        Stores action or folds it into an identical action recorded in the
+        last ``window`` seconds. Returns the stored action.
+        """
+        raise NotImplementedError
+
+    def upsert_follow(self, user, obj, actor_only):
+        """
+        Creates or updates the follow of obj by user.
+        Returns a ``(follow, created)`` tuple.
+        """
+        raise NotImplementedError
+
+    def delete_follow(self, user, obj):
+        """
+        Removes the follow of obj by user. Returns the number of follows
+        removed.
+        """
+        raise NotImplementedError
+
+    def is_following(self, user, obj):
+        raise NotImplementedError
+
+    def followers(self, obj):
+        raise NotImplementedError
+
+    def following(self, user, *documents):
+        raise NotImplementedError
+
+    def actor_stream(self, obj, **kwargs):
+        raise NotImplementedError
+
+    def target_stream(self, obj, **kwargs):
+        raise NotImplementedError
+
+    def action_object_stream(self, obj, **kwargs):
+        raise NotImplementedError
+
+    def document_stream(self, document, **kwargs):
+        raise NotImplementedError
+
+    def any_stream(self, obj, **kwargs):
+        raise NotImplementedError
+
+    def user_stream(self, obj, **kwargs):
+        raise NotImplementedError
+
+    def count_stream(self, name, obj, cap=None, **kwargs):
+        """
+        Counts the actions of the stream called name (``actor``, ``target``,
+        ``action_object``, ``document``, ``any`` or ``user``) of obj, up to
+        cap actions if cap is set. Returns a ``(count, exact)`` tuple.
+
+        The default implementation reads the stream.
+        """
+        stream = getattr(self, '%s_stream' % name)
+        count = len(stream(obj, _limit=None if cap is None else cap + 1,
+                           **kwargs))
+        if cap is not None and count > cap:
+            return cap, False
+        return count, True
+
+
+_backend = None
+
+
+def get_backend():
+    """
+    Returns the configured backend instance.
+    """
+    global _backend
+    if _backend is None:
+        _backend = actstream_settings.get_backend_class()()
+    return _backend
+
+
+def set_backend(backend):
+    """
+    Replaces the backend instance, eg. with an ``InMemoryBackend`` in tests.
+    Pass ``None`` to go back to the configured one.
+    """
+    global _backend
+    _backend = backend
@@ -0,0 +1,263 @@
+"""
+In-process storage backend.
+
+Actions are kept in sorted per-object timelines and follows in adjacency maps
+so streams are served without a database, eg. in tests or CPU-only
+benchmarks::
+
+    from actstream.backends import set_backend
+    from actstream.backends.memory import InMemoryBackend
+
+    set_backend(InMemoryBackend())
+
+Documents (actors, targets, users...) are never saved, but they need a
+primary key. Stream filters support exact, ``in``, ``nin``, ``gt``, ``gte``,
+``lt`` and ``lte`` lookups on action fields.
+"""
+import heapq
+from bisect import bisect_left, insort
+from datetime import timedelta
+from itertools import count, islice
+from threading import RLock
+
+from bson import ObjectId
+
+from mongoengine.base import get_document
+from mongoengine.errors import NotUniqueError
+
+from actstream.audience import viewer_option, visible
+from actstream.backends import BaseBackend
+from actstream.registry import check
+from actstream.schemas import data_filters
+from actstream.utils import ref_key
+
+ROLES = ('actor', 'target', 'action_object')
+
+LOOKUPS = {
+    'exact': lambda value, arg: value == arg,
+    'in': lambda value, arg: value in arg,
+    'nin': lambda value, arg: value not in arg,
+    'gt': lambda value, arg: value is not None and value > arg,
+    'gte': lambda value, arg: value is not None and value >= arg,
+    'lt': lambda value, arg: value is not None and value < arg,
+    'lte': lambda value, arg: value is not None and value <= arg,
+}
+
+
+class Newest(object):
+    """
+    Heap item ordering timeline entries newest first.
+    """
+    __slots__ = ('entry', 'timeline', 'index')
+
+    def __init__(self, entry, timeline, index):
+        self.entry, self.timeline, self.index = entry, timeline, index
+
+    def __lt__(self, other):
+        return self.entry > other.entry
+
+
+def newest_first(timelines):
+    """
+    Merges ascending timelines into one stream of entries, newest first.
+    """
+    heap = []
+    for timeline in timelines:
+        if timeline:
+            heap.append(Newest(timeline[-1], timeline, len(timeline) - 1))
+    heapq.heapify(heap)
+    while heap:
+        item = heap[0]
+        yield item.entry
+        if item.index:
+            item.index -= 1
+            item.entry = item.timeline[item.index]
+            heapq.heapreplace(heap, item)
+        else:
+            heapq.heappop(heap)
+
+
+def matches(action, filters):
+    for lookup, arg in filters.items():
+        name, _, op = lookup.partition('__')
+        value = getattr(action, name)
+        if name == 'data':
+            field, _, op = op.partition('__')
+            value = (value or {}).get(field)
+        if not LOOKUPS[op or 'exact'](value, arg):
+            return False
+    return True
+
+
+class InMemoryBackend(BaseBackend):
+    """
+    Keeps actions and follows in process.
+
+    Every action is indexed by ``(timestamp, sequence, id)`` entries in a
+    sorted timeline per ``(role, object)`` and per document class. Follows
+    are kept in two adjacency maps, one per direction.
+    """
+
+    def __init__(self):
+        self.lock = RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.actions = {}
+            self.entries = {}
+            self.timelines = {}
+            self.class_timelines = {}
+            self.idempotency_keys = {}
+            self.following_map = {}
+            self.followers_map = {}
+            self.sequence = count()
+
+    def index(self, action):
+        entry = (action.timestamp, next(self.sequence), action.pk)
+        self.entries[action.pk] = entry
+        for timeline in self.action_timelines(action):
+            insort(timeline, entry)
+
+    def unindex(self, action):
+        entry = self.entries.pop(action.pk)
+        for timeline in self.action_timelines(action):
+            del timeline[bisect_left(timeline, entry)]
+
+    def action_timelines(self, action):
+        classes = set()
+        for role in ROLES:
+            value = getattr(action, role)
+            if value is None:
+                continue
+            key = ref_key(value)
+            yield self.timelines.setdefault((role, key), [])
+            if key[0] not in classes:
+                classes.add(key[0])
+                yield self.class_timelines.setdefault(key[0], [])
+
+    def insert_action(self, action):
+        with self.lock:
+            key = action.idempotency_key
+            if key is not None and key in self.idempotency_keys:
+                raise NotUniqueError('Duplicate idempotency_key %r' % key)
+            if action.pk is None:
+                action.pk = ObjectId()
+            if key is not None:
+                self.idempotency_keys[key] = action.pk
+            self.actions[action.pk] = action
+            self.index(action)
+        return action
+
+    def idempotent_action(self, key):
+        return self.actions[self.idempotency_keys[key]]
+
+    def coalesce_action(self, action, window):
+        since = action.timestamp - timedelta(seconds=window)
+        with self.lock:
+            timeline = self.timelines.get(('actor', ref_key(action.actor)), [])
+            for timestamp, _, pk in reversed(timeline):
+                if timestamp < since:
+                    break
+                existing = self.actions[pk]
+                if (existing.verb == action.verb and
+                        existing.target == action.target and
+                        existing.action_object == action.action_object):
+                    self.unindex(existing)
+                    existing.occurrences += 1
+                    existing.timestamp = action.timestamp
+                    self.index(existing)
+                    return existing
+            return self.insert_action(action)
+
+    def upsert_follow(self, user, obj, actor_only):
+        user_key, obj_key = ref_key(user), ref_key(obj)
+        with self.lock:
+            following = self.following_map.setdefault(user_key, {})
+            instance = following.get(obj_key)
+            if instance is not None:
+                instance.actor_only = actor_only
+                return instance, False
+            instance = get_document('actstream.Follow')(
+                user=user, follow_object=obj, actor_only=actor_only)
+            following[obj_key] = instance
+            self.followers_map.setdefault(obj_key, {})[user_key] = instance
+        return instance, True
+
+    def delete_follow(self, user, obj):
+        user_key, obj_key = ref_key(user), ref_key(obj)
+        with self.lock:
+            instance = self.following_map.get(user_key, {}).pop(obj_key, None)
+            self.followers_map.get(obj_key, {}).pop(user_key, None)
+        return int(instance is not None)
+
+    def is_following(self, user, obj):
+        return ref_key(obj) in self.following_map.get(ref_key(user), {})
+
+    def followers(self, obj):
+        check(obj)
+        follows = self.followers_map.get(ref_key(obj), {}).values()
+        return [follow.user for follow in sorted(follows, key=lambda f: f.started)]
+
+    def following(self, user, *documents):
+        names = set()
+        for document in documents:
+            check(document)
+            names.add(document._class_name)
+        follows = self.following_map.get(ref_key(user), {}).values()
+        return [follow.follow_object
+                for follow in sorted(follows, key=lambda f: f.started)
+                if not names or follow.follow_object._class_name in names]
+
+    def page(self, timelines, kwargs):
+        offset, limit = kwargs.pop('_offset', None), kwargs.pop('_limit', None)
+        audience = data_filters(viewer_option(kwargs)).pop('_audience', None)
+
+        def actions():
+            seen = set()
+            for entry in newest_first(timelines):
+                pk = entry[2]
+                if pk in seen:
+                    continue
+                seen.add(pk)
+                action = self.actions[pk]
+                if visible(action, audience) and matches(action, kwargs):
+                    yield action
+        with self.lock:
+            return list(islice(actions(), offset or 0, limit))
+
+    def role_timelines(self, obj, *roles):
+        check(obj)
+        key = ref_key(obj)
+        return [self.timelines.get((role, key), []) for role in roles]
+
+    def actor_stream(self, obj, **kwargs):
+        return self.page(self.role_timelines(obj, 'actor'), kwargs)
+
+    def target_stream(self, obj, **kwargs):
+        return self.page(self.role_timelines(obj, 'target'), kwargs)
+
+    def action_object_stream(self, obj, **kwargs):
+        return self.page(self.role_timelines(obj, 'action_object'), kwargs)
+
+    def any_stream(self, obj, **kwargs):
+        return self.page(self.role_timelines(obj, *ROLES), kwargs)
+
+    def document_stream(self, document, **kwargs):
+        check(document)
+        return self.page([self.class_timelines.get(document._class_name, [])],
+                         kwargs)
+
+    def user_stream(self, obj, **kwargs):
+        if not obj:
+            return []
+        check(obj)
+        timelines = []
+        if kwargs.pop('with_user_activity', False):
+            timelines.append(self.timelines.get(('actor', ref_key(obj)), []))
+        for key, follow in self.following_map.get(ref_key(obj), {}).items():
+            roles = ('actor',) if follow.actor_only else ROLES
+            timelines.extend(self.timelines.get((role, key), []) for role in roles)
+        if not timelines:
+            return []
+        return self.page(timelines, kwargs)
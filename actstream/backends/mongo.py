@@ -0,0 +1,196 @@
+from datetime import timedelta
+
+from mongoengine.base import get_document
+from mongoengine.errors import NotUniqueError
+
+from actstream import adjacency
+from actstream import hybrid
+from actstream import indexes
+from actstream import partitions
+from actstream.membership import follow_filters
+from actstream import pagination
+from actstream import recommendations
+from actstream import schemas
+from actstream.slowlog import timed
+from actstream import settings as actstream_settings
+from actstream.backends import BaseBackend
+from actstream.registry import check
+from actstream.utils import bulk_dereference, ref_key
+
+
+class MongoEngineBackend(BaseBackend):
+    """
+    Stores actions and follows with mongoengine. Streams are served by the
+    ``Action`` manager so custom managers keep working.
+    """
+
+    @property
+    def Action(self):
+        return get_document('actstream.Action')
+
+    @property
+    def Follow(self):
+        return get_document('actstream.Follow')
+
+    def insert_action(self, action):
+        schemas.ensure_indexes(action.verb)
+        if action.idempotency_key is not None:
+            indexes.check_unique(self.Action, partitions.partition_collection(
+                partitions.partition_name(action.timestamp))
+                if actstream_settings.PARTITION_ACTIONS else None)
+        if actstream_settings.PARTITION_ACTIONS:
+            partitions.insert(action)
+        else:
+            action.save(force_insert=True)
+        if actstream_settings.HYBRID_FEED:
+            hybrid.fan_out(action)
+        return action
+
+    def idempotent_action(self, key):
+        if actstream_settings.PARTITION_ACTIONS:
+            return partitions.route(
+                self.Action.objects(idempotency_key=key), limit=1)[0]
+        return self.Action.objects.get(idempotency_key=key)
+
+    def coalesce_action(self, action, window):
+        """
+        Saves action, or folds it into an action with the same actor, verb,
+        target and action_object recorded in the last ``window`` seconds by
+        bumping its ``occurrences`` and ``timestamp``.
+
+        Both cases are a single upsert. No unique index can guard a time
+        window, so sends racing each other before any matching action is
+        stored may each insert one and leave a few uncoalesced duplicates.
+        """
+        schemas.ensure_indexes(action.verb)
+        doc = action.to_mongo()
+        Action = action.__class__
+        timestamp = Action._fields['timestamp'].db_field
+        occurrences = Action._fields['occurrences'].db_field
+        query = dict((name, getattr(action, name))
+                     for name in ('actor', 'verb', 'target', 'action_object'))
+        on_insert = dict((field, value) for field, value in doc.items()
+                         if field not in (timestamp, occurrences, '_id') and
+                         Action._reverse_db_field_map.get(field) not in query)
+        if actstream_settings.PARTITION_ACTIONS:
+            objects = partitions.queryset_for(
+                partitions.partition_name(action.timestamp))
+        else:
+            objects = Action.objects
+        stored = objects(
+            timestamp__gte=action.timestamp - timedelta(seconds=window),
+            **query
+        ).modify(upsert=True, new=True, __raw__={
+            '$inc': {occurrences: 1},
+            '$set': {timestamp: doc[timestamp]},
+            '$setOnInsert': on_insert,
+        })
+        if actstream_settings.HYBRID_FEED:
+            hybrid.fan_out(stored)
+        return stored
+
+    def upsert_follow(self, user, obj, actor_only):
+        indexes.check_unique(self.Follow)
+        instance = self.Follow(user=user, follow_object=obj,
+                               actor_only=actor_only)
+        try:
+            instance.save(force_insert=True)
+        except NotUniqueError:
+            instance = self.Follow.objects(user=user, follow_object=obj).modify(
+                set__actor_only=actor_only)
+            if instance is None:
+                return instance, False
+            changed = instance.actor_only != actor_only
+            instance.actor_only = actor_only
+            if actstream_settings.FOLLOW_ADJACENCY:
+                adjacency.add(user, obj, actor_only)
+            if changed and actstream_settings.HYBRID_FEED:
+                hybrid.followed(user, obj, actor_only, created=False)
+            return instance, False
+        if actstream_settings.FOLLOW_ADJACENCY:
+            adjacency.add(user, obj, actor_only)
+        if actstream_settings.HYBRID_FEED:
+            hybrid.followed(user, obj, actor_only)
+        if actstream_settings.SUGGESTION_CACHE_TTL:
+            recommendations.followed(user, obj)
+        if actstream_settings.FOLLOW_FILTER_SIZE:
+            follow_filters.followed(user, obj)
+        return instance, True
+
+    def delete_follow(self, user, obj):
+        deleted = self.Follow.objects.filter(
+            user=user, follow_object=obj).delete()
+        if deleted and actstream_settings.FOLLOW_ADJACENCY:
+            adjacency.remove(user, obj)
+        if deleted and actstream_settings.HYBRID_FEED:
+            hybrid.unfollowed(user, obj)
+        if deleted and actstream_settings.SUGGESTION_CACHE_TTL:
+            recommendations.unfollowed(user, obj)
+        if deleted and actstream_settings.FOLLOW_FILTER_SIZE:
+            follow_filters.unfollowed(user, obj)
+        return deleted
+
+    def is_following(self, user, obj):
+        if actstream_settings.FOLLOW_FILTER_SIZE and user.pk is not None:
+            if not follow_filters.might_follow(user, obj):
+                return False
+            following = self.follow_exists(user, obj)
+            if not following:
+                follow_filters.false_positive()
+            return following
+        return self.follow_exists(user, obj)
+
+    def follow_exists(self, user, obj):
+        queryset = self.Follow.objects.filter(user=user, follow_object=obj)
+        with timed('is_following', queryset, 1):
+            return queryset.exists()
+
+    def followers(self, obj):
+        if not actstream_settings.SLOW_STREAM_LOG:
+            return self.Follow.objects.followers(obj)
+        with timed('followers', self.Follow.objects.for_object(obj)):
+            return self.Follow.objects.followers(obj)
+
+    def following(self, user, *documents):
+        if actstream_settings.FOLLOW_ADJACENCY:
+            for document in documents:
+                check(document)
+            refs = [ref for ref, actor_only in
+                    adjacency.followed_refs(user, *documents)]
+            resolved = bulk_dereference(refs)
+            return [resolved[ref_key(ref)] for ref in refs
+                    if ref_key(ref) in resolved]
+        queryset = self.Follow.objects.follows_of(user, *documents)
+        with timed('following', queryset):
+            return [follow.follow_object for follow in queryset.select_related()]
+
+    def actor_stream(self, obj, **kwargs):
+        return self.Action.objects.actor(obj, **kwargs)
+
+    def target_stream(self, obj, **kwargs):
+        return self.Action.objects.target(obj, **kwargs)
+
+    def action_object_stream(self, obj, **kwargs):
+        return self.Action.objects.action_object(obj, **kwargs)
+
+    def document_stream(self, document, **kwargs):
+        return self.Action.objects.document_actions(document, **kwargs)
+
+    def any_stream(self, obj, **kwargs):
+        return self.Action.objects.any(obj, **kwargs)
+
+    def count_stream(self, name, obj, cap=None, **kwargs):
+        if name == 'user' and actstream_settings.HYBRID_FEED:
+            return super(MongoEngineBackend, self).count_stream(
+                name, obj, cap, **kwargs)
+        queryset = self.Action.objects.stream_queryset(
+            pagination.QUERYSET_METHODS[name], obj, **kwargs)
+        if cap is not None:
+            return pagination.capped_count(queryset, cap)
+        return sum(qs.count() for qs in
+                   partitions.action_querysets(queryset)), True
+
+    def user_stream(self, obj, **kwargs):
+        if actstream_settings.HYBRID_FEED:
+            return hybrid.user_stream(obj, **kwargs)
+        return self.Action.objects.user(obj, **kwargs)
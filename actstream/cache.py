@@ -0,0 +1,112 @@
+"""
+Process-local cache of dereferenced generic references.
+
+Hot actors and targets show up on nearly every stream page, so with
+``ACTSTREAM_SETTINGS['REFERENCE_CACHE_SIZE']`` set the documents behind
+``Action.actor``, ``target`` and ``action_object`` are kept in a bounded LRU
+cache keyed by ``(class name, id)``. Entries expire after
+``REFERENCE_CACHE_TTL`` seconds and are dropped when a registered document
+is saved or deleted in this process.
+
+Documents are cached as encoded BSON and rebuilt on every lookup, so each
+request gets its own instances and changes made to one never leak into the
+cache or into other requests.
+"""
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+from bson import BSON
+from mongoengine.base import get_document
+
+from actstream import settings as actstream_settings
+
+
+class LRUCache(object):
+    """
+    A thread safe least recently used cache with an optional time to live
+    and hit/miss statistics.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = Lock()
+        self.data = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value, expires = self.data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires < time():
+                self.misses += 1
+                return default
+            self.data[key] = value, expires
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if not self.maxsize:
+            return
+        expires = time() + self.ttl if self.ttl else None
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = value, expires
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Returns a dict of hit, miss and eviction counts and the current size.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': float(self.hits) / lookups if lookups else 0.0,
+                'size': len(self.data),
+                'maxsize': self.maxsize,
+            }
+
+reference_cache = LRUCache(actstream_settings.REFERENCE_CACHE_SIZE,
+                           actstream_settings.REFERENCE_CACHE_TTL)
+
+
+def cache_document(key, doc):
+    """
+    Stores doc in the reference cache under key, a ``(class name, id)`` pair.
+    """
+    reference_cache.set(key, BSON.encode(doc.to_mongo()))
+
+
+def cached_document(key):
+    """
+    Returns a new instance of the document cached under key or None.
+    """
+    raw = reference_cache.get(key)
+    if raw is None:
+        return None
+    return get_document(key[0])._from_son(BSON(raw).decode())
+
+
+def invalidate_reference(sender, document, **kwargs):
+    """
+    Signal handler dropping document from the reference cache.
+    """
+    reference_cache.delete((document._class_name, document.pk))
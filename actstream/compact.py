@@ -0,0 +1,66 @@
+"""
+Conversion of stored actions between the default and the compact encoding.
+
+The compact encoding (``ACTSTREAM_SETTINGS['COMPACT_ENCODING']``) stores
+actions with the short field names of ``actstream.models.COMPACT_FIELDS``,
+verbs as codes from ``actstream.verbs`` and ``public`` as a bit of a flags
+field. ``Action`` attributes stay the same in both encodings.
+
+Existing actions are converted in place with::
+
+    python manage.py actstream_compact_actions
+"""
+from actstream.verbs import verbs
+
+PUBLIC_FLAG = 1
+
+
+def compact_document(doc):
+    """
+    Returns the compact encoding of a raw action document.
+    """
+    from actstream.models import COMPACT_FIELDS
+
+    compacted = {}
+    for name, value in doc.items():
+        if name == 'verb':
+            value = verbs.code_for(value)
+        elif name == 'public':
+            value = PUBLIC_FLAG if value else 0
+        compacted[COMPACT_FIELDS.get(name, name)] = value
+    return compacted
+
+
+def expand_document(doc):
+    """
+    Returns the default encoding of a raw compact action document.
+    """
+    from actstream.models import COMPACT_FIELDS
+
+    names = dict((short, name) for name, short in COMPACT_FIELDS.items())
+    expanded = {}
+    for short, value in doc.items():
+        name = names.get(short, short)
+        if name == 'verb':
+            value = verbs.name_for(value)
+        elif name == 'public':
+            value = bool(value & PUBLIC_FLAG)
+        expanded[name] = value
+    return expanded
+
+
+def convert_actions(batch_size=1000, expand=False, workers=1):
+    """
+    Rewrites every action that is not yet in the wanted encoding with the
+    ``compact`` (or ``expand``) maintenance task, batch_size documents per
+    bulk operation.
+
+    Actions are matched on a field only the old encoding has, so an
+    interrupted run can simply be started again.
+
+    Returns the number of converted actions.
+    """
+    from actstream.maintenance import run
+
+    return run('expand' if expand else 'compact', workers=workers,
+               batch_size=batch_size, restart=True)[1]
@@ -1,5 +1,31 @@
 from functools import wraps
 
+from actstream import partitions
+from actstream.audience import viewer_option
+from actstream import settings as actstream_settings
+from actstream.cache import reference_cache
+from actstream.schemas import data_query
+from actstream.slowlog import timed
+from actstream.utils import dereference_actions
+
+
+def stream_queryset(manager, func, *args, **kwargs):
+    """
+    Calls a stream function and turns its result into a queryset of public
+    actions (and of the actions visible to the ``_viewer`` option), without
+    slicing or dereferencing it.
+    """
+    kwargs = viewer_option(kwargs)
+    data = data_query(kwargs)
+    qs = func(manager, *args, **kwargs)
+    if isinstance(qs, dict):
+        qs = manager.public(**qs)
+    elif isinstance(qs, (list, tuple)):
+        qs = manager.public(*qs)
+    if data is not None:
+        qs = qs.filter(data)
+    return qs
+
 
 def stream(func):
     """
@@ -19,12 +45,53 @@ def stream(func):
     @wraps(func)
     def wrapped(manager, *args, **kwargs):
         offset, limit = kwargs.pop('_offset', None), kwargs.pop('_limit', None)
-        qs = func(manager, *args, **kwargs)
-        if isinstance(qs, dict):
-            qs = manager.public(**qs)
-        elif isinstance(qs, (list, tuple)):
-            qs = manager.public(*qs)
+        qs = stream_queryset(manager, func, *args, **kwargs)
+        if actstream_settings.PARTITION_ACTIONS:
+            explained = qs
+            if actstream_settings.SLOW_STREAM_LOG:
+                explained = partitions.first_queryset(qs)[:limit]
+            with timed(func.__name__, explained, limit):
+                return dereference_actions(partitions.route(qs, offset, limit))
         if offset or limit:
             qs = qs[offset:limit]
-        return qs.select_related()
+        with timed(func.__name__, qs, limit):
+            if reference_cache.maxsize:
+                return dereference_actions(list(qs))
+            return qs.select_related()
+    wrapped.queryset_func = func
+    return wrapped
+
+
+def aggregated_stream(stream_method):
+    """
+    Builds an aggregated variant of a ``@stream`` method. Instead of a list
+    of actions, the returned method gives a page of
+    ``actstream.aggregation.ActionGroup`` items computed by MongoDB.
+
+    Accepts the same arguments as the wrapped stream (including ``_viewer``)
+    plus ``_window``
+    (seconds), ``_samples``, ``_offset`` and ``_limit``.
+
+    Syntax::
+
+        class MyManager(ActionManager):
+            @stream
+            def foobar(self, ...):
+                ...
+
+            foobar_aggregated = aggregated_stream(foobar)
+
+    """
+    func = stream_method.queryset_func
+
+    @wraps(func)
+    def wrapped(manager, *args, **kwargs):
+        from actstream.aggregation import aggregate_actions
+
+        options = {}
+        for option in ('window', 'samples', 'offset', 'limit'):
+            if '_%s' % option in kwargs:
+                options[option] = kwargs.pop('_%s' % option)
+        qs = stream_queryset(manager, func, *args, **kwargs)
+        return aggregate_actions(qs, **options)
     return wrapped
@@ -0,0 +1,183 @@
+"""
+Batch digests of the actions users missed during a time window.
+
+Instead of assembling ``user_stream`` once per user, ``build_digests`` walks
+the followed objects in chunks, each chunk in a worker process. A worker
+reads the public actions of the window involving the objects of its chunk,
+groups them by actor, target and action object, joins the groups against
+the ``Follow`` collection and adds the actions it finds for a user to the
+user's ``Digest`` document with bulk upserts.
+
+Example::
+
+    from actstream.digests import build_digests, digest
+
+    build_digests('2014-05-01', start, end, workers=8)
+    ...
+    actions = digest(user, '2014-05-01')
+
+or ``python manage.py actstream_digests 2014-05-01 --start ... --end ...``.
+"""
+from multiprocessing import Pool
+
+from mongoengine.base import get_document
+
+from actstream import partitions
+from actstream import settings as actstream_settings
+from actstream.utils import (db_field, dereference_actions, generic_ref,
+                             ref_key, reset_connections)
+
+ROLES = ('actor', 'target', 'action_object')
+
+BATCH_SIZE = 1000
+
+
+def followed_chunks(chunk_size):
+    """
+    Yields the raw references of all followed objects, chunk_size at a time.
+    """
+    Follow = get_document('actstream.Follow')
+    follow_object = db_field(Follow, 'follow_object')
+    cursor = Follow._get_collection().find({}, {follow_object: 1, '_id': 0}) \
+        .sort(follow_object, 1).batch_size(BATCH_SIZE)
+    chunk, last = [], None
+    for follow in cursor:
+        key = ref_key(follow[follow_object])
+        if key == last:
+            continue
+        last = key
+        chunk.append(generic_ref(follow[follow_object]))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def group_actions(refs, start, end):
+    """
+    Returns a dict mapping the ``ref_key`` of the objects of refs involved
+    in a public action between start and end to ``[raw reference, actions
+    as actor, actions as target or action object]``, actions being
+    ``(action id, timestamp)`` tuples.
+    """
+    Action = get_document('actstream.Action')
+    window = Action.objects.public(timestamp__gte=start, timestamp__lt=end)._query
+    timestamp = db_field(Action, 'timestamp')
+    fields = dict((role, db_field(Action, role)) for role in ROLES)
+    query = dict(window)
+    query['$or'] = [{field: {'$in': refs}} for field in fields.values()]
+    projection = dict((field, 1) for field in fields.values())
+    projection[timestamp] = 1
+    wanted = set(ref_key(ref) for ref in refs)
+    groups = {}
+    for collection in partitions.action_collections(window):
+        for doc in collection.find(query, projection).batch_size(BATCH_SIZE):
+            item = (doc['_id'], doc[timestamp])
+            for role, field in fields.items():
+                key = ref_key(doc.get(field))
+                if key not in wanted:
+                    continue
+                group = groups.setdefault(key, [generic_ref(doc[field]), [], []])
+                group[1 if role == 'actor' else 2].append(item)
+    return groups
+
+
+def write_digests(args):
+    """
+    Groups the actions of a chunk of followed objects, joins them against
+    their followers and adds the actions to the digests of the followers.
+    Returns the number of digests written to.
+    """
+    name, refs, start, end, per_user = args
+    groups = group_actions(refs, start, end)
+    if not groups:
+        return 0
+    Follow = get_document('actstream.Follow')
+    follow_object = db_field(Follow, 'follow_object')
+    user = db_field(Follow, 'user')
+    actor_only = db_field(Follow, 'actor_only')
+    items = {}
+    for follow in Follow._get_collection().find(
+            {follow_object: {'$in': [group[0] for group in groups.values()]}},
+            {user: 1, follow_object: 1, actor_only: 1}):
+        actor_items, other_items = groups[ref_key(follow[follow_object])][1:]
+        found = items.setdefault(follow[user], {})
+        found.update(actor_items)
+        if not follow.get(actor_only, True):
+            found.update(other_items)
+
+    # Other chunks may add the same actions: they are added to a set and
+    # the digest is trimmed to the per_user most recent ones after each add
+    collection = get_document('actstream.Digest')._get_collection()
+    bulk, pending = collection.initialize_ordered_bulk_op(), 0
+    for user_id, found in items.items():
+        recent = sorted(found.items(), key=lambda item: item[1],
+                        reverse=True)[:per_user]
+        selector = {'user': user_id, 'name': name}
+        bulk.find(selector).upsert().update_one({
+            '$addToSet': {'items': {
+                '$each': [{'action': action_id, 'timestamp': timestamp}
+                          for action_id, timestamp in recent],
+            }},
+        })
+        bulk.find(selector).update_one({
+            '$push': {'items': {
+                '$each': [],
+                '$sort': {'timestamp': -1},
+                '$slice': per_user,
+            }},
+        })
+        pending += 1
+        if pending >= BATCH_SIZE:
+            bulk.execute()
+            bulk, pending = collection.initialize_ordered_bulk_op(), 0
+    if pending:
+        bulk.execute()
+    return len(items)
+
+
+def build_digests(name, start, end, workers=1, chunk_size=500, per_user=50):
+    """
+    Builds the digests called name of the public actions between start and
+    end, keeping up to per_user recent actions for every user following one
+    of their actors (or targets and action objects, for follows that are not
+    ``actor_only``). chunk_size followed objects are joined at a time.
+
+    Returns the number of digests built.
+    """
+    jobs = ((name, refs, start, end, per_user)
+            for refs in followed_chunks(chunk_size))
+    Digest = get_document('actstream.Digest')
+    Digest.objects(name=name).delete()
+    if workers > 1:
+        pool = Pool(workers, reset_connections,
+                    (get_document('actstream.Action'),
+                     get_document('actstream.Follow'), Digest))
+        try:
+            list(pool.imap_unordered(write_digests, jobs))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for job in jobs:
+            write_digests(job)
+    return Digest.objects(name=name).count()
+
+
+def digest(user, name, limit=None):
+    """
+    Returns the actions of the digest called name of user, newest first.
+    """
+    doc = get_document('actstream.Digest')._get_collection().find_one(
+        {'user': user.pk, 'name': name})
+    if doc is None:
+        return []
+    ids = [item['action'] for item in doc['items']][:limit]
+    Action = get_document('actstream.Action')
+    if actstream_settings.PARTITION_ACTIONS:
+        actions = dict((action.pk, action) for action in
+                       partitions.route(Action.objects(id__in=ids)))
+    else:
+        actions = Action.objects.no_dereference().in_bulk(ids)
+    return dereference_actions([actions[pk] for pk in ids if pk in actions])
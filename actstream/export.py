@@ -0,0 +1,181 @@
+"""
+Streaming export and bulk import of actions and follows.
+
+Documents are read and written as raw BSON documents through pymongo, so
+nothing is dereferenced or cached and memory use does not grow with the
+collection. Two formats are supported: ``ndjson`` (one MongoDB extended JSON
+document per line) and ``bson`` (concatenated BSON documents, like
+``mongodump`` writes).
+
+Example::
+
+    from actstream.export import export_documents, import_documents
+
+    with open('actions.ndjson', 'w') as out:
+        export_documents(Action, out, start=last_month, verbs=['joined'])
+
+    with open('actions.ndjson') as source:
+        import_documents(Action, source)
+
+The ``actstream_export`` and ``actstream_import`` management commands wrap
+these functions.
+"""
+import io
+from multiprocessing import Pool
+
+from bson import BSON, decode_file_iter, json_util
+from pymongo.errors import BulkWriteError
+
+from django.utils.six import text_type
+
+from mongoengine.base import get_document
+
+from actstream import partitions
+from actstream.utils import id_range_query, reset_connections, split_id_range
+
+FORMATS = ('ndjson', 'bson')
+
+TIME_FIELDS = {
+    'Action': 'timestamp',
+    'Follow': 'started',
+}
+
+
+def export_query(document_class, start=None, end=None, verbs=None):
+    """
+    Returns the raw query selecting documents between start and end (and
+    with one of verbs, for actions).
+    """
+    qs = document_class.objects
+    time_field = TIME_FIELDS[document_class._class_name]
+    if start is not None:
+        qs = qs.filter(**{'%s__gte' % time_field: start})
+    if end is not None:
+        qs = qs.filter(**{'%s__lt' % time_field: end})
+    if verbs:
+        qs = qs.filter(verb__in=verbs)
+    return qs._query
+
+
+def export_collections(document_class, query):
+    """
+    Returns the collections holding the documents of document_class matched
+    by query, the month partitions for partitioned actions.
+    """
+    if document_class._class_name == 'Action':
+        return partitions.action_collections(query)
+    return [document_class._get_collection()]
+
+
+def export_documents(document_class, fileobj, format='ndjson', start=None,
+                     end=None, verbs=None, id_range=(None, None),
+                     batch_size=1000):
+    """
+    Writes the documents of document_class to fileobj in ``_id`` order
+    (partition by partition for partitioned actions). ``id_range`` limits
+    the export to one ``_id`` range, see ``export_parallel``.
+
+    Returns the number of documents written.
+    """
+    if format not in FORMATS:
+        raise ValueError('Unknown export format %r' % format)
+    query = export_query(document_class, start, end, verbs)
+    count = 0
+    for collection in export_collections(document_class, query):
+        cursor = collection.find(id_range_query(query, *id_range)) \
+            .sort('_id', 1).batch_size(batch_size)
+        for doc in cursor:
+            if format == 'bson':
+                fileobj.write(BSON.encode(doc))
+            else:
+                fileobj.write(text_type(json_util.dumps(doc)))
+                fileobj.write(u'\n')
+            count += 1
+    return count
+
+
+def open_export(path, format='ndjson'):
+    """
+    Opens path for writing an export, ``ndjson`` exports as UTF-8 text.
+    """
+    if format == 'bson':
+        return io.open(path, 'wb')
+    return io.open(path, 'w', encoding='utf8')
+
+
+def _export_partition(args):
+    document_name, path, format, filters, id_range, batch_size = args
+    document_class = get_document(document_name)
+    with open_export(path, format) as fileobj:
+        return path, export_documents(document_class, fileobj, format=format,
+                                      id_range=id_range, batch_size=batch_size,
+                                      **filters)
+
+
+def export_parallel(document_class, path, format='ndjson', workers=4,
+                    batch_size=1000, **filters):
+    """
+    Splits the documents of document_class into ``_id`` ranges and exports
+    each one to ``<path>.<n>`` in its own worker process.
+
+    Returns a list of ``(path, count)`` tuples.
+    """
+    query = export_query(document_class, **filters)
+    ranges = split_id_range(export_collections(document_class, query), query,
+                            workers)
+    jobs = [(document_class._class_name, '%s.%d' % (path, n), format, filters,
+             id_range, batch_size) for n, id_range in enumerate(ranges)]
+    pool = Pool(min(workers, len(jobs)), reset_connections, (document_class,))
+    try:
+        return pool.map(_export_partition, jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def read_documents(fileobj, format='ndjson'):
+    """
+    Yields the documents of an export one by one.
+    """
+    if format == 'bson':
+        for doc in decode_file_iter(fileobj):
+            yield doc
+    elif format == 'ndjson':
+        for line in fileobj:
+            if line.strip():
+                yield json_util.loads(line)
+    else:
+        raise ValueError('Unknown export format %r' % format)
+
+
+def import_documents(document_class, fileobj, format='ndjson', batch_size=1000):
+    """
+    Inserts the documents of an export with unordered bulk inserts of
+    batch_size documents. Documents whose ``_id`` already exists are
+    skipped, so an interrupted import can be run again.
+
+    Returns a ``(inserted, failed)`` tuple.
+    """
+    collection = document_class._get_collection()
+    inserted = failed = 0
+    batch = []
+
+    def flush():
+        bulk = collection.initialize_unordered_bulk_op()
+        for doc in batch:
+            bulk.insert(doc)
+        try:
+            return bulk.execute()['nInserted'], 0
+        except BulkWriteError as e:
+            return e.details['nInserted'], len(e.details['writeErrors'])
+
+    for doc in read_documents(fileobj, format):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            counts = flush()
+            inserted, failed = inserted + counts[0], failed + counts[1]
+            batch = []
+    if batch:
+        counts = flush()
+        inserted, failed = inserted + counts[0], failed + counts[1]
+    return inserted, failed
@@ -0,0 +1,73 @@
+from mongoengine import fields
+
+from actstream.cache import cache_document, cached_document, reference_cache
+from actstream.utils import ref_key
+from actstream.verbs import verbs
+
+# Used as the query value for verbs that were never interned so that they
+# match nothing instead of allocating a code
+UNKNOWN_VERB = -1
+
+
+class InternedVerbField(fields.StringField):
+    """
+    A verb exposed as a string but stored as its integer code from the verb
+    registry.
+
+    Only exact, ``in`` and ``nin`` lookups are supported.
+    """
+
+    def to_mongo(self, value):
+        if value is None or isinstance(value, int):
+            return value
+        return verbs.code_for(value)
+
+    def to_python(self, value):
+        if isinstance(value, int):
+            return verbs.name_for(value)
+        return value
+
+    def prepare_query_value(self, op, value):
+        if value is None or isinstance(value, int):
+            return value
+        code = verbs.code_for(value, create=False)
+        return UNKNOWN_VERB if code is None else code
+
+
+class FlagField(fields.BooleanField):
+    """
+    A boolean stored as one bit of an integer flags field.
+    """
+
+    def __init__(self, bit=1, **kwargs):
+        self.bit = bit
+        super(FlagField, self).__init__(**kwargs)
+
+    def to_mongo(self, value):
+        return self.bit if value else 0
+
+    def to_python(self, value):
+        if isinstance(value, bool) or value is None:
+            return value
+        return bool(int(value) & self.bit)
+
+    def prepare_query_value(self, op, value):
+        return self.to_mongo(value)
+
+
+class CachedGenericReferenceField(fields.GenericReferenceField):
+    """
+    A ``GenericReferenceField`` that looks documents up in the reference
+    cache before fetching them.
+    """
+
+    def dereference(self, value):
+        if not reference_cache.maxsize:
+            return super(CachedGenericReferenceField, self).dereference(value)
+        key = ref_key(value)
+        doc = cached_document(key)
+        if doc is None:
+            doc = super(CachedGenericReferenceField, self).dereference(value)
+            if doc is not None:
+                cache_document(key, doc)
+        return doc
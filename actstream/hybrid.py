@@ -0,0 +1,316 @@
+"""
+Hybrid push/pull assembly of user streams.
+
+With ``ACTSTREAM_SETTINGS['HYBRID_FEED']`` on, the mongoengine backend pushes
+every new action into the ``InboxItem`` documents of the users following its
+actor (or its target and action object, for follows that are not
+``actor_only``). Objects with at least ``PULL_THRESHOLD`` followers are
+skipped when pushing; their actions are pulled at read time instead and
+``user_stream`` merges both sources by timestamp.
+
+Tiers are kept in ``FollowStats`` documents and reassessed on every follow
+and unfollow. ``rebuild_follow_stats()`` recounts them from the ``Follow``
+collection and ``rebuild_inboxes()`` then backfills the inboxes of existing
+follows, eg. when the feature is switched on for existing data.
+"""
+from time import time
+
+from mongoengine.base import get_document
+from mongoengine.queryset import Q
+
+from actstream import adjacency
+from actstream import partitions
+from actstream import settings as actstream_settings
+from actstream.audience import viewer_option
+from actstream.schemas import data_query
+from actstream.utils import (bulk_dereference, db_field, dereference_actions,
+                             ref_key, ref_string)
+
+ROLES = ('actor', 'target', 'action_object')
+
+# Objects move back to the push tier once they drop below this share of
+# PULL_THRESHOLD, so tiers do not flap around the threshold
+DEMOTE_RATIO = 0.9
+
+# Seconds the set of pull tier objects is cached in process
+PULL_TIER_TTL = 60
+
+_pull_keys = {'keys': None, 'expires': 0}
+
+BATCH_SIZE = 1000
+
+
+def pull_keys():
+    """
+    Returns the keys of all objects in the pull tier.
+    """
+    if _pull_keys['keys'] is None or _pull_keys['expires'] < time():
+        collection = get_document('actstream.FollowStats')._get_collection()
+        _pull_keys['keys'] = set(doc['key'] for doc in
+                                 collection.find({'pull': True}, {'key': 1}))
+        _pull_keys['expires'] = time() + PULL_TIER_TTL
+    return _pull_keys['keys']
+
+
+def is_pulled(obj):
+    return ref_string(obj) in pull_keys()
+
+
+class InboxWriter(object):
+    """
+    Upserts inbox items with unordered bulk operations of BATCH_SIZE.
+    """
+
+    def __init__(self):
+        self.collection = get_document('actstream.InboxItem')._get_collection()
+        self.bulk, self.pending = None, 0
+
+    def push(self, user_id, action, source):
+        if self.bulk is None:
+            self.bulk = self.collection.initialize_unordered_bulk_op()
+        self.bulk.find({'user': user_id, 'action': action.pk}).upsert().update_one({
+            '$set': {'timestamp': action.timestamp},
+            '$addToSet': {'sources': source},
+        })
+        self.pending += 1
+        if self.pending >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.bulk.execute()
+        self.bulk, self.pending = None, 0
+
+
+def fan_out(action):
+    """
+    Pushes action into the inboxes of the followers of its push tier actor,
+    target and action object.
+    """
+    Follow = get_document('actstream.Follow')
+    writer = InboxWriter()
+    for role in ROLES:
+        obj = getattr(action, role)
+        if obj is None or is_pulled(obj):
+            continue
+        source = ref_string(obj)
+        for user_id in Follow.objects.follower_ids(
+                obj, include_actor_only=role == 'actor'):
+            writer.push(user_id, action, source)
+    writer.flush()
+
+
+def backfill(obj, user_ids, actor_only=True):
+    """
+    Pushes the INBOX_BACKFILL most recent actions of obj into the inboxes of
+    user_ids.
+    """
+    limit = actstream_settings.INBOX_BACKFILL
+    if not limit:
+        return
+    Action = get_document('actstream.Action')
+    q = Q(actor=obj)
+    if not actor_only:
+        q = q | Q(target=obj) | Q(action_object=obj)
+    actions = evaluate(Action.objects.public(q).only('id', 'timestamp'), limit)
+    source = ref_string(obj)
+    writer = InboxWriter()
+    for user_id in user_ids:
+        for action in actions:
+            writer.push(user_id, action, source)
+    writer.flush()
+
+
+def followed(user, obj, actor_only, created=True):
+    """
+    Called when user starts following obj, or with created False when the
+    ``actor_only`` flag of an existing follow changed.
+    """
+    if not created:
+        remove_source(user, obj)
+    if not is_pulled(obj):
+        backfill(obj, [user.pk], actor_only)
+    if created:
+        follow_count_changed(obj, 1)
+
+
+def unfollowed(user, obj):
+    """
+    Called when user stops following obj, removes what obj pushed into the
+    user's inbox.
+    """
+    remove_source(user, obj)
+    follow_count_changed(obj, -1)
+
+
+def remove_source(user, obj):
+    """
+    Removes what obj pushed into the user's inbox.
+    """
+    collection = get_document('actstream.InboxItem')._get_collection()
+    source = ref_string(obj)
+    collection.update({'user': user.pk, 'sources': source},
+                      {'$pull': {'sources': source}}, multi=True)
+    collection.remove({'user': user.pk, 'sources': []})
+
+
+def follow_count_changed(obj, delta):
+    """
+    Updates the follower count of obj and moves it to the other tier if it
+    crossed the threshold.
+    """
+    FollowStats = get_document('actstream.FollowStats')
+    key = ref_string(obj)
+    stats = FollowStats.objects(key=key).modify(
+        upsert=True, new=True, inc__followers=delta)
+    threshold = actstream_settings.PULL_THRESHOLD
+    if not stats.pull and stats.followers >= threshold:
+        if FollowStats.objects(key=key, pull=False).update_one(set__pull=True):
+            _pull_keys['keys'] = None
+    elif stats.pull and stats.followers < threshold * DEMOTE_RATIO:
+        if FollowStats.objects(key=key, pull=True).update_one(set__pull=False):
+            _pull_keys['keys'] = None
+            Follow = get_document('actstream.Follow')
+            backfill(obj, Follow.objects.follower_ids(obj, include_actor_only=True))
+
+
+def rebuild_follow_stats():
+    """
+    Recounts the followers of every followed object and sets their tiers.
+    """
+    FollowStats = get_document('actstream.FollowStats')
+    Follow = get_document('actstream.Follow')
+    threshold = actstream_settings.PULL_THRESHOLD
+    FollowStats.drop_collection()
+    bulk = FollowStats._get_collection().initialize_unordered_bulk_op()
+    pending = False
+    for row in Follow.objects.aggregate({'$group': {
+            '_id': '$follow_object', 'followers': {'$sum': 1}}}):
+        bulk.insert({
+            'key': ref_string(row['_id']),
+            'followers': row['followers'],
+            'pull': row['followers'] >= threshold,
+        })
+        pending = True
+    if pending:
+        bulk.execute()
+    _pull_keys['keys'] = None
+
+
+def rebuild_inboxes():
+    """
+    Backfills the inboxes of the followers of every push tier object, eg.
+    after ``rebuild_follow_stats()`` when the feature is switched on for
+    existing follows.
+    """
+    Follow = get_document('actstream.Follow')
+    user = db_field(Follow, 'user')
+    follow_object = db_field(Follow, 'follow_object')
+    actor_only = db_field(Follow, 'actor_only')
+    pulled = pull_keys()
+    cursor = Follow._get_collection().find(
+        {}, {user: 1, follow_object: 1, actor_only: 1}
+    ).sort(follow_object, 1).batch_size(BATCH_SIZE)
+    current, ref, users = None, None, {True: [], False: []}
+    for follow in cursor:
+        key = ref_key(follow[follow_object])
+        if key != current:
+            _backfill_followers(ref, users)
+            current, ref, users = key, follow[follow_object], {True: [],
+                                                               False: []}
+        if ref_string(follow[follow_object]) in pulled:
+            continue
+        users[bool(follow.get(actor_only, True))].append(
+            getattr(follow[user], 'id', follow[user]))
+    _backfill_followers(ref, users)
+
+
+def _backfill_followers(ref, users):
+    if ref is None or not (users[True] or users[False]):
+        return
+    obj = bulk_dereference([ref]).get(ref_key(ref))
+    if obj is None:
+        return
+    for actor_only, user_ids in users.items():
+        if user_ids:
+            backfill(obj, user_ids, actor_only)
+
+
+def evaluate(queryset, limit=None):
+    """
+    Returns the actions of queryset, from all partitions when actions are
+    partitioned.
+    """
+    if actstream_settings.PARTITION_ACTIONS:
+        return partitions.route(queryset, limit=limit)
+    return list(queryset[:limit] if limit else queryset)
+
+
+def user_stream(obj, **kwargs):
+    """
+    Stream of most recent actions by objects that the passed User obj is
+    following, assembled from the user's inbox and the pull tier objects
+    they follow.
+
+    Takes the same arguments as ``ActionQuerySet.user``.
+    """
+    if not obj:
+        return []
+    Action = get_document('actstream.Action')
+    Follow = get_document('actstream.Follow')
+    offset, limit = kwargs.pop('_offset', None) or 0, kwargs.pop('_limit', None)
+    kwargs = viewer_option(kwargs)
+    data = data_query(kwargs) or Q()
+
+    actors, others = [], []
+    if kwargs.pop('with_user_activity', False):
+        actors.append(obj)
+    pulled = pull_keys()
+    if pulled:
+        if actstream_settings.FOLLOW_ADJACENCY:
+            follows = adjacency.followed_refs(obj)
+        else:
+            follows = [(follow['follow_object'], follow.get('actor_only', True))
+                       for follow in Follow.objects.filter(user=obj).only(
+                           'follow_object', 'actor_only').as_pymongo()]
+        for follow_object, actor_only in follows:
+            if ref_string(follow_object) in pulled:
+                actors.append(follow_object)
+                if not actor_only:
+                    others.append(follow_object)
+
+    actions = {}
+    if actors or others:
+        q = Q()
+        if actors:
+            q = q | Q(actor__in=actors)
+        if others:
+            q = q | Q(target__in=others) | Q(action_object__in=others)
+        for action in evaluate(Action.objects.public(q & data, **kwargs),
+                               limit):
+            actions[action.pk] = action
+
+    # The inbox is paged on (timestamp, action) rather than skipped through,
+    # filters dropping items would rescan it from the start otherwise
+    inbox = get_document('actstream.InboxItem')._get_collection()
+    chunk = limit or BATCH_SIZE
+    query, found = {'user': obj.pk}, 0
+    while not limit or found < limit:
+        items = list(inbox.find(query, {'action': 1, 'timestamp': 1}).sort(
+            [('timestamp', -1), ('action', -1)]).limit(chunk))
+        ids = [item['action'] for item in items]
+        for action in evaluate(Action.objects.public(data, id__in=ids,
+                                                     **kwargs)):
+            actions[action.pk] = action
+            found += 1
+        if len(items) < chunk:
+            break
+        last = items[-1]
+        query = {'user': obj.pk, '$or': [
+            {'timestamp': {'$lt': last['timestamp']}},
+            {'timestamp': last['timestamp'], 'action': {'$lt': last['action']}},
+        ]}
+
+    page = sorted(actions.values(), key=lambda action: action.timestamp,
+                  reverse=True)
+    return dereference_actions(page[offset:limit])
@@ -0,0 +1,258 @@
+"""
+Explicit management of the indexes of the actstream collections.
+
+mongoengine creates the indexes declared in ``meta`` the first time a
+collection is used, which on large collections means a blocking build at
+process start. With ``ACTSTREAM_SETTINGS['AUTO_CREATE_INDEXES']`` off that
+never happens and indexes are managed with::
+
+    python manage.py actstream_indexes plan
+    python manage.py actstream_indexes build
+    python manage.py actstream_indexes report
+    python manage.py actstream_indexes drop action verb_1
+
+``build`` creates missing indexes in the background. ``report`` joins
+``$indexStats`` (MongoDB 3.2+) with the index definitions and flags indexes
+that were never used or are a prefix of another index. With
+``PARTITION_ACTIONS`` on, the monthly action partitions are managed too.
+
+Without automatic index creation, ``build`` must run before the site serves
+traffic: the mongoengine backend relies on the unique indexes of ``Follow``
+and of idempotency keys, and raises ``ImproperlyConfigured`` when they are
+missing instead of storing duplicates.
+"""
+from threading import Lock
+
+from django.core.exceptions import ImproperlyConfigured
+
+from pymongo.errors import OperationFailure
+
+from mongoengine.base import get_document
+
+from actstream import partitions
+from actstream import schemas
+from actstream import settings as actstream_settings
+
+DOCUMENTS = (
+    'actstream.Action',
+    'actstream.Follow',
+    'actstream.ActionCounter',
+    'actstream.Verb',
+    'actstream.InboxItem',
+    'actstream.FollowStats',
+    'actstream.ReadState',
+    'actstream.MaintenanceCheckpoint',
+    'actstream.FollowSuggestions',
+    'actstream.LastActivity',
+    'actstream.Digest',
+    'actstream.FollowAdjacency',
+)
+
+OPTIONS = ('unique', 'sparse', 'partialFilterExpression',
+           'expireAfterSeconds')
+
+
+_checked = set()
+_lock = Lock()
+
+
+def document_classes():
+    return [get_document(name) for name in DOCUMENTS]
+
+
+def targets():
+    """
+    Returns ``(collection name, document class, collection)`` tuples of the
+    collections whose indexes are managed, including action partitions.
+    """
+    result = [(document_class._get_collection_name(), document_class,
+               raw_collection(document_class))
+              for document_class in document_classes()]
+    if actstream_settings.PARTITION_ACTIONS:
+        Action = get_document('actstream.Action')
+        db = Action._get_db()
+        result.extend((name, Action, db[name])
+                      for name in partitions.partition_names()
+                      if name != partitions.base_name())
+    return result
+
+
+def disable_auto_create():
+    """
+    Stops mongoengine from creating the indexes of the actstream documents.
+    """
+    for document_class in document_classes():
+        document_class._meta['auto_create_index'] = False
+
+
+def raw_collection(document_class):
+    """
+    Returns the collection of document_class without creating its indexes.
+    """
+    return document_class._get_db()[document_class._get_collection_name()]
+
+
+def index_keys(keys):
+    return [(field, int(direction) if isinstance(direction, float)
+             else direction) for field, direction in keys]
+
+
+def index_name(keys):
+    return '_'.join('%s_%s' % (field, direction) for field, direction in keys)
+
+
+def reference_specs():
+    """
+    Returns a dict mapping the names of the indexes on the class names of the
+    references of ``Action``, which back ``document_stream``, to
+    ``(keys, options)``. mongoengine cannot declare them in ``meta`` as it
+    refuses lookups into generic references.
+    """
+    Action = get_document('actstream.Action')
+    timestamp = Action._fields['timestamp'].db_field
+    specs = {}
+    for role in ('actor', 'target', 'action_object'):
+        keys = [('%s._cls' % Action._fields[role].db_field, 1),
+                (timestamp, -1)]
+        specs[index_name(keys)] = keys, {}
+    return specs
+
+
+def declared_indexes(document_class):
+    """
+    Returns a dict mapping the names of the indexes declared by
+    document_class, including the reference and data schema indexes of
+    ``Action``, to ``(keys, options)``.
+    """
+    declared = {}
+    if document_class is get_document('actstream.Action'):
+        declared.update(reference_specs())
+        declared.update(schemas.index_specs())
+    for spec in document_class._meta['index_specs']:
+        keys = index_keys(spec['fields'])
+        options = dict((option, spec[option]) for option in OPTIONS
+                       if spec.get(option))
+        declared[spec.get('name') or index_name(keys)] = keys, options
+    return declared
+
+
+def existing_indexes(document_class, collection=None):
+    """
+    Returns a dict mapping the names of the indexes of collection (by
+    default the collection of document_class), besides ``_id_``, to
+    ``(keys, options)``.
+    """
+    if collection is None:
+        collection = raw_collection(document_class)
+    info = collection.index_information()
+    existing = {}
+    for name, index in info.items():
+        if name == '_id_':
+            continue
+        options = dict((option, index[option]) for option in OPTIONS
+                       if index.get(option))
+        existing[name] = index_keys(index['key']), options
+    return existing
+
+
+def plan(document_class, collection=None):
+    """
+    Returns ``(missing, extra)``: the names of the declared indexes the
+    collection lacks and of the indexes it has but nothing declares.
+    """
+    declared = declared_indexes(document_class)
+    existing = existing_indexes(document_class, collection)
+    missing = sorted(name for name in declared if name not in existing)
+    extra = sorted(name for name in existing if name not in declared)
+    return missing, extra
+
+
+def build(document_class, collection=None):
+    """
+    Creates the missing indexes of document_class in the background and
+    returns their names.
+    """
+    if collection is None:
+        collection = raw_collection(document_class)
+    declared = declared_indexes(document_class)
+    missing = plan(document_class, collection)[0]
+    for name in missing:
+        keys, options = declared[name]
+        collection.create_index(keys, name=name, background=True, **options)
+    return missing
+
+
+def drop(document_class, name, collection=None):
+    if collection is None:
+        collection = raw_collection(document_class)
+    collection.drop_index(name)
+
+
+def usage(document_class, collection=None):
+    """
+    Returns a dict mapping index names to the number of operations that used
+    them since the server started, or None if ``$indexStats`` is not
+    available.
+    """
+    if collection is None:
+        collection = raw_collection(document_class)
+    try:
+        rows = collection.aggregate([{'$indexStats': {}}])
+    except OperationFailure:
+        return None
+    if isinstance(rows, dict):
+        rows = rows['result']
+    return dict((row['name'], row['accesses']['ops']) for row in rows)
+
+
+def is_prefix(keys, other):
+    return len(keys) < len(other) and other[:len(keys)] == keys
+
+
+def report(document_class, collection=None):
+    """
+    Returns a list of dicts describing the indexes of document_class, with
+    ``unused`` and ``redundant`` flags.
+    """
+    declared = declared_indexes(document_class)
+    existing = existing_indexes(document_class, collection)
+    ops = usage(document_class, collection)
+    rows = []
+    for name, (keys, options) in sorted(existing.items()):
+        covering = [other for other, (other_keys, _) in existing.items()
+                    if is_prefix(keys, other_keys)]
+        rows.append({
+            'name': name,
+            'keys': keys,
+            'declared': name in declared,
+            'ops': ops.get(name) if ops is not None else None,
+            'unused': ops is not None and not ops.get(name),
+            'redundant': bool(covering) and not options.get('unique'),
+            'covered_by': sorted(covering),
+        })
+    return rows
+
+
+def check_unique(document_class, collection=None):
+    """
+    Raises ``ImproperlyConfigured`` if a declared unique index of
+    document_class is missing while indexes are not created automatically.
+    Checked once per process and collection.
+    """
+    if actstream_settings.AUTO_CREATE_INDEXES:
+        return
+    if collection is None:
+        collection = raw_collection(document_class)
+    if collection.full_name in _checked:
+        return
+    existing = existing_indexes(document_class, collection)
+    missing = sorted(name for name, (keys, options)
+                     in declared_indexes(document_class).items()
+                     if options.get('unique') and name not in existing)
+    if missing:
+        raise ImproperlyConfigured(
+            'The unique indexes %s of %s are missing, run '
+            '"manage.py actstream_indexes build".'
+            % (', '.join(missing), collection.full_name))
+    with _lock:
+        _checked.add(collection.full_name)
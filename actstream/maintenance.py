@@ -0,0 +1,270 @@
+"""
+Resumable, parallel maintenance tasks over the ``Action`` and ``Follow``
+collections.
+
+A task walks the raw documents of a collection in ``_id`` order, batch by
+batch, and queues writes for each batch on an unordered bulk operation.
+Collections (every month partition, for partitioned actions) are split into
+``_id`` ranges processed by a pool of worker processes, and the progress of
+every range is checkpointed in ``MaintenanceCheckpoint`` documents so an
+interrupted run continues where it stopped. Workers pause between batches (and can wait for writes to reach a
+majority of the replica set) so the primary keeps serving traffic.
+
+Example::
+
+    from actstream import maintenance
+
+    maintenance.run('orphaned_actions', workers=4, pause=0.1)
+
+or ``python manage.py actstream_maintenance orphaned_actions --workers 4``.
+
+Custom tasks subclass ``Task`` and are registered with ``register_task``::
+
+    @maintenance.register_task
+    class LowercaseVerbs(maintenance.Task):
+        name = 'lowercase_verbs'
+
+        def process(self, docs, bulk):
+            for doc in docs:
+                bulk.find({'_id': doc['_id']}).update_one(
+                    {'$set': {'verb': doc['verb'].lower()}})
+            return len(docs)
+"""
+from multiprocessing import Pool
+from time import sleep
+
+from mongoengine.base import get_document
+from mongoengine.errors import NotRegistered
+
+from actstream import partitions
+from actstream.compact import compact_document, expand_document
+from actstream.utils import db_field, ref_key, reset_connections, split_id_range
+
+TASKS = {}
+
+
+def register_task(task_class):
+    """
+    Registers a ``Task`` subclass under its name. Usable as a decorator.
+    """
+    TASKS[task_class.name] = task_class
+    return task_class
+
+
+def get_task(name):
+    try:
+        return TASKS[name]()
+    except KeyError:
+        raise ValueError('Unknown maintenance task %r' % name)
+
+
+class Task(object):
+    """
+    A maintenance task. Subclasses set ``name`` and implement ``process``.
+    """
+    name = None
+    document = 'actstream.Action'
+
+    def collections(self):
+        """
+        Returns the collections to process, the month partitions for
+        partitioned actions.
+        """
+        if self.document == 'actstream.Action':
+            return partitions.action_collections(self.query())
+        return [get_document(self.document)._get_collection()]
+
+    def query(self):
+        """
+        Returns the raw query selecting the documents to process.
+        """
+        return {}
+
+    def process(self, docs, bulk):
+        """
+        Queues the writes for a batch of raw documents on bulk and returns
+        the number of documents changed.
+        """
+        raise NotImplementedError
+
+
+@register_task
+class CompactTask(Task):
+    """
+    Converts actions to the compact encoding, see ``actstream.compact``.
+    """
+    name = 'compact'
+    convert = staticmethod(compact_document)
+
+    def query(self):
+        return {'verb': {'$exists': True}}
+
+    def process(self, docs, bulk):
+        for doc in docs:
+            bulk.find({'_id': doc['_id']}).replace_one(self.convert(doc))
+        return len(docs)
+
+
+@register_task
+class ExpandTask(CompactTask):
+    """
+    Converts compact actions back to the default encoding.
+    """
+    name = 'expand'
+    convert = staticmethod(expand_document)
+
+    def query(self):
+        return {'v': {'$exists': True}}
+
+
+def existing_keys(values):
+    """
+    Returns the ``ref_key``s of the raw generic references in values whose
+    documents exist. References to unregistered classes count as existing.
+    """
+    wanted = {}
+    for value in values:
+        key = ref_key(value)
+        if key is not None:
+            wanted.setdefault(key[0], set()).add(key[1])
+    existing = set()
+    for cls_name, ids in wanted.items():
+        try:
+            collection = get_document(cls_name)._get_collection()
+        except NotRegistered:
+            existing.update((cls_name, pk) for pk in ids)
+            continue
+        for doc in collection.find({'_id': {'$in': list(ids)}}, {'_id': 1}):
+            existing.add((cls_name, doc['_id']))
+    return existing
+
+
+class OrphansTask(Task):
+    """
+    Removes documents referring to a deleted document in one of ``roles``.
+    """
+    roles = ()
+
+    def process(self, docs, bulk):
+        document_class = get_document(self.document)
+        fields = [db_field(document_class, role) for role in self.roles]
+        refs = [doc.get(field) for doc in docs for field in fields]
+        existing = existing_keys(refs)
+        removed = 0
+        for doc in docs:
+            keys = [ref_key(doc.get(field)) for field in fields]
+            if any(key is not None and key not in existing for key in keys):
+                bulk.find({'_id': doc['_id']}).remove_one()
+                removed += 1
+        return removed
+
+
+@register_task
+class OrphanedActionsTask(OrphansTask):
+    """
+    Removes actions whose actor, target or action object was deleted
+    without ``clear_relations_on_delete`` running.
+    """
+    name = 'orphaned_actions'
+    roles = ('actor', 'target', 'action_object')
+
+
+@register_task
+class OrphanedFollowsTask(OrphansTask):
+    """
+    Removes follows of deleted objects.
+    """
+    name = 'orphaned_follows'
+    document = 'actstream.Follow'
+    roles = ('follow_object',)
+
+
+def _range_query(query, checkpoint):
+    query = dict(query)
+    bounds = {}
+    if checkpoint['last_id'] is not None:
+        bounds['$gt'] = checkpoint['last_id']
+    elif checkpoint['lowest'] is not None:
+        bounds['$gte'] = checkpoint['lowest']
+    if checkpoint['highest'] is not None:
+        bounds['$lt'] = checkpoint['highest']
+    if bounds:
+        query['_id'] = bounds
+    return query
+
+
+def run_range(args):
+    """
+    Processes the ``_id`` range of one checkpoint until it is done.
+    Returns the ``(processed, changed)`` counts of the range.
+    """
+    name, part, batch_size, pause, write_concern = args
+    task = get_task(name)
+    checkpoints = get_document('actstream.MaintenanceCheckpoint')._get_collection()
+    selector = {'task': name, 'part': part}
+    checkpoint = checkpoints.find_one(selector)
+    document_class = get_document(task.document)
+    collection = document_class._get_db()[
+        checkpoint.get('collection') or document_class._get_collection_name()]
+    while not checkpoint['done']:
+        docs = list(collection.find(_range_query(task.query(), checkpoint))
+                    .sort('_id', 1).limit(batch_size))
+        changed = 0
+        if docs:
+            bulk = collection.initialize_unordered_bulk_op()
+            changed = task.process(docs, bulk)
+            if changed:
+                bulk.execute(write_concern)
+        checkpoint = checkpoints.find_and_modify(selector, {
+            '$set': {'last_id': docs[-1]['_id'] if docs else checkpoint['last_id'],
+                     'done': len(docs) < batch_size},
+            '$inc': {'processed': len(docs), 'changed': changed},
+        }, new=True)
+        if pause and not checkpoint['done']:
+            sleep(pause)
+    return checkpoint['processed'], checkpoint['changed']
+
+
+def run(name, workers=1, batch_size=1000, pause=0, majority=False,
+        restart=False):
+    """
+    Runs the task called name, continuing a previous interrupted run unless
+    restart is True. A previous run that finished is never continued, the
+    task starts over. ``pause`` is the number of seconds each worker sleeps
+    between batches; with ``majority`` every bulk write waits for a majority
+    of the replica set.
+
+    Returns the ``(processed, changed)`` totals of the run.
+    """
+    task = get_task(name)
+    Checkpoint = get_document('actstream.MaintenanceCheckpoint')
+    checkpoints = Checkpoint._get_collection()
+    if restart or not checkpoints.find_one({'task': name, 'done': False}):
+        checkpoints.remove({'task': name})
+    parts = [doc['part'] for doc in checkpoints.find({'task': name}, {'part': 1})]
+    if not parts:
+        collections = task.collections()
+        per_collection = max(1, workers // len(collections))
+        for collection in collections:
+            ranges = split_id_range(collection, task.query(), per_collection)
+            for lowest, highest in ranges:
+                checkpoints.insert({
+                    'task': name, 'part': len(parts),
+                    'collection': collection.name, 'lowest': lowest,
+                    'highest': highest, 'last_id': None, 'done': False,
+                    'processed': 0, 'changed': 0,
+                })
+                parts.append(len(parts))
+    write_concern = {'w': 'majority'} if majority else None
+    jobs = [(name, part, batch_size, pause, write_concern) for part in parts]
+    if workers > 1 and len(jobs) > 1:
+        pool = Pool(min(workers, len(jobs)), reset_connections,
+                    (get_document(task.document), Checkpoint))
+        try:
+            results = pool.map(run_range, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [run_range(job) for job in jobs]
+    return tuple(sum(counts) for counts in zip(*results)) or (0, 0)
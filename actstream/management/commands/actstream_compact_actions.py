@@ -0,0 +1,25 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from actstream.compact import convert_actions
+
+
+class Command(BaseCommand):
+    help = ('Converts stored actions to the compact encoding '
+            '(or back with --expand).')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size', default=1000,
+                    help='Number of actions rewritten per bulk operation.'),
+        make_option('--workers', type='int', dest='workers', default=1,
+                    help='Number of worker processes converting _id ranges.'),
+        make_option('--expand', action='store_true', dest='expand', default=False,
+                    help='Convert compact actions back to the default encoding.'),
+    )
+
+    def handle(self, *args, **options):
+        converted = convert_actions(batch_size=options['batch_size'],
+                                    expand=options['expand'],
+                                    workers=options['workers'])
+        self.stdout.write('Converted %d actions\n' % converted)
@@ -0,0 +1,37 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from actstream.digests import build_digests
+from actstream.management.commands.actstream_export import parse_date_option
+
+
+class Command(BaseCommand):
+    args = '<name>'
+    help = ('Builds the digests called <name> of the actions between --start '
+            'and --end for every user.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--start', dest='start',
+                    help='Start of the window, an ISO 8601 date time.'),
+        make_option('--end', dest='end',
+                    help='End of the window, an ISO 8601 date time.'),
+        make_option('--workers', type='int', dest='workers', default=1,
+                    help='Number of worker processes joining follows.'),
+        make_option('--chunk-size', type='int', dest='chunk_size', default=500,
+                    help='Number of followed objects joined at a time.'),
+        make_option('--per-user', type='int', dest='per_user', default=50,
+                    help='Number of actions kept per digest.'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1 or not options['start'] or not options['end']:
+            raise CommandError('Usage: actstream_digests %s --start <date time> '
+                               '--end <date time>' % self.args)
+        count = build_digests(args[0],
+                              parse_date_option(options['start'], 'start'),
+                              parse_date_option(options['end'], 'end'),
+                              workers=options['workers'],
+                              chunk_size=options['chunk_size'],
+                              per_user=options['per_user'])
+        self.stdout.write('Built %d digests\n' % count)
@@ -0,0 +1,65 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from mongoengine.base import get_document
+
+from actstream.export import (FORMATS, export_documents, export_parallel,
+                              open_export)
+
+DOCUMENTS = {
+    'actions': 'actstream.Action',
+    'follows': 'actstream.Follow',
+}
+
+
+def parse_date_option(value, name):
+    if value is None:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise CommandError('--%s must be an ISO 8601 date time, not %r' % (name, value))
+    return parsed
+
+
+class Command(BaseCommand):
+    args = '<actions|follows> <path>'
+    help = ('Streams actions or follows to a NDJSON or BSON file with constant '
+            'memory. With --workers, partitions are written to <path>.<n>.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--format', dest='format', default='ndjson',
+                    choices=FORMATS, help='ndjson (default) or bson.'),
+        make_option('--start', dest='start',
+                    help='Only export documents from this date time on.'),
+        make_option('--end', dest='end',
+                    help='Only export documents before this date time.'),
+        make_option('--verb', dest='verbs', action='append',
+                    help='Only export actions with this verb. Can be repeated.'),
+        make_option('--workers', type='int', dest='workers', default=1,
+                    help='Number of worker processes exporting _id ranges.'),
+        make_option('--batch-size', type='int', dest='batch_size', default=1000,
+                    help='Number of documents fetched per round trip.'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 2 or args[0] not in DOCUMENTS:
+            raise CommandError('Usage: actstream_export %s' % self.args)
+        document_class = get_document(DOCUMENTS[args[0]])
+        path, format = args[1], options['format']
+        filters = {
+            'start': parse_date_option(options['start'], 'start'),
+            'end': parse_date_option(options['end'], 'end'),
+            'verbs': options['verbs'],
+        }
+        if options['workers'] > 1:
+            for part, count in export_parallel(
+                    document_class, path, format, options['workers'],
+                    batch_size=options['batch_size'], **filters):
+                self.stdout.write('Exported %d documents to %s\n' % (count, part))
+            return
+        with open_export(path, format) as fileobj:
+            count = export_documents(document_class, fileobj, format=format,
+                                     batch_size=options['batch_size'], **filters)
+        self.stdout.write('Exported %d documents to %s\n' % (count, path))
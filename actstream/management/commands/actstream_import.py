@@ -0,0 +1,34 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mongoengine.base import get_document
+
+from actstream.export import FORMATS, import_documents
+from actstream.management.commands.actstream_export import DOCUMENTS
+
+
+class Command(BaseCommand):
+    args = '<actions|follows> <path> [<path> ...]'
+    help = ('Bulk inserts actions or follows from files written by '
+            'actstream_export. Documents that already exist are skipped.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--format', dest='format', default='ndjson',
+                    choices=FORMATS, help='ndjson (default) or bson.'),
+        make_option('--batch-size', type='int', dest='batch_size', default=1000,
+                    help='Number of documents per unordered bulk insert.'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) < 2 or args[0] not in DOCUMENTS:
+            raise CommandError('Usage: actstream_import %s' % self.args)
+        document_class = get_document(DOCUMENTS[args[0]])
+        format = options['format']
+        for path in args[1:]:
+            with open(path, 'rb' if format == 'bson' else 'r') as fileobj:
+                inserted, failed = import_documents(
+                    document_class, fileobj, format=format,
+                    batch_size=options['batch_size'])
+            self.stdout.write('Imported %d documents from %s (%d skipped)\n' %
+                              (inserted, path, failed))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from actstream import indexes
+
+
+class Command(BaseCommand):
+    args = '<plan|build|report|drop> [<collection> <index>]'
+    help = ('Plans, builds (in the background) and drops the indexes of the '
+            'actstream collections and action partitions, or reports their '
+            'usage. Run build before serving traffic when AUTO_CREATE_INDEXES '
+            'is off.')
+
+    def handle(self, *args, **options):
+        if not args or args[0] not in ('plan', 'build', 'report', 'drop'):
+            raise CommandError('Usage: actstream_indexes %s' % self.args)
+        targets = dict((name, (document_class, collection))
+                       for name, document_class, collection
+                       in indexes.targets())
+        if args[0] == 'drop':
+            if len(args) != 3 or args[1] not in targets:
+                raise CommandError('Usage: actstream_indexes drop <collection> '
+                                   '<index>, collections are %s'
+                                   % ', '.join(sorted(targets)))
+            document_class, collection = targets[args[1]]
+            indexes.drop(document_class, args[2], collection)
+            self.stdout.write('Dropped %s.%s\n' % (args[1], args[2]))
+            return
+        for name, (document_class, collection) in sorted(targets.items()):
+            getattr(self, args[0])(name, document_class, collection)
+
+    def plan(self, name, document_class, collection):
+        missing, extra = indexes.plan(document_class, collection)
+        for index in missing:
+            self.stdout.write('%s: missing %s\n' % (name, index))
+        for index in extra:
+            self.stdout.write('%s: undeclared %s\n' % (name, index))
+
+    def build(self, name, document_class, collection):
+        for index in indexes.build(document_class, collection):
+            self.stdout.write('%s: building %s\n' % (name, index))
+
+    def report(self, name, document_class, collection):
+        for row in indexes.report(document_class, collection):
+            flags = [flag for flag in ('unused', 'redundant') if row[flag]]
+            if not row['declared']:
+                flags.append('undeclared')
+            if row['covered_by']:
+                flags.append('prefix of %s' % ', '.join(row['covered_by']))
+            self.stdout.write('%s.%s ops=%s %s\n' % (
+                name, row['name'],
+                '-' if row['ops'] is None else row['ops'], ' '.join(flags)))
@@ -0,0 +1,44 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from actstream.maintenance import TASKS, run
+
+
+class Command(BaseCommand):
+    args = '<task>'
+    help = ('Runs a maintenance task over the action or follow collection, '
+            'continuing an interrupted run unless --restart is given. '
+            'Without a task, lists the registered tasks.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--workers', type='int', dest='workers', default=1,
+                    help='Number of worker processes processing _id ranges.'),
+        make_option('--batch-size', type='int', dest='batch_size', default=1000,
+                    help='Number of documents per bulk operation.'),
+        make_option('--pause', type='float', dest='pause', default=0,
+                    help='Seconds each worker sleeps between batches.'),
+        make_option('--majority', action='store_true', dest='majority',
+                    default=False,
+                    help='Wait for every batch to reach a majority of the '
+                         'replica set.'),
+        make_option('--restart', action='store_true', dest='restart',
+                    default=False,
+                    help='Discard the checkpoints of a previous run.'),
+    )
+
+    def handle(self, *args, **options):
+        if not args:
+            for name in sorted(TASKS):
+                self.stdout.write('%s\n' % name)
+            return
+        if len(args) != 1 or args[0] not in TASKS:
+            raise CommandError('Usage: actstream_maintenance %s, tasks are %s'
+                               % (self.args, ', '.join(sorted(TASKS))))
+        processed, changed = run(args[0], workers=options['workers'],
+                                 batch_size=options['batch_size'],
+                                 pause=options['pause'],
+                                 majority=options['majority'],
+                                 restart=options['restart'])
+        self.stdout.write('Processed %d documents, changed %d\n'
+                          % (processed, changed))
@@ -1,8 +1,12 @@
 from mongoengine.base import get_document
 from mongoengine.queryset import QuerySet, Q
 
-from actstream.decorators import stream
+from actstream import adjacency
+from actstream import settings as actstream_settings
+from actstream.audience import viewer_tokens
+from actstream.decorators import stream, stream_queryset, aggregated_stream
 from actstream.registry import check
+from actstream.utils import db_field
 
 
 class ActionQuerySet(QuerySet):
@@ -12,10 +16,30 @@ class ActionQuerySet(QuerySet):
 
     def public(self, *args, **kwargs):
         """
-        Only return public actions
+        Only return public actions, or also the actions whose audience has
+        one of the tokens passed as ``_audience``
         """
-        kwargs['public'] = True
-        return self.filter(*args, **kwargs)
+        audience = kwargs.pop('_audience', None)
+        if audience:
+            q = Q(public=True) | Q(audience__in=list(audience))
+        else:
+            q = Q(public=True)
+        # QuerySet.filter only takes one Q object
+        for arg in args:
+            q = q & arg
+        return self.filter(q, **kwargs)
+
+    def stream_queryset(self, name, *args, **kwargs):
+        """
+        Returns the queryset behind the stream called name, before it is
+        sliced and dereferenced.
+
+        Example::
+
+            Action.objects.stream_queryset('actor', user).count()
+        """
+        func = getattr(self.__class__, name).queryset_func
+        return stream_queryset(self, func, *args, **kwargs)
 
     @stream
     def actor(self, obj, **kwargs):
@@ -24,7 +48,7 @@ class ActionQuerySet(QuerySet):
         Keyword arguments will be passed to Action.objects.filter
         """
         check(obj)
-        return obj.actor_actions.public(**kwargs)
+        return self.public(actor=obj, **kwargs)
 
     @stream
     def target(self, obj, **kwargs):
@@ -33,7 +57,7 @@ class ActionQuerySet(QuerySet):
         Keyword arguments will be passed to Action.objects.filter
         """
         check(obj)
-        return obj.target_actions.public(**kwargs)
+        return self.public(target=obj, **kwargs)
 
     @stream
     def action_object(self, obj, **kwargs):
@@ -42,7 +66,7 @@ class ActionQuerySet(QuerySet):
         Keyword arguments will be passed to Action.objects.filter
         """
         check(obj)
-        return obj.action_object_actions.public(**kwargs)
+        return self.public(action_object=obj, **kwargs)
 
     @stream
     def document_actions(self, document, **kwargs):
@@ -56,9 +80,9 @@ class ActionQuerySet(QuerySet):
             doc_cls_name = document.__class__.__name__
 
         return self.public(
-            (Q(__raw__={'target._cls': doc_cls_name}) |
-             Q(__raw__={'action_object._cls': doc_cls_name}) |
-             Q(__raw__={'actor._cls': doc_cls_name})),
+            (Q(__raw__={'%s._cls' % db_field(self._document, 'target'): doc_cls_name}) |
+             Q(__raw__={'%s._cls' % db_field(self._document, 'action_object'): doc_cls_name}) |
+             Q(__raw__={'%s._cls' % db_field(self._document, 'actor'): doc_cls_name})),
             **kwargs
         )
 
@@ -96,10 +120,13 @@ class ActionQuerySet(QuerySet):
         if kwargs.pop('with_user_activity', False):
             actors.append(obj)
 
-        follow_objects = get_document('actstream.Follow').objects.filter(
-            user=obj).values_list('follow_object', 'actor_only').no_cache()
+        if actstream_settings.FOLLOW_ADJACENCY:
+            follow_objects = adjacency.followed_refs(obj)
+        else:
+            follow_objects = get_document('actstream.Follow').objects.filter(
+                user=obj).values_list('follow_object', 'actor_only').no_cache()
 
-        for follow_object, actor_only in follow_objects():
+        for follow_object, actor_only in follow_objects:
             actors.append(follow_object)
             if not actor_only:
                 others.append(follow_object)
@@ -113,7 +140,23 @@ class ActionQuerySet(QuerySet):
         if len(others):
             q = q | Q(target__in=others) | Q(action_object__in=others)
 
-        return qs.filter(q, **kwargs)
+        return self.public(q, **kwargs)
+
+    @stream
+    def audience(self, viewer, **kwargs):
+        """
+        Stream of most recent actions restricted to an audience viewer
+        belongs to.
+        """
+        kwargs.pop('_audience', None)
+        tokens = viewer_tokens(viewer)
+        if not tokens:
+            return self.none()
+        return self.filter(audience__in=tokens, **kwargs)
+
+    actor_aggregated = aggregated_stream(actor)
+    target_aggregated = aggregated_stream(target)
+    user_aggregated = aggregated_stream(user)
 
 
 class FollowQuerySet(QuerySet):
@@ -137,6 +180,18 @@ class FollowQuerySet(QuerySet):
         queryset = self.for_object(instance)
         return bool(queryset.filter(user=user).count())
 
+    def follower_ids(self, actor, include_actor_only=True):
+        """
+        Yields the ids of the users following the given actor without
+        loading them. Follows with ``actor_only`` set are left out unless
+        include_actor_only is True.
+        """
+        qs = self.for_object(actor)
+        if not include_actor_only:
+            qs = qs.filter(actor_only=False)
+        for follow in qs.only('user').as_pymongo():
+            yield follow['user']
+
     def followers_qs(self, actor):
         """
         Returns a queryset of User objects who are following the given actor (eg my followers).
@@ -150,6 +205,18 @@ class FollowQuerySet(QuerySet):
         """
         return [follow.user for follow in self.followers_qs(actor)]
 
+    def follows_of(self, user, *documents):
+        """
+        Returns the unevaluated queryset of the follows of the given user, of
+        the passed documents only if any.
+        """
+        qs = self.filter(user=user)
+        ctype_filters = Q()
+        for document in documents:
+            check(document)
+            ctype_filters |= Q(__raw__={'follow_object._cls': document.__name__})
+        return qs.filter(ctype_filters)
+
     def following_qs(self, user, *documents):
         """
         Returns a queryset of actors that the given user is following (eg who im following).
@@ -158,13 +225,7 @@ class FollowQuerySet(QuerySet):
 
         TEST REQUIRED for __raw__ query
         """
-        qs = self.filter(user=user)
-        ctype_filters = Q()
-        for document in documents:
-            check(document)
-            ctype_filters |= Q(__raw__={'follow_object._cls': document.__name__})
-        qs = qs.filter(ctype_filters)
-        return qs.select_related()
+        return self.follows_of(user, *documents).select_related()
 
     def following(self, user, *documents):
         """
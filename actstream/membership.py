@@ -0,0 +1,206 @@
+"""
+In-process bloom filters of follow sets for ``is_following``.
+
+With ``ACTSTREAM_SETTINGS['FOLLOW_FILTER_SIZE']`` set, the mongoengine
+backend keeps a bloom filter of the objects followed by up to that many
+users in an LRU cache. ``is_following`` answers from the filter when it
+rules the object out, which is what most calls return, and only queries the
+``Follow`` collection for possible follows.
+
+Filters are built from one id-only query over the user's follows (or from
+the user's ``actstream.adjacency`` documents), updated in place by
+``follow`` and dropped by ``unfollow`` in this process; a filter whose build
+raced with a follow of its user is discarded and built again. Follows made
+or removed by other processes are seen once the filter expires after
+``FOLLOW_FILTER_TTL`` seconds, until then ``is_following`` may wrongly
+return False for them.
+
+``stats()`` reports the memory used by the cached filters and how many
+lookups were answered in process or turned out to be false positives.
+"""
+from hashlib import md5
+from math import ceil, log
+import struct
+from threading import Lock
+
+from django.utils.six import text_type
+
+from mongoengine.base import get_document
+
+from actstream import adjacency
+from actstream import settings as actstream_settings
+from actstream.cache import LRUCache
+from actstream.utils import db_field, ref_key, ref_string
+
+# Wanted false positive rate of a filter filled to its capacity
+ERROR_RATE = 0.01
+
+# Follows a filter has room for beyond the follows it is built with
+HEADROOM = 64
+
+
+class BloomFilter(object):
+    """
+    A bloom filter of strings sized for capacity items at error_rate.
+    """
+
+    def __init__(self, capacity, error_rate=ERROR_RATE):
+        self.capacity = capacity = max(capacity, 1)
+        self.size = int(ceil(-capacity * log(error_rate) / log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / float(capacity) * log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, item):
+        digest = md5(text_type(item).encode('utf8')).digest()
+        first, second = struct.unpack('<QQ', digest)
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position // 8] |= 1 << (position % 8)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position // 8] & (1 << (position % 8))
+                   for position in self.positions(item))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def memory(self):
+        """
+        Number of bytes used by the bits of the filter.
+        """
+        return len(self.bits)
+
+    def error_rate(self):
+        """
+        Returns the expected false positive rate at the current fill.
+        """
+        return (1 - (1 - 1.0 / self.size) ** (self.hashes * self.count)) \
+            ** self.hashes
+
+
+class FollowFilters(object):
+    """
+    LRU cache of the follow set filters of users, with lookup statistics.
+    """
+
+    def __init__(self):
+        self.cache = LRUCache(0)
+        self.lock = Lock()
+        self.negatives = self.checks = self.false_positives = 0
+        # Users whose filter is being built: [builds, follow generation]
+        self.building = {}
+
+    def configure(self):
+        self.cache.maxsize = actstream_settings.FOLLOW_FILTER_SIZE
+        self.cache.ttl = actstream_settings.FOLLOW_FILTER_TTL
+
+    def build(self, user):
+        """
+        Returns a new filter of the objects followed by user.
+        """
+        if actstream_settings.FOLLOW_ADJACENCY:
+            keys = [(cls_name, pk) for cls_name, pk, actor_only in
+                    adjacency.follow_set(user)]
+        else:
+            Follow = get_document('actstream.Follow')
+            field = db_field(Follow, 'follow_object')
+            cursor = Follow._get_collection().find(
+                {db_field(Follow, 'user'): user.pk}, {field: 1, '_id': 0})
+            keys = [ref_key(doc[field]) for doc in cursor]
+        bloom = BloomFilter(len(keys) * 2 + HEADROOM)
+        for key in keys:
+            bloom.add('%s:%s' % key)
+        return bloom
+
+    def get(self, user):
+        self.configure()
+        bloom = self.cache.get(user.pk)
+        while bloom is None or bloom.count > bloom.capacity:
+            with self.lock:
+                state = self.building.setdefault(user.pk, [0, 0])
+                state[0] += 1
+                generation = state[1]
+            bloom = None
+            try:
+                bloom = self.build(user)
+            finally:
+                with self.lock:
+                    state[0] -= 1
+                    if not state[0]:
+                        del self.building[user.pk]
+                    if state[1] != generation:
+                        # user followed something the build may have missed
+                        bloom = None
+                    elif bloom is not None:
+                        self.cache.set(user.pk, bloom)
+        return bloom
+
+    def might_follow(self, user, obj):
+        """
+        Returns False if user certainly does not follow obj.
+        """
+        if ref_string(obj) in self.get(user):
+            with self.lock:
+                self.checks += 1
+            return True
+        with self.lock:
+            self.negatives += 1
+        return False
+
+    def followed(self, user, obj):
+        """
+        Adds obj to the cached filter of user, if any, and invalidates the
+        filters of user being built.
+        """
+        with self.lock:
+            if user.pk in self.building:
+                self.building[user.pk][1] += 1
+        bloom = self.cache.get(user.pk)
+        if bloom is not None:
+            bloom.add(ref_string(obj))
+
+    def unfollowed(self, user, obj):
+        """
+        Drops the cached filter of user, which cannot forget obj.
+        """
+        self.cache.delete(user.pk)
+
+    def false_positive(self):
+        with self.lock:
+            self.false_positives += 1
+
+    def clear(self):
+        self.cache.clear()
+        with self.lock:
+            self.negatives = self.checks = self.false_positives = 0
+
+    def stats(self):
+        """
+        Returns a dict of the number of cached filters, their memory in
+        bytes and lookup statistics.
+        """
+        with self.cache.lock:
+            blooms = [value for value, expires in self.cache.data.values()]
+        lookups = self.negatives + self.checks
+        return {
+            'users': len(blooms),
+            'memory': sum(bloom.memory for bloom in blooms),
+            'lookups': lookups,
+            'negatives': self.negatives,
+            'checks': self.checks,
+            'false_positives': self.false_positives,
+            'false_positive_rate': (float(self.false_positives) / lookups
+                                    if lookups else 0.0),
+            'expected_false_positive_rate': (
+                sum(bloom.error_rate() for bloom in blooms) / len(blooms)
+                if blooms else 0.0),
+        }
+
+
+follow_filters = FollowFilters()
+stats = follow_filters.stats
@@ -15,10 +15,36 @@ except ImportError:
 
 from mongoengine import fields, Document, CASCADE
 
+from actstream import indexes
 from actstream import settings as actstream_settings
+from actstream.backends import get_backend
+from actstream.fields import (InternedVerbField, FlagField,
+                              CachedGenericReferenceField)
 from actstream.managers import FollowQuerySet
 from actstream.compat import user_model_label, get_user_model
 
+# Stored field names of actions when ACTSTREAM_SETTINGS['COMPACT_ENCODING']
+# is on
+COMPACT_FIELDS = {
+    'actor': 'a',
+    'verb': 'v',
+    'description': 'n',
+    'target': 't',
+    'action_object': 'o',
+    'timestamp': 'ts',
+    'public': 'f',
+    'data': 'd',
+    'occurrences': 'c',
+    'idempotency_key': 'k',
+    'audience': 'u',
+}
+
+
+def action_field(name):
+    if actstream_settings.COMPACT_ENCODING:
+        return COMPACT_FIELDS[name]
+    return name
+
 
 @python_2_unicode_compatible
 class Follow(Document):
@@ -26,7 +52,7 @@ class Follow(Document):
     Lets a user follow the activities of any specific actor
     """
     user = fields.ReferenceField(get_user_model(), reverse_delete_rule=CASCADE)
-    follow_object = fields.GenericReferenceField(unique_with='user')
+    follow_object = CachedGenericReferenceField(unique_with='user')
     actor_only = fields.BooleanField(
         verbose_name=_("Only follow actions where "
                         "the object is the target."),
@@ -76,31 +102,54 @@ class Action(Document):
         <a href="http://oebfare.com/">brosner</a> commented on <a href="http://github.com/pinax/pinax">pinax/pinax</a> 2 hours ago
 
     """
-    actor = fields.GenericReferenceField()
+    actor = CachedGenericReferenceField(db_field=action_field('actor'))
+
+    if actstream_settings.COMPACT_ENCODING:
+        verb = InternedVerbField(max_length=255, db_field=action_field('verb'))
+    else:
+        verb = fields.StringField(max_length=255)
+    description = fields.StringField(null=True,
+                                     db_field=action_field('description'))
+
+    target = CachedGenericReferenceField(required=False, null=True,
+                                         db_field=action_field('target'))
+
+    action_object = CachedGenericReferenceField(
+        required=False, null=True, db_field=action_field('action_object'))
 
-    verb = fields.StringField(max_length=255)
-    description = fields.StringField(null=True)
+    timestamp = fields.DateTimeField(default=now,
+                                     db_field=action_field('timestamp'))
 
-    target = fields.GenericReferenceField(required=False, null=True)
+    if actstream_settings.COMPACT_ENCODING:
+        public = FlagField(default=True, db_field=action_field('public'))
+    else:
+        public = fields.BooleanField(default=True)
 
-    action_object = fields.GenericReferenceField(required=False, null=True)
+    data = fields.DictField(required=False, null=True,
+                            db_field=action_field('data'))
 
-    timestamp = fields.DateTimeField(default=now)
+    occurrences = fields.IntField(default=1,
+                                  db_field=action_field('occurrences'))
 
-    public = fields.BooleanField(default=True)
+    idempotency_key = fields.StringField(
+        required=False, db_field=action_field('idempotency_key'))
 
-    data = fields.DictField(required=False, null=True)
+    audience = fields.ListField(fields.StringField(),
+                                db_field=action_field('audience'))
 
     meta = {
         'ordering': ['-timestamp'],
         'indexes': [
             '-timestamp',
             'verb',
-            'actor',
-            'target',
-            'action_object',
+            ('actor', '-timestamp'),
+            ('target', '-timestamp'),
+            ('action_object', '-timestamp'),
             'public',
-        ],
+            {'fields': ['idempotency_key'], 'unique': True, 'sparse': True},
+            {'fields': ['audience', '-timestamp'], 'sparse': True},
+        ] + ([('actor', 'verb', '-timestamp')]
+             if actstream_settings.COALESCE_VERBS else []),
         'queryset_class': actstream_settings.get_action_manager()
     }
 
@@ -127,17 +176,236 @@ class Action(Document):
         """
         return djtimesince(self.timestamp, now).encode('utf8').replace(b'\xc2\xa0', b' ').decode('utf8')
 
+    @classmethod
+    def ensure_indexes(cls):
+        """
+        Creates the indexes declared in ``meta`` and the reference indexes
+        behind ``document_stream``.
+        """
+        super(Action, cls).ensure_indexes()
+        collection = cls._get_collection()
+        for name, (keys, options) in indexes.reference_specs().items():
+            collection.ensure_index(keys, name=name, background=True,
+                                    **options)
+
+
+@python_2_unicode_compatible
+class ActionCounter(Document):
+    """
+    Number of actions for one verb, actor or target on one day, with an hourly
+    breakdown in ``hours``. Maintained by ``actstream.rollups``.
+    """
+    dimension = fields.StringField(max_length=16)
+    key = fields.StringField()
+    day = fields.DateTimeField()
+    total = fields.IntField(default=0)
+    hours = fields.DictField()
+
+    meta = {
+        'indexes': [
+            {'fields': ['dimension', 'key', 'day'], 'unique': True},
+        ],
+    }
+
+    def __str__(self):
+        return '%s %s %s: %d' % (self.dimension, self.key, self.day, self.total)
+
+
+@python_2_unicode_compatible
+class Verb(Document):
+    """
+    Interned verb of compact encoded actions, see ``actstream.verbs``.
+    """
+    code = fields.IntField(primary_key=True)
+    name = fields.StringField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+def backend_method(name):
+    """
+    Returns a function calling the method called name of the storage backend.
+    """
+    def method(*args, **kwargs):
+        return getattr(get_backend(), name)(*args, **kwargs)
+    method.__name__ = str(name)
+    return method
+
+
+@python_2_unicode_compatible
+class InboxItem(Document):
+    """
+    An action pushed into the stream of a user following one of its
+    ``sources`` (``"ClassName:id"`` strings), see ``actstream.hybrid``.
+    """
+    user = fields.ObjectIdField()
+    action = fields.ObjectIdField()
+    timestamp = fields.DateTimeField()
+    sources = fields.ListField(fields.StringField())
+
+    meta = {
+        'indexes': [
+            {'fields': ['user', 'action'], 'unique': True},
+            ('user', '-timestamp'),
+            ('user', 'sources'),
+        ],
+    }
+
+    def __str__(self):
+        return '%s <- %s' % (self.user, self.action)
+
+
+@python_2_unicode_compatible
+class FollowStats(Document):
+    """
+    Follower count of an object and whether its actions are pulled at read
+    time instead of pushed into inboxes, see ``actstream.hybrid``.
+    """
+    key = fields.StringField(unique=True)
+    followers = fields.IntField(default=0)
+    pull = fields.BooleanField(default=False)
+
+    def __str__(self):
+        return '%s: %d' % (self.key, self.followers)
+
+
+@python_2_unicode_compatible
+class ReadState(Document):
+    """
+    Last seen marker and unread counter of the stream of a user, see
+    ``actstream.unread``.
+    """
+    user = fields.ObjectIdField(unique=True)
+    last_seen = fields.DateTimeField()
+    unread = fields.IntField(default=0)
+
+    def __str__(self):
+        return '%s: %d unread' % (self.user, self.unread)
+
+
+@python_2_unicode_compatible
+class MaintenanceCheckpoint(Document):
+    """
+    Progress of one ``_id`` range of a maintenance task run, see
+    ``actstream.maintenance``.
+    """
+    task = fields.StringField()
+    part = fields.IntField()
+    collection = fields.StringField()
+    lowest = fields.DynamicField()
+    highest = fields.DynamicField()
+    last_id = fields.DynamicField()
+    done = fields.BooleanField(default=False)
+    processed = fields.IntField(default=0)
+    changed = fields.IntField(default=0)
+
+    meta = {
+        'indexes': [
+            {'fields': ['task', 'part'], 'unique': True},
+        ],
+    }
+
+    def __str__(self):
+        return '%s #%d: %d processed, %d changed' % (
+            self.task, self.part, self.processed, self.changed)
+
+
+@python_2_unicode_compatible
+class FollowSuggestions(Document):
+    """
+    Cached follow suggestions of a user, see ``actstream.recommendations``.
+    ``items`` holds ``{'ref': raw reference, 'score': n}`` dicts, best first.
+    """
+    user = fields.ObjectIdField(unique=True)
+    items = fields.ListField(fields.DictField())
+    expires = fields.FloatField()
+
+    def __str__(self):
+        return '%s: %d suggestions' % (self.user, len(self.items))
+
+
+@python_2_unicode_compatible
+class LastActivity(Document):
+    """
+    Timestamp and id of the most recent action of an object, see
+    ``actstream.recency``.
+    """
+    cls = fields.StringField()
+    object_id = fields.DynamicField()
+    timestamp = fields.DateTimeField()
+    action = fields.ObjectIdField()
+
+    meta = {
+        'indexes': [
+            {'fields': ['cls', 'object_id'], 'unique': True},
+            ('cls', '-timestamp', '-object_id'),
+        ],
+    }
+
+    def __str__(self):
+        return '%s:%s %s' % (self.cls, self.object_id, self.timestamp)
+
+
+@python_2_unicode_compatible
+class Digest(Document):
+    """
+    Actions a user missed during a time window, see ``actstream.digests``.
+    ``items`` holds ``{'action': id, 'timestamp': timestamp}`` dicts, newest
+    first.
+    """
+    user = fields.ObjectIdField()
+    name = fields.StringField()
+    items = fields.ListField(fields.DictField())
+
+    meta = {
+        'indexes': [
+            {'fields': ['user', 'name'], 'unique': True},
+            'name',
+        ],
+    }
+
+    def __str__(self):
+        return '%s %s: %d actions' % (self.user, self.name, len(self.items))
+
+
+@python_2_unicode_compatible
+class FollowAdjacency(Document):
+    """
+    A chunk of the objects followed by a user, see ``actstream.adjacency``.
+    ``entries`` holds ``{'c': class name, 'i': id, 'a': actor_only}`` dicts.
+    """
+    user = fields.DynamicField()
+    size = fields.IntField(default=0)
+    entries = fields.ListField(fields.DictField())
+
+    meta = {
+        'indexes': [
+            ('user', 'size'),
+        ],
+    }
+
+    def __str__(self):
+        return '%s: %d follows' % (self.user, self.size)
+
+
+if not actstream_settings.AUTO_CREATE_INDEXES:
+    indexes.disable_auto_create()
 
 
 # convenient accessors
-actor_stream = Action.objects.actor
-action_object_stream = Action.objects.action_object
-target_stream = Action.objects.target
-user_stream = Action.objects.user
-document_stream = Action.objects.document_actions
-any_stream = Action.objects.any
-followers = Follow.objects.followers
-following = Follow.objects.following
+actor_stream = backend_method('actor_stream')
+action_object_stream = backend_method('action_object_stream')
+target_stream = backend_method('target_stream')
+user_stream = backend_method('user_stream')
+document_stream = backend_method('document_stream')
+any_stream = backend_method('any_stream')
+aggregated_actor_stream = Action.objects.actor_aggregated
+aggregated_target_stream = Action.objects.target_aggregated
+aggregated_user_stream = Action.objects.user_aggregated
+audience_stream = Action.objects.audience
+followers = backend_method('followers')
+following = backend_method('following')
 
 
 if django.VERSION[:2] < (1, 7):
@@ -0,0 +1,165 @@
+"""
+Pagination of streams without unbounded counts.
+
+``paginate`` fetches one action more than the page size to know whether a
+next page exists, and counts the stream according to a count mode:
+
+``probe`` (default)
+    No count, only ``has_next``.
+``capped``
+    Counts up to ``STREAM_COUNT_CAP`` actions; larger streams are reported
+    as ``"1000+"``.
+``estimated``
+    Sums the ``actstream.rollups`` counters of the objects of the stream
+    (all actions, public or not, are counted). Needs ``ROLLUPS``; streams
+    without counters fall back to ``capped``.
+``exact``
+    The size of the stream, for small streams only.
+
+Example::
+
+    from actstream.pagination import paginate
+
+    page = paginate('user', request.user, page=2, per_page=20, count='capped')
+    page.object_list, page.has_next, page.count_display
+"""
+from mongoengine.base import get_document
+
+from actstream import partitions
+from actstream import rollups
+from actstream import settings as actstream_settings
+from actstream.backends import get_backend
+from actstream.utils import db_field
+
+COUNT_MODES = ('probe', 'capped', 'estimated', 'exact')
+
+# Name of the queryset method of each stream on Action.objects
+QUERYSET_METHODS = {
+    'actor': 'actor',
+    'target': 'target',
+    'action_object': 'action_object',
+    'document': 'document_actions',
+    'any': 'any',
+    'user': 'user',
+}
+
+
+class StreamPage(object):
+    """
+    A page of a stream. ``count`` is None in ``probe`` mode, a lower bound
+    for capped counts that reached the cap and an estimate in ``estimated``
+    mode; ``exact`` tells whether it is the actual size of the stream.
+    """
+
+    def __init__(self, object_list, number, per_page, has_next):
+        self.object_list = object_list
+        self.number = number
+        self.per_page = per_page
+        self.has_next = has_next
+        self.count = None
+        self.exact = False
+        self.estimated = False
+
+    @property
+    def has_previous(self):
+        return self.number > 1
+
+    @property
+    def num_pages(self):
+        """
+        Number of pages, or None when the count is unknown or not exact.
+        """
+        if self.count is None or not self.exact:
+            return None
+        return max(1, (self.count + self.per_page - 1) // self.per_page)
+
+    @property
+    def count_display(self):
+        if self.count is None:
+            return ''
+        if self.estimated:
+            return '~%d' % self.count
+        return '%d%s' % (self.count, '' if self.exact else '+')
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __repr__(self):
+        return '<StreamPage %d>' % self.number
+
+
+def capped_count(queryset, cap):
+    """
+    Counts queryset up to cap. Returns ``(count, exact)``.
+    """
+    if actstream_settings.PARTITION_ACTIONS:
+        count = len(partitions.route(queryset.only('id'), limit=cap + 1))
+    else:
+        count = queryset.limit(cap + 1).count(True)
+    if count > cap:
+        return cap, False
+    return count, True
+
+
+def estimated_count(name, obj):
+    """
+    Returns the rollup estimate of the size of a stream, or None when the
+    stream has no counters. The estimate of an ``any`` stream adds the
+    actor and target counters of obj, so actions where obj is both are
+    counted twice and its actions as action object are not counted.
+    """
+    if not actstream_settings.ROLLUPS:
+        return None
+    if name in ('actor', 'target'):
+        return rollups.total(name, obj)
+    if name == 'any':
+        return rollups.total('actor', obj) + rollups.total('target', obj)
+    if name == 'user':
+        Follow = get_document('actstream.Follow')
+        field = db_field(Follow, 'follow_object')
+        actors, others = [], []
+        for follow in Follow._get_collection().find(
+                {db_field(Follow, 'user'): obj.pk},
+                {field: 1, db_field(Follow, 'actor_only'): 1}):
+            actors.append(follow[field])
+            if not follow.get(db_field(Follow, 'actor_only'), True):
+                others.append(follow[field])
+        return rollups.total_of('actor', actors) + \
+            rollups.total_of('target', others)
+    return None
+
+
+def paginate(name, obj, page=1, per_page=20, count='probe', **kwargs):
+    """
+    Returns a ``StreamPage`` of the stream called name (``actor``,
+    ``target``, ``action_object``, ``document``, ``any`` or ``user``) of obj.
+    Other keyword arguments are passed to the stream.
+    """
+    if count not in COUNT_MODES:
+        raise ValueError('Unknown count mode %r' % count)
+    if page < 1:
+        raise ValueError('Invalid page number %r' % page)
+    offset = (page - 1) * per_page
+    stream = getattr(get_backend(), '%s_stream' % name)
+    actions = list(stream(obj, _offset=offset, _limit=offset + per_page + 1,
+                          **kwargs))
+    result = StreamPage(actions[:per_page], page, per_page,
+                        len(actions) > per_page)
+    if count == 'probe':
+        return result
+
+    if count == 'estimated':
+        estimate = estimated_count(name, obj)
+        if estimate is not None:
+            result.count, result.estimated = estimate, True
+            return result
+    if count == 'exact':
+        result.count, result.exact = get_backend().count_stream(
+            name, obj, **kwargs)
+    else:
+        result.count, result.exact = get_backend().count_stream(
+            name, obj, cap=actstream_settings.STREAM_COUNT_CAP, **kwargs)
+    return result
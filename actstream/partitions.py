@@ -0,0 +1,256 @@
+"""
+Month partitioned action collections.
+
+With ``ACTSTREAM_SETTINGS['PARTITION_ACTIONS']`` on, the mongoengine backend
+writes every action to a collection named after the month of its timestamp
+(eg. ``action_201405``) and streams walk the partitions backwards, newest
+first, querying each one only until the requested page is filled. Queries
+bounded by ``timestamp`` skip partitions outside of the bounds. Actions
+stored before partitioning was switched on stay in the ``action`` collection,
+which is read as the oldest partition.
+
+Old data is removed by dropping whole partitions::
+
+    from actstream import partitions
+
+    partitions.drop_partitions(before=datetime(2013, 1, 1))
+"""
+import re
+from datetime import datetime
+from threading import Lock
+from time import time
+
+from pymongo.errors import DuplicateKeyError
+
+from mongoengine.base import get_document
+from mongoengine.errors import NotUniqueError
+
+from actstream import settings as actstream_settings
+
+# Seconds the list of partitions is cached in process
+PARTITION_LIST_TTL = 60
+
+_partitions = {'names': None, 'expires': 0}
+_ensured = set()
+_lock = Lock()
+
+
+def base_name():
+    return get_document('actstream.Action')._get_collection_name()
+
+
+def partition_name(timestamp):
+    """
+    Returns the name of the partition holding actions at timestamp.
+    """
+    return '%s_%04d%02d' % (base_name(), timestamp.year, timestamp.month)
+
+
+def partition_month(name):
+    """
+    Returns ``(year, month)`` of a partition, or ``None`` for the base
+    collection.
+    """
+    match = re.match(r'^%s_(\d{4})(\d{2})$' % re.escape(base_name()), name)
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def partition_names():
+    """
+    Returns the names of all partitions, newest first, followed by the base
+    collection.
+    """
+    with _lock:
+        if _partitions['names'] is None or _partitions['expires'] < time():
+            db = get_document('actstream.Action')._get_db()
+            names = [name for name in db.collection_names()
+                     if partition_month(name) is not None]
+            names.sort(reverse=True)
+            _partitions['names'] = names + [base_name()]
+            _partitions['expires'] = time() + PARTITION_LIST_TTL
+        return list(_partitions['names'])
+
+
+def ensure_indexes(collection):
+    """
+    Creates the indexes declared in ``Action.meta``, the reference indexes
+    and the partial indexes of the data schemas on a partition.
+    """
+    from actstream import indexes, schemas
+
+    for spec in get_document('actstream.Action')._meta['index_specs']:
+        options = dict(spec)
+        fields = options.pop('fields')
+        options.pop('cls', None)
+        options.pop('types', None)
+        options.setdefault('background', True)
+        collection.ensure_index(fields, **options)
+    for name, (keys, options) in indexes.reference_specs().items():
+        collection.ensure_index(keys, name=name, background=True, **options)
+    for name, (keys, options) in schemas.index_specs().items():
+        collection.ensure_index(keys, name=name, background=True, **options)
+
+
+def partition_collection(name):
+    """
+    Returns the collection of a partition, creating its indexes on first
+    use in this process unless ``AUTO_CREATE_INDEXES`` is off.
+    """
+    Action = get_document('actstream.Action')
+    collection = Action._get_db()[name]
+    if name not in _ensured and name != base_name():
+        if actstream_settings.AUTO_CREATE_INDEXES:
+            ensure_indexes(collection)
+        with _lock:
+            _ensured.add(name)
+            names = _partitions['names']
+            if names is not None and name not in names:
+                names.insert(0, name)
+                names[:-1] = sorted(names[:-1], reverse=True)
+    return collection
+
+
+def queryset_for(name):
+    """
+    Returns an ``Action`` queryset over one partition.
+    """
+    Action = get_document('actstream.Action')
+    return Action.objects.__class__(Action, partition_collection(name))
+
+
+def insert(action):
+    """
+    Validates and inserts action into the partition of its timestamp.
+
+    Raises ``NotUniqueError`` if its ``idempotency_key`` is taken. The unique
+    index only covers one partition, so the key is also looked up in the
+    other partitions first; two concurrent sends of the same key falling in
+    different months can still both be stored.
+    """
+    action.validate()
+    key = action.idempotency_key
+    if key is not None and route(
+            action.__class__.objects(idempotency_key=key).only('id'),
+            limit=1):
+        raise NotUniqueError('Idempotency key %r is taken' % key)
+    doc = action.to_mongo()
+    try:
+        partition_collection(partition_name(action.timestamp)).insert(doc)
+    except DuplicateKeyError as e:
+        raise NotUniqueError(str(e))
+    action.pk = doc['_id']
+    return action
+
+
+def time_bounds(query):
+    """
+    Returns the ``(lowest, highest)`` timestamps a raw query is limited to.
+    """
+    Action = get_document('actstream.Action')
+    condition = query.get(Action._fields['timestamp'].db_field)
+    lowest = highest = None
+    if isinstance(condition, datetime):
+        lowest = highest = condition
+    elif isinstance(condition, dict):
+        lowest = condition.get('$gte', condition.get('$gt'))
+        highest = condition.get('$lte', condition.get('$lt'))
+    return lowest, highest
+
+
+def partitions_for(query):
+    """
+    Returns the names of the partitions a raw query can match, newest first.
+    """
+    lowest, highest = time_bounds(query)
+    names = []
+    for name in partition_names():
+        month = partition_month(name)
+        if month is not None:
+            if highest is not None and month > (highest.year, highest.month):
+                continue
+            if lowest is not None and month < (lowest.year, lowest.month):
+                continue
+        names.append(name)
+    return names
+
+
+def partition_queryset(queryset, name):
+    """
+    Returns the query of an ``Action`` queryset over the partition name.
+    """
+    qs = queryset_for(name).filter(__raw__=queryset._query)
+    qs._loaded_fields = queryset._loaded_fields
+    return qs
+
+
+def first_queryset(queryset):
+    """
+    Returns the query of an ``Action`` queryset over the first partition
+    ``route`` reads, eg. to explain it, or queryset if there is none.
+    """
+    names = partitions_for(queryset._query)
+    return partition_queryset(queryset, names[0]) if names else queryset
+
+
+def action_collections(query=None):
+    """
+    Returns the collections holding the actions matched by a raw query:
+    its partitions, newest first, when actions are partitioned, or the
+    ``Action`` collection.
+    """
+    if actstream_settings.PARTITION_ACTIONS:
+        return [partition_collection(name)
+                for name in partitions_for(query or {})]
+    return [get_document('actstream.Action')._get_collection()]
+
+
+def action_querysets(queryset):
+    """
+    Returns the query of an ``Action`` queryset over each of the collections
+    holding its actions, see ``action_collections``.
+    """
+    if actstream_settings.PARTITION_ACTIONS:
+        return [partition_queryset(queryset, name)
+                for name in partitions_for(queryset._query)]
+    return [queryset]
+
+
+def route(queryset, offset=None, limit=None):
+    """
+    Evaluates an ``Action`` queryset sorted by ``-timestamp`` against the
+    partitions, newest first, stopping as soon as ``limit`` actions (an end
+    index, like ``queryset[offset:limit]``) are found.
+
+    Returns a list of actions.
+    """
+    if getattr(queryset, '_none', False):
+        return []
+    actions = []
+    for name in partitions_for(queryset._query):
+        qs = partition_queryset(queryset, name)
+        if limit:
+            qs = qs.limit(limit - len(actions))
+        actions.extend(qs)
+        if limit and len(actions) >= limit:
+            break
+    return actions[offset or 0:limit]
+
+
+def drop_partitions(before):
+    """
+    Drops the partitions of all months before the month of ``before``.
+    Returns the names of the dropped partitions.
+    """
+    db = get_document('actstream.Action')._get_db()
+    dropped = []
+    for name in partition_names():
+        month = partition_month(name)
+        if month is not None and month < (before.year, before.month):
+            db.drop_collection(name)
+            dropped.append(name)
+    with _lock:
+        _partitions['names'] = None
+        _ensured.difference_update(dropped)
+    return dropped
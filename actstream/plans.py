@@ -0,0 +1,180 @@
+"""
+Query plan checks for the public streams.
+
+``stream_plans`` runs the query behind every stream under ``explain()`` and
+``check_plans`` lists the ways a plan falls short: a collection scan, an
+in-memory sort or more documents examined than the page needs. Streams built
+from an ``$or`` must answer every clause from an index in timestamp order,
+only the merge of the clauses may be sorted in memory. Used by
+``actstream.tests.test_query_plans`` to catch index regressions in
+``Action.meta`` and ``Follow.meta``, and handy from a shell against a copy
+of production data::
+
+    from actstream import plans
+
+    result = plans.stream_plans(user, group)
+    print(plans.report(result))
+
+Both the explain format of MongoDB 3.0+ (``queryPlanner`` and
+``executionStats``) and the older cursor format are understood.
+"""
+from mongoengine.base import get_document
+
+
+def or_clauses(query):
+    """
+    Returns the number of clauses of the largest ``$or`` of query, or 1.
+    """
+    clauses = 1
+    if isinstance(query, dict):
+        for key, value in query.items():
+            if key == '$or':
+                clauses = max(clauses, len(value))
+            clauses = max(clauses, or_clauses(value))
+    elif isinstance(query, (list, tuple)):
+        for value in query:
+            clauses = max(clauses, or_clauses(value))
+    return clauses
+
+
+def contains(stage, name):
+    """
+    Returns whether stage or one of its input stages is a name stage.
+    """
+    if stage['stage'] == name:
+        return True
+    children = stage.get('inputStages', [])
+    if 'inputStage' in stage:
+        children = [stage['inputStage']] + children
+    return any(contains(child, name) for child in children)
+
+
+class Plan(object):
+    """
+    Summary of the winning plan of one query.
+    """
+
+    def __init__(self, name, explanation, limit=None, clauses=1):
+        self.name = name
+        self.limit = limit
+        self.clauses = clauses
+        self.explanation = explanation
+        self.indexes = []
+        self.stages = []
+        self.sorted_in_memory = False
+        self.merge_sorted = False
+        if 'queryPlanner' in explanation:
+            self._read_stages(explanation['queryPlanner']['winningPlan'])
+            stats = explanation.get('executionStats', {})
+            self.examined = stats.get('totalDocsExamined', 0)
+            self.returned = stats.get('nReturned', 0)
+        else:
+            self._read_cursor(explanation)
+            self.examined = explanation.get('nscannedObjects', 0)
+            self.returned = explanation.get('n', 0)
+
+    def _read_stages(self, stage, branch=False):
+        self.stages.append(stage['stage'])
+        if stage['stage'] == 'IXSCAN':
+            self.indexes.append(stage['indexName'])
+        elif stage['stage'] == 'SORT':
+            # A sort above the ``$or`` merges its clauses, one within a
+            # clause means the clause is not read in index order
+            if not branch and contains(stage, 'OR'):
+                self.merge_sorted = True
+            else:
+                self.sorted_in_memory = True
+        branch = branch or stage['stage'] in ('OR', 'SORT_MERGE')
+        children = stage.get('inputStages', [])
+        if 'inputStage' in stage:
+            children = [stage['inputStage']] + children
+        for child in children:
+            self._read_stages(child, branch)
+
+    def _read_cursor(self, explanation):
+        for clause in explanation.get('clauses', [explanation]):
+            cursor = clause.get('cursor', '')
+            self.stages.append(cursor.split(' ')[0])
+            if cursor.startswith('BtreeCursor '):
+                self.indexes.append(cursor.split(' ')[1])
+            if clause.get('scanAndOrder'):
+                self.sorted_in_memory = True
+        if explanation.get('scanAndOrder'):
+            if 'clauses' in explanation:
+                self.merge_sorted = True
+            else:
+                self.sorted_in_memory = True
+
+    @property
+    def collection_scan(self):
+        return any(stage in ('COLLSCAN', 'BasicCursor')
+                   for stage in self.stages)
+
+    def __str__(self):
+        return '%-22s %-32s examined %5d returned %5d%s' % (
+            self.name, ','.join(self.indexes) or '-', self.examined,
+            self.returned, ' SORT' if self.sorted_in_memory
+            else ' MERGE' if self.merge_sorted else '')
+
+
+def stream_querysets(user, obj, limit=20):
+    """
+    Returns ``(name, queryset)`` tuples of the queries behind the streams
+    of user and obj, pages sliced to limit actions.
+    """
+    Action = get_document('actstream.Action')
+    Follow = get_document('actstream.Follow')
+    objects = Action.objects
+    return [
+        ('actor_stream', objects.stream_queryset('actor', obj)[:limit]),
+        ('target_stream', objects.stream_queryset('target', obj)[:limit]),
+        ('action_object_stream',
+         objects.stream_queryset('action_object', obj)[:limit]),
+        ('user_stream', objects.stream_queryset('user', user)[:limit]),
+        ('document_stream',
+         objects.stream_queryset('document_actions', obj.__class__)[:limit]),
+        ('any_stream', objects.stream_queryset('any', obj)[:limit]),
+        ('followers', Follow.objects.for_object(obj)),
+        ('following', Follow.objects.filter(user=user)),
+        ('is_following',
+         Follow.objects.filter(user=user, follow_object=obj).limit(1)),
+    ]
+
+
+def stream_plans(user, obj, limit=20):
+    """
+    Explains the streams of user and obj and returns a list of ``Plan``.
+    """
+    plans = []
+    for name, queryset in stream_querysets(user, obj, limit):
+        plans.append(Plan(name, queryset.explain(),
+                          limit if name.endswith('_stream') else None,
+                          or_clauses(queryset._query)))
+    return plans
+
+
+def check_plans(plans, slack=2):
+    """
+    Returns a list of problems found in plans. Streams may examine up to
+    slack times the documents of a page (or of their result when they are
+    not paged) for each clause of their ``$or``, and may only sort in memory
+    to merge the clauses of their ``$or``.
+    """
+    problems = []
+    for plan in plans:
+        if plan.collection_scan or not plan.indexes:
+            problems.append('%s scans the collection' % plan.name)
+        if plan.sorted_in_memory:
+            problems.append('%s sorts in memory' % plan.name)
+        bound = slack * (plan.limit or max(plan.returned, 1)) * plan.clauses
+        if plan.examined > bound:
+            problems.append('%s examined %d documents, expected at most %d'
+                            % (plan.name, plan.examined, bound))
+    return problems
+
+
+def report(plans):
+    """
+    Returns a one line per stream text report of plans.
+    """
+    return '\n'.join(str(plan) for plan in plans)
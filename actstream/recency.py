@@ -0,0 +1,114 @@
+"""
+Last activity of actionable objects.
+
+When ``ACTSTREAM_SETTINGS['LAST_ACTIVITY']`` is on, ``action_handler`` keeps
+one ``LastActivity`` document per object appearing as actor, target or action
+object, holding the timestamp and id of its most recent action. Objects of a
+class can then be listed most recently active first without querying
+``Action``::
+
+    from actstream.recency import recently_active
+
+    page = recently_active(Group, limit=20)
+    # next page
+    obj, timestamp = page[-1]
+    page = recently_active(Group, limit=20, before=(timestamp, obj.pk))
+
+``rebuild()`` recomputes the documents from the ``Action`` collection, eg.
+when the feature is switched on for existing data.
+"""
+from mongoengine.base import get_document
+
+from actstream import partitions
+from actstream.registry import check
+from actstream.utils import db_field, ref_key
+
+ROLES = ('actor', 'target', 'action_object')
+
+
+def _collection():
+    return get_document('actstream.LastActivity')._get_collection()
+
+
+def _touch(bulk, key, timestamp, action_id):
+    # MongoDB keeps milliseconds, the second update matches the stored value
+    timestamp = timestamp.replace(
+        microsecond=timestamp.microsecond // 1000 * 1000)
+    selector = {'cls': key[0], 'object_id': key[1]}
+    bulk.find(selector).upsert().update_one({'$max': {'timestamp': timestamp}})
+    selector['timestamp'] = timestamp
+    bulk.find(selector).update_one({'$set': {'action': action_id}})
+
+
+def record(action):
+    """
+    Moves the last activity of the actor, target and action object of action
+    to its timestamp, unless they were active more recently.
+    """
+    bulk = _collection().initialize_ordered_bulk_op()
+    keys = set(ref_key(action._data.get(role)) for role in ROLES) - set([None])
+    for key in keys:
+        _touch(bulk, key, action.timestamp, action.pk)
+    if keys:
+        bulk.execute()
+
+
+def forget(document):
+    """
+    Removes the last activity of a deleted document.
+    """
+    _collection().remove({'cls': document._class_name,
+                          'object_id': document.pk})
+
+
+def recently_active(document_class, limit=20, before=None):
+    """
+    Returns up to limit ``(object, timestamp)`` tuples of document_class
+    objects, most recently active first. Pass the ``(timestamp, pk)`` of the
+    last item of a page as before to get the next one.
+    """
+    check(document_class)
+    query = {'cls': document_class._class_name}
+    if before is not None:
+        timestamp, pk = before
+        query['$or'] = [
+            {'timestamp': {'$lt': timestamp}},
+            {'timestamp': timestamp, 'object_id': {'$lt': pk}},
+        ]
+    rows = list(_collection().find(query).sort(
+        [('timestamp', -1), ('object_id', -1)]).limit(limit))
+    objects = document_class.objects.in_bulk([row['object_id'] for row in rows])
+    return [(objects[row['object_id']], row['timestamp']) for row in rows
+            if row['object_id'] in objects]
+
+
+def rebuild():
+    """
+    Recomputes the last activity of every object from the actions, of all
+    partitions when actions are partitioned.
+    """
+    Action = get_document('actstream.Action')
+    get_document('actstream.LastActivity').drop_collection()
+    timestamp = db_field(Action, 'timestamp')
+    for role in ROLES:
+        field = db_field(Action, role)
+        queryset = Action.objects(__raw__={field: {'$ne': None}})
+        for qs in partitions.action_querysets(queryset):
+            rows = qs.aggregate(
+                {'$sort': {timestamp: -1}},
+                {'$group': {
+                    '_id': '$%s' % field,
+                    'timestamp': {'$first': '$%s' % timestamp},
+                    'action': {'$first': '$_id'},
+                }}, allowDiskUse=True)
+            bulk, pending = _collection().initialize_ordered_bulk_op(), 0
+            for row in rows:
+                _touch(bulk, ref_key(row['_id']), row['timestamp'],
+                       row['action'])
+                pending += 1
+                if pending >= 1000:
+                    bulk.execute()
+                    bulk = _collection().initialize_ordered_bulk_op()
+                    pending = 0
+            if pending:
+                bulk.execute()
@@ -0,0 +1,223 @@
+"""
+Follow suggestions ("people you may want to follow").
+
+Candidates are the objects followed by the users a user follows, scored by
+the number of those users following them. The traversal works on raw
+``Follow`` documents, so no edge is dereferenced, and both hops are capped:
+at most ``SUGGESTION_FANOUT`` followed users (the most recently followed)
+are expanded, and at most ``SUGGESTION_FANOUT`` follows (the most recent)
+of each of them are counted.
+
+Example::
+
+    from actstream.recommendations import suggestions
+
+    for obj, score in suggestions(request.user, User, limit=5):
+        ...
+
+Results are cached per user in ``FollowSuggestions`` documents for
+``SUGGESTION_CACHE_TTL`` seconds (off by default) and updated in place when
+the user follows or unfollows.
+"""
+from time import time
+
+from mongoengine.base import get_document
+
+from actstream import settings as actstream_settings
+from actstream.compat import get_user_model
+from actstream.utils import bulk_dereference, db_field, generic_ref, ref_key
+
+BATCH_SIZE = 500
+
+# Number of candidates kept in the cache of a user
+CACHED_SUGGESTIONS = 100
+
+
+def _follows():
+    return get_document('actstream.Follow')._get_collection()
+
+
+def _cache():
+    return get_document('actstream.FollowSuggestions')._get_collection()
+
+
+def followed_refs(user_id, limit=None):
+    """
+    Returns the raw references of the objects followed by user_id, most
+    recently followed first.
+    """
+    Follow = get_document('actstream.Follow')
+    field = db_field(Follow, 'follow_object')
+    cursor = _follows().find({db_field(Follow, 'user'): user_id}, {field: 1}) \
+        .sort(db_field(Follow, 'started'), -1)
+    if limit:
+        cursor = cursor.limit(limit)
+    return [doc[field] for doc in cursor]
+
+
+def followed_user_ids(user_id, limit):
+    """
+    Returns the ids of the users most recently followed by user_id, at most
+    limit of them.
+    """
+    Follow = get_document('actstream.Follow')
+    field = db_field(Follow, 'follow_object')
+    cursor = _follows().find({
+        db_field(Follow, 'user'): user_id,
+        '%s._cls' % field: get_user_model()._class_name,
+    }, {field: 1}).sort(db_field(Follow, 'started'), -1).limit(limit)
+    return [ref_key(doc[field])[1] for doc in cursor]
+
+
+def already_followed(user_id, refs):
+    """
+    Returns the ``ref_key`` of the objects of refs user_id follows.
+    """
+    Follow = get_document('actstream.Follow')
+    field = db_field(Follow, 'follow_object')
+    keys = set()
+    for start in range(0, len(refs), BATCH_SIZE):
+        keys.update(ref_key(doc[field]) for doc in _follows().find({
+            db_field(Follow, 'user'): user_id,
+            field: {'$in': refs[start:start + BATCH_SIZE]},
+        }, {field: 1}))
+    return keys
+
+
+def count_followed(user_ids):
+    """
+    Returns a dict mapping the ``ref_key`` of the objects followed by
+    user_ids to ``[raw reference, number of user_ids following it]``. Only
+    the ``SUGGESTION_FANOUT`` most recent follows of each user are counted.
+    """
+    fanout = actstream_settings.SUGGESTION_FANOUT
+    counts = {}
+    for user_id in user_ids:
+        for ref in followed_refs(user_id, fanout):
+            entry = counts.setdefault(ref_key(ref), [ref, 0])
+            entry[1] += 1
+    return counts
+
+
+def compute(user):
+    """
+    Returns the suggestions of user as ``{'ref': raw reference, 'score': n}``
+    dicts, best first.
+    """
+    hop = followed_user_ids(user.pk, actstream_settings.SUGGESTION_FANOUT)
+    counts = count_followed(hop)
+    counts.pop((user._class_name, user.pk), None)
+    ranked = sorted(counts.values(), key=lambda entry: -entry[1])
+    items = []
+    # Only the best candidates are checked against the follows of user
+    for start in range(0, len(ranked), BATCH_SIZE):
+        chunk = ranked[start:start + BATCH_SIZE]
+        excluded = already_followed(user.pk, [ref for ref, score in chunk])
+        items.extend({'ref': ref, 'score': score} for ref, score in chunk
+                     if ref_key(ref) not in excluded)
+        if len(items) >= CACHED_SUGGESTIONS:
+            break
+    return items[:CACHED_SUGGESTIONS]
+
+
+def cached_items(user):
+    """
+    Returns the cached suggestions of user, computing them when the cache is
+    missing or stale.
+    """
+    ttl = actstream_settings.SUGGESTION_CACHE_TTL
+    cache = _cache()
+    if ttl:
+        doc = cache.find_one({'user': user.pk})
+        if doc is not None and doc['expires'] > time():
+            return doc['items']
+    items = compute(user)
+    if ttl:
+        cache.update({'user': user.pk}, {'$set': {
+            'items': items, 'expires': time() + ttl,
+        }}, upsert=True)
+    return items
+
+
+def suggestions(user, *documents, **kwargs):
+    """
+    Returns up to ``limit`` (default 10) ``(object, score)`` tuples of
+    objects user may want to follow, best first. Pass document classes to
+    only suggest objects of these classes.
+    """
+    limit = kwargs.pop('limit', 10)
+    names = set(document._class_name for document in documents)
+    items = [item for item in cached_items(user)
+             if not names or item['ref']['_cls'] in names][:limit]
+    resolved = bulk_dereference([item['ref'] for item in items])
+    return [(resolved[ref_key(item['ref'])], item['score']) for item in items
+            if ref_key(item['ref']) in resolved]
+
+
+def _add_follows(items, user, user_id, delta):
+    """
+    Adds delta to the score of the candidates followed by user_id.
+    """
+    refs = followed_refs(user_id, actstream_settings.SUGGESTION_FANOUT)
+    excluded = already_followed(user.pk, refs)
+    excluded.add((user._class_name, user.pk))
+    for ref in refs:
+        ref_id = ref_key(ref)
+        if ref_id in excluded:
+            continue
+        item = items.setdefault(ref_id, {'ref': ref, 'score': 0})
+        item['score'] += delta
+        if item['score'] <= 0:
+            del items[ref_id]
+
+
+def _update_cache(user, obj, delta):
+    doc = _cache().find_one({'user': user.pk})
+    if doc is None:
+        return
+    key = (obj._class_name, obj.pk)
+    fanout = actstream_settings.SUGGESTION_FANOUT
+    items = dict((ref_key(item['ref']), item) for item in doc['items'])
+    if delta > 0:
+        items.pop(key, None)
+    else:
+        # The unfollowed object is a candidate again
+        Follow = get_document('actstream.Follow')
+        score = _follows().find({
+            db_field(Follow, 'user'): {
+                '$in': followed_user_ids(user.pk, fanout)},
+            db_field(Follow, 'follow_object'): generic_ref(obj),
+        }).count()
+        if score:
+            items[key] = {'ref': generic_ref(obj), 'score': score}
+    if obj._class_name == get_user_model()._class_name:
+        window = followed_user_ids(user.pk, fanout + 1)
+        if delta < 0 and len(window) >= fanout:
+            # obj may have been out of the fan-out window, and the next
+            # followed user may have entered it
+            ranked = compute(user)
+        else:
+            _add_follows(items, user, obj.pk, delta)
+            if len(window) > fanout:
+                # The least recently followed user left the window
+                _add_follows(items, user, window[fanout], -1)
+            ranked = sorted(items.values(), key=lambda item: -item['score'])
+    else:
+        ranked = sorted(items.values(), key=lambda item: -item['score'])
+    _cache().update({'_id': doc['_id']}, {'$set': {
+        'items': ranked[:CACHED_SUGGESTIONS],
+    }})
+
+
+def followed(user, obj):
+    """
+    Updates the cached suggestions of user after it started following obj.
+    """
+    _update_cache(user, obj, 1)
+
+
+def unfollowed(user, obj):
+    """
+    Updates the cached suggestions of user after it stopped following obj.
+    """
+    _update_cache(user, obj, -1)
@@ -4,31 +4,51 @@ import re
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
-from django.utils.six import string_types
+from django.utils.six import string_types, text_type
 
 
 from mongoengine.base import get_document, TopLevelDocumentMetaclass
 from mongoengine.queryset import Q
-from mongoengine.signals import pre_delete
+from mongoengine.signals import pre_delete, post_save, post_delete
+
+from actstream import partitions
+from actstream import settings as actstream_settings
+from actstream.cache import invalidate_reference
 
 class RegistrationError(Exception):
     pass
 
-def actor_actions(self):
-    Action = get_document('actstream.Action')
-    return Action.objects(actor=self)
-
-def target_actions(self):
-    Action = get_document('actstream.Action')
-    return Action.objects(target=self)
+def relation_actions(role):
+    def actions(self):
+        if actstream_settings.PARTITION_ACTIONS:
+            raise ImproperlyConfigured(
+                '%s_actions only queries the action collection, use '
+                '%s_stream when PARTITION_ACTIONS is on' % (role, role))
+        Action = get_document('actstream.Action')
+        return Action.objects(**{role: self})
+    actions.__name__ = '%s_actions' % role
+    return actions
 
-def action_object_actions(self):
-    Action = get_document('actstream.Action')
-    return Action.objects(action_object=self)
+actor_actions = relation_actions('actor')
+target_actions = relation_actions('target')
+action_object_actions = relation_actions('action_object')
 
 def clear_relations_on_delete(sender, document):
     Action = get_document('actstream.Action')
-    Action.objects(Q(actor=document) | Q(target=document) | Q(action_object=document)).delete()
+    query = Q(actor=document) | Q(target=document) | Q(action_object=document)
+    if actstream_settings.PARTITION_ACTIONS:
+        for name in partitions.partition_names():
+            partitions.queryset_for(name).filter(query).delete()
+    else:
+        Action.objects(query).delete()
+    if actstream_settings.LAST_ACTIVITY:
+        from actstream import recency
+        recency.forget(document)
+    if actstream_settings.FOLLOW_ADJACENCY:
+        from actstream import adjacency
+        from actstream.compat import get_user_model
+        if isinstance(document, get_user_model()):
+            adjacency.forget(document)
 
 def setup_generic_relations(document_class):
     """
@@ -40,6 +60,8 @@ def setup_generic_relations(document_class):
     document_class.action_object_actions = property(action_object_actions)
 
     pre_delete.connect(clear_relations_on_delete, sender=document_class)
+    post_save.connect(invalidate_reference, sender=document_class)
+    post_delete.connect(invalidate_reference, sender=document_class)
 
     relations = {}
     for field in ('actor', 'target', 'action_object'):
@@ -76,30 +98,107 @@ def validate(document_class, exception_class=ImproperlyConfigured):
     return document_class
 
 
+class RegisteredDocument(object):
+    """
+    Metadata of a registered document class, compiled once by ``register``.
+
+    ``options`` holds the keyword arguments passed to ``register``; the
+    ``serializer`` option is a callable returning the Activity Streams
+    object of a document, used by ``actstream.serializers``, and
+    ``data_schemas`` maps verbs to the types of their ``Action.data`` fields,
+    see ``actstream.schemas``.
+    """
+
+    def __init__(self, document_class, relations, options):
+        self.document_class = document_class
+        self.class_name = document_class._class_name
+        self.collection_name = document_class._get_collection_name()
+        self.relations = relations
+        self.options = options
+
+    @property
+    def serializer(self):
+        return self.options.get('serializer')
+
+    def __repr__(self):
+        return '<RegisteredDocument: %s>' % self.class_name
+
+
+def compile_schemas(options_list):
+    """
+    Merges the ``data_schemas`` registration options into a dict mapping
+    verbs to ``{field: type}``.
+    """
+    schemas = {}
+    for options in options_list:
+        for verb, fields in options.get('data_schemas', {}).items():
+            schema = schemas.setdefault(text_type(verb), {})
+            for field, coerce in fields.items():
+                if schema.setdefault(field, coerce) is not coerce:
+                    raise RegistrationError(
+                        'The data field %r of the verb %r is declared with '
+                        'two different types.' % (field, verb))
+    return schemas
+
+
 class ActionableModelRegistry(dict):
+    """
+    Maps registered document classes to their ``RegisteredDocument``.
+    ``schemas`` holds the data schemas declared by all registrations.
+    """
+
+    def __init__(self):
+        super(ActionableModelRegistry, self).__init__()
+        self.names = {}
+        self.schemas = {}
 
-    def register(self, *document_classes):
+    def register(self, *document_classes, **options):
         for cls in document_classes:
             document_class = validate(cls)
-            if document_class not in self:
-                self[document_class] = setup_generic_relations(document_class)
+            others = [info.options for other, info in self.items()
+                      if other is not document_class]
+            if document_class in self:
+                merged = dict(self[document_class].options, **options)
+                self.schemas = compile_schemas(others + [merged])
+                self[document_class].options = merged
+                continue
+            self.schemas = compile_schemas(others + [options])
+            relations = setup_generic_relations(document_class)
+            info = RegisteredDocument(document_class, relations, dict(options))
+            self[document_class] = self.names[info.class_name] = info
 
     def unregister(self, *document_classes):
         for cls in document_classes:
             document_class = validate(cls)
             if document_class in self:
+                del self.names[self[document_class].class_name]
                 del self[document_class]
+        self.schemas = compile_schemas(
+            [info.options for info in self.values()])
+
+    def metadata(self, document):
+        """
+        Returns the ``RegisteredDocument`` of a document, document class or
+        class name, or None if it is not registered.
+        """
+        if isinstance(document, string_types):
+            return self.names.get(document)
+        return self.get(document.__class__) or self.get(document)
 
     def check(self, document_class_or_object):
+        info = self.get(document_class_or_object.__class__) or \
+            self.get(document_class_or_object)
+        if info is not None:
+            return info
         if not isclass(document_class_or_object):
             document_class_or_object = document_class_or_object.__class__
         document_class = validate(document_class_or_object, RuntimeError)
-        if document_class not in self:
-            raise ImproperlyConfigured(
-                'The model %s is not registered. Please use actstream.registry '
-                'to register it.' % document_class.__name__)
+        raise ImproperlyConfigured(
+            'The model %s is not registered. Please use actstream.registry '
+            'to register it.' % document_class.__name__)
 
 registry = ActionableModelRegistry()
 register = registry.register
 unregister = registry.unregister
 check = registry.check
+metadata = registry.metadata
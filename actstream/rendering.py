@@ -0,0 +1,135 @@
+"""
+Rendering of pages of actions as human readable text.
+
+``text_type(action)`` translates its template, computes the time since its
+timestamp and dereferences its actor, target and action object, for every
+action. ``render`` gives the same text for a whole page in one pass: the
+references are resolved with one query per document class, the templates
+are translated once per language, the current time is taken once and every
+referenced document is turned into text once::
+
+    from actstream.rendering import render
+
+    for action, text in zip(actions, render(actions)):
+        ...
+
+With ``ACTSTREAM_SETTINGS['RENDER_CACHE_SIZE']`` set, the text of actions
+(apart from the time since) is also kept in an LRU cache for
+``RENDER_CACHE_TTL`` seconds, keyed by action id, timestamp and language.
+Actions are immutable once stored, except for coalescing which moves their
+timestamp, so only renamed actors, targets and action objects show stale
+text until the entries expire.
+"""
+from __future__ import unicode_literals
+
+from datetime import datetime
+
+from django.utils.six import text_type
+from django.utils.timesince import timesince as djtimesince
+from django.utils.translation import get_language, ugettext
+
+from actstream import settings as actstream_settings
+from actstream.cache import LRUCache
+from actstream.utils import dereference_actions, ref_key
+
+try:
+    from django.utils.timezone import (get_default_timezone, is_aware,
+                                       make_aware, make_naive, utc)
+except ImportError:
+    is_aware, utc = lambda value: False, None
+    get_default_timezone = make_aware = make_naive = None
+
+# The templates of Action.__str__, by the roles an action has
+TEMPLATES = {
+    'full': '%(actor)s %(verb)s %(action_object)s on %(target)s '
+            '%(timesince)s ago',
+    'target': '%(actor)s %(verb)s %(target)s %(timesince)s ago',
+    'action_object': '%(actor)s %(verb)s %(action_object)s %(timesince)s ago',
+    'actor': '%(actor)s %(verb)s %(timesince)s ago',
+}
+
+_translated = {}
+
+rendered_cache = LRUCache(actstream_settings.RENDER_CACHE_SIZE,
+                          actstream_settings.RENDER_CACHE_TTL)
+
+
+def configure():
+    rendered_cache.maxsize = actstream_settings.RENDER_CACHE_SIZE
+    rendered_cache.ttl = actstream_settings.RENDER_CACHE_TTL
+
+
+def templates(language):
+    """
+    Returns the templates translated in the active language, which is
+    language.
+    """
+    translated = _translated.get(language)
+    if translated is None:
+        translated = _translated[language] = dict(
+            (name, ugettext(template)) for name, template in TEMPLATES.items())
+    return translated
+
+
+def template_name(action):
+    if action.target:
+        return 'full' if action.action_object else 'target'
+    return 'action_object' if action.action_object else 'actor'
+
+
+def timesince(timestamp, now):
+    return djtimesince(timestamp, now).replace('\xa0', ' ')
+
+
+def render_partial(action, template, names):
+    """
+    Fills template with everything but the time since, which is left as a
+    ``%(timesince)s`` placeholder.
+    """
+    def name(role):
+        value = getattr(action, role)
+        key = ref_key(value)
+        if key not in names:
+            names[key] = text_type(value).replace('%', '%%')
+        return names[key]
+
+    return template % {
+        'actor': name('actor'),
+        'verb': text_type(action.verb).replace('%', '%%'),
+        'action_object': name('action_object'),
+        'target': name('target'),
+        'timesince': '%(timesince)s',
+    }
+
+
+def render(actions, now=None):
+    """
+    Returns the text of ``Action.__str__`` for each of actions, rendered
+    with the references of the whole page resolved at once. now, naive or
+    aware, is compared with naive and aware timestamps alike.
+    """
+    configure()
+    actions = dereference_actions(list(actions))
+    language = get_language()
+    translated = templates(language)
+    if now is None:
+        now, naive_now = datetime.now(utc), datetime.now()
+    elif is_aware(now):
+        naive_now = make_naive(now, get_default_timezone())
+    else:
+        naive_now = now
+        if utc is not None:
+            now = make_aware(now, get_default_timezone())
+    names = {}
+    texts = []
+    for action in actions:
+        key = (action.pk, action.timestamp, language)
+        partial = rendered_cache.get(key) if rendered_cache.maxsize else None
+        if partial is None:
+            partial = render_partial(
+                action, translated[template_name(action)], names)
+            rendered_cache.set(key, partial)
+        current = now if is_aware(action.timestamp) else naive_now
+        texts.append(partial % {
+            'timesince': timesince(action.timestamp, current)})
+    return texts
@@ -0,0 +1,168 @@
+"""
+Pre-aggregated action counters.
+
+When ``ACTSTREAM_SETTINGS['ROLLUPS']`` is on, ``action_handler`` counts every
+action per verb, actor and target in daily ``ActionCounter`` documents (with
+an hourly breakdown) so dashboards do not have to count ``Action`` documents.
+
+Example::
+
+    from actstream import rollups
+
+    rollups.series('verb', 'joined', start, end, period='hour')
+    rollups.total('actor', request.user)
+"""
+import atexit
+from datetime import timedelta
+from threading import Lock
+
+from django.utils.six import string_types, text_type
+
+from mongoengine.base import get_document
+
+from actstream import settings as actstream_settings
+from actstream.utils import ref_string
+
+DIMENSIONS = ('verb', 'actor', 'target')
+
+
+def counter_key(value):
+    """
+    Returns the counter key of a verb or an object.
+    """
+    if isinstance(value, string_types):
+        return text_type(value)
+    return ref_string(value)
+
+
+def truncate_day(timestamp):
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def increments(action):
+    """
+    Yields ``(dimension, key, day, hour)`` for every counter the action adds
+    to.
+    """
+    day, hour = truncate_day(action.timestamp), action.timestamp.hour
+    for dimension in DIMENSIONS:
+        value = getattr(action, dimension)
+        if value is not None:
+            yield dimension, counter_key(value), day, hour
+
+
+def write(counts):
+    """
+    Applies ``{(dimension, key, day): {hour: n}}`` with one upserted ``$inc``
+    per counter document in a single unordered bulk operation.
+    """
+    if not counts:
+        return
+    bulk = get_document('actstream.ActionCounter')._get_collection() \
+        .initialize_unordered_bulk_op()
+    for (dimension, key, day), hours in counts.items():
+        inc = {'total': sum(hours.values())}
+        for hour, n in hours.items():
+            inc['hours.%d' % hour] = n
+        bulk.find({'dimension': dimension, 'key': key, 'day': day}) \
+            .upsert().update_one({'$inc': inc})
+    bulk.execute()
+
+
+class RollupBuffer(object):
+    """
+    Collects counter increments in process and writes them in one batch once
+    ``size`` distinct counters are pending (or on ``flush()``).
+    """
+
+    def __init__(self, size=None):
+        self.size = size
+        self.pending = {}
+        self.lock = Lock()
+
+    def add(self, action):
+        size = self.size if self.size is not None else \
+            actstream_settings.ROLLUP_BUFFER_SIZE
+        with self.lock:
+            for dimension, key, day, hour in increments(action):
+                hours = self.pending.setdefault((dimension, key, day), {})
+                hours[hour] = hours.get(hour, 0) + 1
+            if len(self.pending) < size:
+                return
+            counts, self.pending = self.pending, {}
+        write(counts)
+
+    def flush(self):
+        with self.lock:
+            counts, self.pending = self.pending, {}
+        write(counts)
+
+buffer = RollupBuffer()
+atexit.register(buffer.flush)
+
+
+def record(action):
+    """
+    Counts action. Called by ``action_handler`` when rollups are enabled.
+    """
+    if actstream_settings.ROLLUP_BUFFER_SIZE:
+        buffer.add(action)
+        return
+    counts = {}
+    for dimension, key, day, hour in increments(action):
+        counts[(dimension, key, day)] = {hour: 1}
+    write(counts)
+
+
+def series(dimension, value, start, end, period='day'):
+    """
+    Returns a list of ``(datetime, count)`` tuples for every day (or hour if
+    ``period`` is ``'hour'``) between start and end, including empty ones.
+    """
+    if period not in ('day', 'hour'):
+        raise ValueError('period must be "day" or "hour", not %r' % period)
+    counters = get_document('actstream.ActionCounter').objects(
+        dimension=dimension, key=counter_key(value),
+        day__gte=truncate_day(start), day__lte=end).only('day', 'total', 'hours')
+    by_day = dict((counter.day.date(), counter) for counter in counters)
+
+    points = []
+    day = truncate_day(start)
+    while day <= end:
+        counter = by_day.get(day.date())
+        if period == 'day':
+            points.append((day, counter.total if counter else 0))
+        else:
+            for hour in range(24):
+                point = day + timedelta(hours=hour)
+                if start <= point <= end:
+                    count = counter.hours.get(str(hour), 0) if counter else 0
+                    points.append((point, count))
+        day += timedelta(days=1)
+    return points
+
+
+def total(dimension, value, start=None, end=None):
+    """
+    Returns the number of actions counted for a verb, actor or target,
+    optionally limited to the days between start and end.
+    """
+    counters = get_document('actstream.ActionCounter').objects(
+        dimension=dimension, key=counter_key(value))
+    if start is not None:
+        counters = counters.filter(day__gte=truncate_day(start))
+    if end is not None:
+        counters = counters.filter(day__lte=end)
+    return int(counters.sum('total'))
+
+
+def total_of(dimension, values):
+    """
+    Returns the number of actions counted for any of several verbs, actors
+    or targets, with one query.
+    """
+    if not values:
+        return 0
+    counters = get_document('actstream.ActionCounter').objects(
+        dimension=dimension, key__in=[counter_key(value) for value in values])
+    return int(counters.sum('total'))
@@ -0,0 +1,209 @@
+"""
+Per-verb schemas of ``Action.data``.
+
+``Action.data`` holds the extra keyword arguments of ``action.send``. The
+fields a verb carries can be declared when registering a document, with the
+type (or any callable) their values are coerced with::
+
+    registry.register(Project, data_schemas={
+        'scored': {'project_id': int, 'score': float},
+    })
+
+``action_handler`` then coerces the declared fields of the actions of the
+verb and rejects values that cannot be coerced with a ``ValueError``. Every
+declared field gets a ``(data.<field>, -timestamp)`` index limited to the
+actions of its verb with a ``partialFilterExpression``. The mongoengine
+backend creates them on the first insert of the verb in a process, unless
+``ACTSTREAM_SETTINGS['AUTO_CREATE_INDEXES']`` is off, in which case
+``python manage.py actstream_indexes build`` does.
+
+Streams accept ``data__<field>`` filters. Filter values of declared fields
+are coerced as well and the filter is split into one clause per verb
+declaring the field, so that MongoDB can use their partial indexes::
+
+    actor_stream(user, data__score__gte=3)
+"""
+import re
+from threading import Lock
+
+from django.utils.six import text_type
+
+from mongoengine.base import get_document
+from mongoengine.queryset import Q
+
+from actstream import partitions
+from actstream import settings as actstream_settings
+from actstream.registry import registry
+
+# Lookups whose value is not a value of the field
+UNCOERCED_LOOKUPS = ('exists', 'size', 'type')
+
+# Lookups taking a list of values of the field
+LIST_LOOKUPS = ('in', 'nin', 'all')
+
+# Verbs whose indexes were created on the current ``Action`` collection
+# object, which mongoengine replaces when the collection is dropped
+_ensured = {'collection': None, 'verbs': set()}
+_lock = Lock()
+
+
+def schema(verb):
+    """
+    Returns the ``{field: type}`` schema of verb, or None.
+    """
+    return registry.schemas.get(text_type(verb))
+
+
+def verbs_declaring(field):
+    return sorted(verb for verb, fields in registry.schemas.items()
+                  if field in fields)
+
+
+def coerce_value(verb, field, coerce, value):
+    if value is None:
+        return None
+    try:
+        return coerce(value)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid value %r for the data field %r of the verb '
+                         '%r' % (value, field, verb))
+
+
+def coerce(verb, data):
+    """
+    Returns data with the fields declared by the schema of verb coerced.
+    """
+    fields = schema(verb)
+    if not fields or not data:
+        return data
+    data = dict(data)
+    for field, convert in fields.items():
+        if field in data:
+            data[field] = coerce_value(verb, field, convert, data[field])
+    return data
+
+
+def index_name(verb, field):
+    return 'data_%s_%s' % (re.sub(r'\W+', '_', verb), field)
+
+
+def index_specs(verbs=None):
+    """
+    Returns a dict mapping the names of the partial indexes of the declared
+    data fields (of verbs, or of all verbs) to ``(keys, options)``.
+    """
+    Action = get_document('actstream.Action')
+    data = Action._fields['data'].db_field
+    timestamp = Action._fields['timestamp'].db_field
+    verb_field = Action._fields['verb']
+    specs = {}
+    for verb in verbs or registry.schemas:
+        for field in registry.schemas.get(verb, ()):
+            specs[index_name(verb, field)] = (
+                [('%s.%s' % (data, field), 1), (timestamp, -1)],
+                {'partialFilterExpression': {
+                    verb_field.db_field: verb_field.to_mongo(verb)}})
+    return specs
+
+
+def ensure_indexes(verb):
+    """
+    Creates the partial indexes of the declared data fields of verb on the
+    action collections, once per process and collection.
+    """
+    if not schema(verb) or not actstream_settings.AUTO_CREATE_INDEXES:
+        return
+    Action = get_document('actstream.Action')
+    base = Action._get_collection()
+    with _lock:
+        if _ensured['collection'] is not base:
+            _ensured['collection'], _ensured['verbs'] = base, set()
+        if verb in _ensured['verbs']:
+            return
+    if actstream_settings.PARTITION_ACTIONS:
+        collections = [partitions.partition_collection(name)
+                       for name in partitions.partition_names()]
+    else:
+        collections = [base]
+    for collection in collections:
+        for name, (keys, options) in index_specs([verb]).items():
+            collection.ensure_index(keys, name=name, background=True,
+                                    **options)
+    with _lock:
+        if _ensured['collection'] is base:
+            _ensured['verbs'].add(verb)
+
+
+def coerce_filter(verb, lookup, value):
+    """
+    Coerces the value of a ``data__<field>`` filter to the type the schema
+    of verb declares for the field.
+    """
+    parts = lookup.split('__')
+    op = parts[2] if len(parts) > 2 else 'exact'
+    if op in UNCOERCED_LOOKUPS:
+        return value
+    convert = registry.schemas[verb][parts[1]]
+    if op in LIST_LOOKUPS:
+        return [coerce_value(verb, parts[1], convert, item) for item in value]
+    return coerce_value(verb, parts[1], convert, value)
+
+
+def declared_lookups(kwargs):
+    """
+    Returns the ``data__<field>`` filters of kwargs on declared fields.
+    """
+    return [lookup for lookup in kwargs
+            if lookup.split('__')[0] == 'data' and len(lookup.split('__')) > 1
+            and verbs_declaring(lookup.split('__')[1])]
+
+
+def data_filters(kwargs):
+    """
+    Coerces the values of the ``data__<field>`` stream filters of declared
+    fields and restricts them to the verbs declaring the field, unless a
+    verb is filtered on already. Values are coerced with the schema of the
+    first verb declaring their field.
+    """
+    for lookup in declared_lookups(kwargs):
+        verbs = verbs_declaring(lookup.split('__')[1])
+        kwargs[lookup] = coerce_filter(verbs[0], lookup, kwargs[lookup])
+        if not any(key.split('__')[0] == 'verb' for key in kwargs):
+            if len(verbs) == 1:
+                kwargs['verb'] = verbs[0]
+            else:
+                kwargs['verb__in'] = verbs
+    return kwargs
+
+
+def data_query(kwargs):
+    """
+    Pops the ``data__<field>`` stream filters of declared fields from kwargs
+    and returns them as a Q object with one clause per verb declaring the
+    fields, the values coerced to the types of the verb. Each clause filters
+    on its verb so that MongoDB can use the partial indexes of the verb.
+
+    Returns None when kwargs has no such filter. Filters on verbs declaring
+    none of the fields are left in kwargs, coerced like ``data_filters``.
+    """
+    lookups = declared_lookups(kwargs)
+    if not lookups:
+        return None
+    verbs = set(verbs_declaring(lookups[0].split('__')[1]))
+    for lookup in lookups[1:]:
+        verbs &= set(verbs_declaring(lookup.split('__')[1]))
+    if 'verb' in kwargs:
+        verbs &= set([text_type(kwargs['verb'])])
+    if 'verb__in' in kwargs:
+        verbs &= set(text_type(verb) for verb in kwargs['verb__in'])
+    if not verbs:
+        data_filters(kwargs)
+        return None
+    values = dict((lookup, kwargs.pop(lookup)) for lookup in lookups)
+    q = None
+    for verb in sorted(verbs):
+        clause = Q(verb=verb, **dict(
+            (lookup, coerce_filter(verb, lookup, value))
+            for lookup, value in values.items()))
+        q = clause if q is None else q | clause
+    return q
@@ -0,0 +1,138 @@
+"""
+Serialization of stream pages to `JSON Activity Streams 1.0
+<http://activitystrea.ms/specs/json/1.0/>`_.
+
+Example::
+
+    from actstream.models import user_stream
+    from actstream.serializers import ActivityStreamSerializer
+
+    serializer = ActivityStreamSerializer()
+    data = serializer.serialize(user_stream(request.user, _limit=20))
+
+    # or write a large export incrementally
+    with open('stream.json', 'w') as out:
+        serializer.write(Action.objects.public(), out)
+
+Actors, objects and targets are resolved once per distinct document with one
+query per document class and batch, and their JSON fragments are built once
+per call no matter how many actions refer to them.
+"""
+import json
+from io import StringIO
+
+from django.utils.six import text_type
+
+from actstream.registry import metadata
+from actstream.utils import bulk_dereference, ref_key
+
+ROLES = (
+    ('actor', 'actor'),
+    ('action_object', 'object'),
+    ('target', 'target'),
+)
+
+
+class ActivityStreamSerializer(object):
+    """
+    Turns actions into activity dicts and JSON. Override ``object_fragment``
+    to change how actors, objects and targets are represented.
+    """
+    batch_size = 200
+
+    def __init__(self, batch_size=None):
+        if batch_size is not None:
+            self.batch_size = batch_size
+
+    def object_fragment(self, obj):
+        """
+        Returns the JSON object of an actor, action object or target, built
+        by the ``serializer`` registration option of its class if it has
+        one.
+        """
+        info = metadata(obj)
+        if info is not None and info.serializer is not None:
+            return info.serializer(obj)
+        fragment = {
+            'objectType': obj.__class__.__name__.lower(),
+            'id': text_type(obj.pk),
+            'displayName': text_type(obj),
+        }
+        get_absolute_url = getattr(obj, 'get_absolute_url', None)
+        if get_absolute_url is not None:
+            fragment['url'] = get_absolute_url()
+        return fragment
+
+    def activity(self, action, fragments):
+        """
+        Returns the JSON object of action. fragments maps ``ref_key`` to
+        already built object fragments.
+        """
+        item = {
+            'id': text_type(action.pk),
+            'verb': action.verb,
+            'published': action.timestamp.isoformat(),
+        }
+        for role, name in ROLES:
+            fragment = fragments.get(ref_key(action._data.get(role)))
+            if fragment is not None:
+                item[name] = fragment
+        if action.description:
+            item['content'] = action.description
+        return item
+
+    def batches(self, actions):
+        """
+        Yields lists of at most ``batch_size`` actions. Querysets are read
+        without dereferencing or caching documents.
+        """
+        if hasattr(actions, 'no_dereference'):
+            actions = actions.no_dereference().no_cache()
+        batch = []
+        for action in actions:
+            batch.append(action)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def iter_activities(self, actions):
+        """
+        Yields the activity dicts of actions, a queryset or list of actions.
+        """
+        fragments = {}
+        for batch in self.batches(actions):
+            refs = []
+            for action in batch:
+                for role, _ in ROLES:
+                    value = action._data.get(role)
+                    if value is not None and ref_key(value) not in fragments:
+                        refs.append(value)
+            for key, obj in bulk_dereference(refs).items():
+                fragments[key] = self.object_fragment(obj)
+            for action in batch:
+                yield self.activity(action, fragments)
+
+    def write(self, actions, fileobj):
+        """
+        Writes a JSON collection of the activities of actions to fileobj one
+        activity at a time. Returns the number of activities written.
+        """
+        count = 0
+        fileobj.write(u'{"items": [')
+        for item in self.iter_activities(actions):
+            if count:
+                fileobj.write(u', ')
+            fileobj.write(text_type(json.dumps(item)))
+            count += 1
+        fileobj.write(u'], "totalItems": %d}' % count)
+        return count
+
+    def serialize(self, actions):
+        """
+        Returns the JSON collection of the activities of actions as a string.
+        """
+        fileobj = StringIO()
+        self.write(actions, fileobj)
+        return fileobj.getvalue()
@@ -4,15 +4,110 @@ from django.conf import settings
 SETTINGS = getattr(settings, 'ACTSTREAM_SETTINGS', {})
 
 
-def get_action_manager():
+def import_setting(name, default):
     """
-    Returns the class of the action manager to use from ACTSTREAM_SETTINGS['MANAGER']
+    Imports the object whose Python path is ACTSTREAM_SETTINGS[name]
     """
-    mod = SETTINGS.get('MANAGER', 'actstream.managers.ActionQuerySet')
+    mod = SETTINGS.get(name, default)
     mod_path = mod.split('.')
     try:
         return getattr(__import__('.'.join(mod_path[:-1]), {}, {},
                                   [mod_path[-1]]), mod_path[-1])
     except ImportError:
-        raise ImportError('Cannot import %s try fixing ACTSTREAM_SETTINGS[MANAGER]'
-                          'setting.' % mod)
+        raise ImportError('Cannot import %s try fixing ACTSTREAM_SETTINGS[%s]'
+                          'setting.' % (mod, name))
+
+
+def get_action_manager():
+    """
+    Returns the class of the action manager to use from ACTSTREAM_SETTINGS['MANAGER']
+    """
+    return import_setting('MANAGER', 'actstream.managers.ActionQuerySet')
+
+
+def get_backend_class():
+    """
+    Returns the class of the storage backend to use from ACTSTREAM_SETTINGS['BACKEND']
+    """
+    return import_setting('BACKEND', 'actstream.backends.mongo.MongoEngineBackend')
+
+
+def get_audience_tokens():
+    """
+    Returns the function giving the audience tokens of a viewer from
+    ACTSTREAM_SETTINGS['AUDIENCE_TOKENS']
+    """
+    return import_setting('AUDIENCE_TOKENS', 'actstream.audience.user_tokens')
+
+
+# Maintain hourly/daily action counters (see actstream.rollups)
+ROLLUPS = SETTINGS.get('ROLLUPS', False)
+# Number of pending counter keys buffered in process before they are
+# written in one batch. 0 writes every action straight away.
+ROLLUP_BUFFER_SIZE = SETTINGS.get('ROLLUP_BUFFER_SIZE', 0)
+
+# Store actions with short field names, interned verbs and a flags field
+# (see actstream.compact)
+COMPACT_ENCODING = SETTINGS.get('COMPACT_ENCODING', False)
+
+# Verbs whose repeats are folded into one action, mapped to the window in
+# seconds, eg. {'viewed': 60}
+COALESCE_VERBS = SETTINGS.get('COALESCE_VERBS', {})
+
+# Assemble user streams from per-user inboxes (push) and, for objects with
+# at least PULL_THRESHOLD followers, at read time (pull). See actstream.hybrid
+HYBRID_FEED = SETTINGS.get('HYBRID_FEED', False)
+PULL_THRESHOLD = SETTINGS.get('PULL_THRESHOLD', 10000)
+# Number of recent actions copied into inboxes when a follow starts or an
+# object moves back to the push tier
+INBOX_BACKFILL = SETTINGS.get('INBOX_BACKFILL', 50)
+
+# Number of dereferenced actors, targets and action objects cached in
+# process (0 disables the cache) and their time to live in seconds.
+# See actstream.cache
+REFERENCE_CACHE_SIZE = SETTINGS.get('REFERENCE_CACHE_SIZE', 0)
+REFERENCE_CACHE_TTL = SETTINGS.get('REFERENCE_CACHE_TTL', 60)
+
+# Write actions to one collection per month and route stream queries to the
+# partitions they need (see actstream.partitions)
+PARTITION_ACTIONS = SETTINGS.get('PARTITION_ACTIONS', False)
+
+# Keep unread counters of user streams up to date (see actstream.unread)
+UNREAD_COUNTS = SETTINGS.get('UNREAD_COUNTS', False)
+
+UNREAD_CAP = SETTINGS.get('UNREAD_CAP', 99)
+
+# See actstream.recommendations
+SUGGESTION_FANOUT = SETTINGS.get('SUGGESTION_FANOUT', 200)
+SUGGESTION_CACHE_TTL = SETTINGS.get('SUGGESTION_CACHE_TTL', 0)
+
+# Keep the last activity of actors, targets and action objects up to date
+# (see actstream.recency)
+LAST_ACTIVITY = SETTINGS.get('LAST_ACTIVITY', False)
+
+# Highest count of the capped count mode of actstream.pagination
+STREAM_COUNT_CAP = SETTINGS.get('STREAM_COUNT_CAP', 1000)
+
+# Number of users whose follow set is kept in an in-process bloom filter
+# for is_following, and for how many seconds (see actstream.membership)
+FOLLOW_FILTER_SIZE = SETTINGS.get('FOLLOW_FILTER_SIZE', 0)
+FOLLOW_FILTER_TTL = SETTINGS.get('FOLLOW_FILTER_TTL', 60)
+
+# Let mongoengine create the indexes of the actstream documents on first use
+# (see actstream.indexes)
+AUTO_CREATE_INDEXES = SETTINGS.get('AUTO_CREATE_INDEXES', True)
+
+# Number of rendered action texts kept by actstream.rendering (0 disables
+# the cache) and their time to live in seconds
+RENDER_CACHE_SIZE = SETTINGS.get('RENDER_CACHE_SIZE', 0)
+RENDER_CACHE_TTL = SETTINGS.get('RENDER_CACHE_TTL', 300)
+
+# Time stream and follow queries and explain the first call of every query
+# fingerprint slower than SLOW_STREAM_THRESHOLD seconds (see
+# actstream.slowlog)
+SLOW_STREAM_LOG = SETTINGS.get('SLOW_STREAM_LOG', False)
+SLOW_STREAM_THRESHOLD = SETTINGS.get('SLOW_STREAM_THRESHOLD', 0.1)
+
+# Keep the follow set of every user in a few adjacency documents read by
+# user streams and following() (see actstream.adjacency)
+FOLLOW_ADJACENCY = SETTINGS.get('FOLLOW_ADJACENCY', False)
@@ -0,0 +1,163 @@
+"""
+In-process log of slow stream and follow queries.
+
+With ``ACTSTREAM_SETTINGS['SLOW_STREAM_LOG']`` on, every ``@stream`` method
+of ``ActionQuerySet`` and the ``is_following``, ``followers`` and
+``following`` operations of the mongoengine backend are timed. Calls are
+aggregated by stream name and query fingerprint: the query with every value
+replaced by ``?`` and the lists of ``$in``, ``$nin`` and ``$all`` replaced
+by their size rounded up to a power of ten, so that eg. the user streams of
+users following 50 and 80 objects share a fingerprint.
+
+The first call of a fingerprint taking more than ``SLOW_STREAM_THRESHOLD``
+seconds is run again under ``explain()`` to record the indexes used and the
+documents examined (see ``actstream.plans``). The aggregate is kept in
+process::
+
+    from actstream import slowlog
+
+    print(slowlog.dump())
+    slowlog.clear()
+"""
+from contextlib import contextmanager
+from threading import Lock
+from time import time
+
+from pymongo.errors import OperationFailure
+
+from actstream import settings as actstream_settings
+from actstream.plans import Plan
+
+# Operators whose list values are reduced to their size
+LIST_OPERATORS = ('$in', '$nin', '$all')
+
+# Operators whose list values are lists of subqueries
+LOGICAL_OPERATORS = ('$or', '$and', '$nor')
+
+
+def size_bucket(size):
+    bucket = 1
+    while bucket < size:
+        bucket *= 10
+    return '<=%d' % bucket if size else '0'
+
+
+def normalize(value, operator=None):
+    """
+    Returns the shape of a query value as a string, without its values.
+    """
+    if isinstance(value, dict):
+        return '{%s}' % ', '.join('%s: %s' % (key, normalize(item, key))
+                                  for key, item in sorted(value.items()))
+    if isinstance(value, (list, tuple)):
+        if operator in LOGICAL_OPERATORS:
+            return '[%s]' % ', '.join(normalize(item) for item in value)
+        if operator in LIST_OPERATORS:
+            return '[%s x %s]' % (size_bucket(len(value)),
+                                  normalize(value[0]) if value else '?')
+        return '[?]'
+    return '?'
+
+
+def fingerprint(queryset):
+    """
+    Returns the fingerprint of the query of a queryset.
+    """
+    return '%s %s' % (queryset._collection.name, normalize(queryset._query))
+
+
+class Fingerprint(object):
+    """
+    Timings of the calls of one stream with one query fingerprint.
+    ``plan`` is the ``actstream.plans.Plan`` of the first slow call.
+    """
+
+    def __init__(self, name, fingerprint):
+        self.name = name
+        self.fingerprint = fingerprint
+        self.calls = self.slow_calls = 0
+        self.total = self.slowest = 0.0
+        self.explained = False
+        self.plan = None
+
+    @property
+    def average(self):
+        return self.total / self.calls if self.calls else 0.0
+
+    @property
+    def examined(self):
+        return self.plan.examined if self.plan is not None else None
+
+    def __str__(self):
+        return '%-20s calls %6d slow %6d avg %8.1fms max %8.1fms ' \
+            'examined %6s indexes %s\n    %s' % (
+                self.name, self.calls, self.slow_calls, self.average * 1000,
+                self.slowest * 1000,
+                '-' if self.examined is None else self.examined,
+                ','.join(self.plan.indexes) or '-' if self.plan else '-',
+                self.fingerprint)
+
+
+class SlowLog(object):
+
+    def __init__(self):
+        self.lock = Lock()
+        self.fingerprints = {}
+
+    def record(self, name, queryset, duration, limit=None):
+        """
+        Adds a call of the stream called name to the log, explaining
+        queryset if it is the first slow call of its fingerprint.
+        """
+        key = name, fingerprint(queryset)
+        slow = duration > actstream_settings.SLOW_STREAM_THRESHOLD
+        with self.lock:
+            entry = self.fingerprints.get(key)
+            if entry is None:
+                entry = self.fingerprints[key] = Fingerprint(*key)
+            entry.calls += 1
+            entry.total += duration
+            entry.slowest = max(entry.slowest, duration)
+            entry.slow_calls += slow
+            explain = slow and not entry.explained
+            entry.explained = entry.explained or slow
+        if explain:
+            try:
+                entry.plan = Plan(name, queryset.explain(), limit)
+            except OperationFailure:
+                pass
+
+    def report(self):
+        """
+        Returns the logged fingerprints, most total time first.
+        """
+        with self.lock:
+            entries = list(self.fingerprints.values())
+        return sorted(entries, key=lambda entry: entry.total, reverse=True)
+
+    def dump(self):
+        return '\n'.join(str(entry) for entry in self.report())
+
+    def clear(self):
+        with self.lock:
+            self.fingerprints.clear()
+
+
+slow_log = SlowLog()
+report = slow_log.report
+dump = slow_log.dump
+clear = slow_log.clear
+
+
+@contextmanager
+def timed(name, queryset, limit=None):
+    """
+    Logs the time taken by the block, which runs the query of queryset,
+    when ``SLOW_STREAM_LOG`` is on.
+    """
+    if not actstream_settings.SLOW_STREAM_LOG:
+        yield
+        return
+    start = time()
+    yield
+    slow_log.record(name, queryset, time() - start, limit)
@@ -1,2 +1,26 @@
 from .test_zombies import ZombieTest
 from .test_activity import ActivityTestCase
+from .test_aggregation import AggregationTestCase
+from .test_rollups import RollupsTestCase
+from .test_verbs import VerbRegistryTestCase
+from .test_backends import InMemoryBackendTestCase
+from .test_hybrid import HybridFeedTestCase
+from .test_cache import LRUCacheTestCase
+from .test_export import ExportTestCase
+from .test_serializers import SerializerTestCase
+from .test_partitions import PartitionsTestCase
+from .test_query_plans import QueryPlansTestCase
+from .test_unread import UnreadTestCase
+from .test_maintenance import MaintenanceTestCase
+from .test_recommendations import RecommendationsTestCase
+from .test_recency import RecencyTestCase
+from .test_registry import RegistryTestCase
+from .test_digests import DigestsTestCase
+from .test_pagination import PaginationTestCase, RollupPaginationTestCase
+from .test_audience import AudienceTestCase
+from .test_membership import MembershipTestCase
+from .test_indexes import IndexesTestCase
+from .test_schemas import SchemasTestCase
+from .test_rendering import RenderingTestCase
+from .test_slowlog import SlowLogTestCase
+from .test_adjacency import AdjacencyTestCase
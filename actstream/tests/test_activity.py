@@ -1,5 +1,7 @@
 # -*- coding: utf-8  -*-
 
+from datetime import timedelta
+
 #from django.contrib.auth.models import Group
 
 from django.utils.translation import ugettext_lazy as _
@@ -9,6 +11,7 @@ from django.utils.six import text_type
 
 from mongoengine.django.auth import Group
 
+from actstream import settings as actstream_settings
 from actstream.models import (Action, Follow, document_stream, user_stream,
                               actor_stream, following, followers)
 from actstream.actions import follow, unfollow
@@ -142,3 +145,26 @@ class ActivityTestCase(DataTestCase):
         self.assertNotIn(self.join_action, list(user_stream(self.user1)))
         self.assertIn(self.join_action,
                       list(user_stream(self.user1, with_user_activity=True)))
+
+    def test_idempotency_key(self):
+        first = action.send(self.user1, verb='paid', idempotency_key='abc')[0][1]
+        second = action.send(self.user1, verb='paid', idempotency_key='abc')[0][1]
+        self.assertEqual(first, second)
+        self.assertEqual(Action.objects.filter(verb='paid').count(), 1)
+
+    def test_coalesced_verbs(self):
+        actstream_settings.COALESCE_VERBS = {'viewed': 60}
+        try:
+            first = action.send(self.user1, verb='viewed', target=self.group,
+                                timestamp=self.testdate)[0][1]
+            later = self.testdate + timedelta(seconds=30)
+            second = action.send(self.user1, verb='viewed', target=self.group,
+                                 timestamp=later)[0][1]
+            self.assertEqual(first.pk, second.pk)
+            self.assertEqual(second.occurrences, 2)
+            self.assertEqual(second.timestamp, later)
+            action.send(self.user1, verb='viewed', target=self.group,
+                        timestamp=later + timedelta(minutes=5))
+            self.assertEqual(Action.objects.filter(verb='viewed').count(), 2)
+        finally:
+            actstream_settings.COALESCE_VERBS = {}
@@ -0,0 +1,57 @@
+from actstream import adjacency
+from actstream import settings as actstream_settings
+from actstream.actions import follow, unfollow
+from actstream.models import FollowAdjacency, following, user_stream
+from .base import DataTestCase
+
+
+class AdjacencyTestCase(DataTestCase):
+
+    def setUp(self):
+        super(AdjacencyTestCase, self).setUp()
+        actstream_settings.FOLLOW_ADJACENCY = True
+        adjacency.rebuild()
+
+    def tearDown(self):
+        actstream_settings.FOLLOW_ADJACENCY = False
+        FollowAdjacency.drop_collection()
+        super(AdjacencyTestCase, self).tearDown()
+
+    def test_follow_set(self):
+        self.assertEqual(adjacency.follow_set(self.user1), [
+            (self.User._class_name, self.user2.pk, True)])
+        follow(self.user1, self.group, actor_only=False, send_action=False)
+        follow(self.user1, self.user2, actor_only=False, send_action=False)
+        self.assertEqual(set(adjacency.follow_set(self.user1)), set([
+            (self.User._class_name, self.user2.pk, False),
+            ('Group', self.group.pk, False)]))
+        self.assertEqual(following(self.user1, self.group.__class__),
+                         [self.group])
+        unfollow(self.user1, self.user2)
+        self.assertEqual(following(self.user1), [self.group])
+        self.assertEqual(FollowAdjacency.objects.get(user=self.user1.pk).size, 1)
+
+    def test_user_stream(self):
+        actstream_settings.FOLLOW_ADJACENCY = False
+        expected = list(user_stream(self.user1))
+        actstream_settings.FOLLOW_ADJACENCY = True
+        self.assertEqual(list(user_stream(self.user1)), expected)
+
+    def test_chunks(self):
+        chunk_size = adjacency.CHUNK_SIZE
+        adjacency.CHUNK_SIZE = 1
+        try:
+            follow(self.user1, self.group, send_action=False)
+        finally:
+            adjacency.CHUNK_SIZE = chunk_size
+        self.assertEqual(FollowAdjacency.objects(user=self.user1.pk).count(), 2)
+        self.assertEqual(len(adjacency.follow_set(self.user1)), 2)
+
+    def test_rebuild(self):
+        follow(self.user1, self.group, send_action=False)
+        adjacency.rebuild()
+        collection = FollowAdjacency._get_collection()
+        self.assertIn('user_1_size_1', collection.index_information())
+        self.assertEqual(len(adjacency.follow_set(self.user1)), 2)
+        self.assertNotIn('%s_rebuild' % collection.name,
+                         collection.database.collection_names())
@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from actstream.models import (aggregated_actor_stream, aggregated_target_stream,
+                              aggregated_user_stream)
+from actstream.signals import action
+from .base import DataTestCase
+
+
+class AggregationTestCase(DataTestCase):
+
+    def test_target_groups(self):
+        groups = aggregated_target_stream(self.group)
+        joined = [g for g in groups if g.verb == 'joined'][0]
+        self.assertEqual(joined.count, 2)
+        self.assertEqual(joined.actor_count, 2)
+        self.assertEqual(set(joined.actors), set([self.user1, self.user2]))
+        self.assertEqual(joined.target, self.group)
+        self.assertEqual(joined.timestamp, self.testdate)
+
+    def test_samples(self):
+        groups = aggregated_target_stream(self.group, verb='joined', _samples=1)
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(len(groups[0].actors), 1)
+        self.assertEqual(groups[0].actor_count, 2)
+        self.assertIn('and 1 other joined CoolGroup', str(groups[0]))
+
+    def test_recent_samples(self):
+        action.send(self.user3, verb='joined', target=self.group,
+                    timestamp=self.testdate + timedelta(minutes=1))
+        action.send(self.user1, verb='joined', target=self.group,
+                    timestamp=self.testdate + timedelta(minutes=2))
+        groups = aggregated_target_stream(self.group, verb='joined', _samples=2)
+        self.assertEqual(groups[0].actors, [self.user1, self.user3])
+        self.assertEqual(groups[0].actor_count, 3)
+        self.assertEqual(groups[0].count, 4)
+        self.assertIn('and 2 others joined CoolGroup', str(groups[0]))
+
+    def test_window(self):
+        action.send(self.user3, verb='joined', target=self.group)
+        groups = aggregated_target_stream(self.group, verb='joined')
+        self.assertEqual([g.count for g in groups], [1, 2])
+
+    def test_actor_and_user(self):
+        self.assertEqual(len(aggregated_actor_stream(self.user1)), 3)
+        groups = aggregated_user_stream(self.user1, _limit=1)
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups[0].actors, [self.user2])
+
+    def test_empty_user_stream(self):
+        self.assertEqual(aggregated_user_stream(self.user3), [])
@@ -0,0 +1,42 @@
+from actstream import settings as actstream_settings
+from actstream.models import actor_stream, audience_stream, user_stream
+from actstream.signals import action
+from .base import DataTestCase
+
+
+def team_tokens(viewer):
+    return ['team:1']
+
+
+class AudienceTestCase(DataTestCase):
+
+    def setUp(self):
+        super(AudienceTestCase, self).setUp()
+        self.shared = action.send(self.user2, verb='shared',
+                                  audience=['team:1', self.user3])[0][1]
+
+    def tearDown(self):
+        actstream_settings.SETTINGS.pop('AUDIENCE_TOKENS', None)
+        super(AudienceTestCase, self).tearDown()
+
+    def test_viewer(self):
+        self.assertFalse(self.shared.public)
+        self.assertEqual(self.shared.audience,
+                         ['team:1', '%s:%s' % (self.User._class_name,
+                                               self.user3.pk)])
+        self.assertNotIn(self.shared, actor_stream(self.user2))
+        self.assertNotIn(self.shared, actor_stream(self.user2, _viewer=self.user1))
+        self.assertEqual(actor_stream(self.user2, _viewer=self.user3)[0],
+                         self.shared)
+        self.assertNotIn(self.shared, user_stream(self.user1))
+        self.assertIn(self.shared, user_stream(self.user1, _viewer=self.user3))
+        self.assertNotIn('liked actstream', [
+            action.verb for action in user_stream(self.user1,
+                                                  _viewer=self.user3)])
+        self.assertEqual(list(audience_stream(self.user3)), [self.shared])
+        self.assertEqual(list(audience_stream(self.user1)), [])
+
+    def test_audience_tokens(self):
+        actstream_settings.SETTINGS['AUDIENCE_TOKENS'] = \
+            'actstream.tests.test_audience.team_tokens'
+        self.assertEqual(list(audience_stream(self.user1)), [self.shared])
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from django.test import SimpleTestCase
+
+from mongoengine.django.auth import Group
+
+from actstream import settings as actstream_settings
+from actstream.actions import follow, unfollow, is_following
+from actstream.backends import set_backend
+from actstream.backends.memory import InMemoryBackend
+from actstream.compat import get_user_model
+from actstream.models import (actor_stream, target_stream, any_stream,
+                              document_stream, user_stream, followers, following)
+from actstream.pagination import paginate
+from actstream.registry import register, unregister
+from actstream.signals import action
+
+
+class InMemoryBackendTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.backend = InMemoryBackend()
+        set_backend(self.backend)
+        self.User = get_user_model()
+        register(self.User, Group)
+        self.testdate = datetime(2000, 1, 1)
+        self.user1, self.user2, self.user3 = [
+            self.User(id=ObjectId(), username='user%d' % i) for i in range(1, 4)]
+        self.group = Group(id=ObjectId(), name='CoolGroup')
+
+        action.send(self.user1, verb='joined', target=self.group,
+                    timestamp=self.testdate)
+        follow(self.user1, self.user2, timestamp=self.testdate)
+        action.send(self.user2, verb='joined', target=self.group,
+                    timestamp=self.testdate + timedelta(minutes=1))
+        follow(self.user2, self.group, actor_only=False,
+               timestamp=self.testdate + timedelta(minutes=2))
+        action.send(self.user1, verb='commented on', target=self.group,
+                    timestamp=self.testdate + timedelta(minutes=3))
+
+    def tearDown(self):
+        set_backend(None)
+        unregister(self.User, Group)
+
+    def verbs(self, actions):
+        return [a.verb for a in actions]
+
+    def test_pagination(self):
+        page = paginate('actor', self.user1, per_page=2, count='exact')
+        self.assertEqual((len(page), page.count, page.exact), (2, 3, True))
+        actstream_settings.STREAM_COUNT_CAP = 2
+        try:
+            page = paginate('actor', self.user1, count='capped')
+        finally:
+            actstream_settings.STREAM_COUNT_CAP = 1000
+        self.assertEqual(page.count_display, '2+')
+
+    def test_actor_stream(self):
+        self.assertEqual(self.verbs(actor_stream(self.user1)),
+                         ['commented on', 'started following', 'joined'])
+        self.assertEqual(self.verbs(actor_stream(self.user1, _offset=1, _limit=2)),
+                         ['started following'])
+        self.assertEqual(self.verbs(actor_stream(self.user1, verb='joined')),
+                         ['joined'])
+
+    def test_target_and_any_stream(self):
+        self.assertEqual(len(target_stream(self.group)), 4)
+        self.assertEqual(self.verbs(any_stream(self.user2)),
+                         ['started following', 'joined', 'started following'])
+        self.assertEqual(len(document_stream(Group)), 4)
+
+    def test_user_stream(self):
+        self.assertEqual(self.verbs(user_stream(self.user1)),
+                         ['started following', 'joined'])
+        self.assertEqual(self.verbs(user_stream(self.user2)),
+                         ['commented on', 'started following', 'joined', 'joined'])
+        self.assertEqual(user_stream(self.user3), [])
+        self.assertEqual(len(user_stream(self.user1, with_user_activity=True)), 5)
+
+    def test_hidden_actions(self):
+        action.send(self.user2, verb='hid', public=False)
+        self.assertNotIn('hid', self.verbs(actor_stream(self.user2)))
+
+    def test_follows(self):
+        self.assertTrue(is_following(self.user1, self.user2))
+        self.assertEqual(followers(self.group), [self.user2])
+        self.assertEqual(following(self.user2, Group), [self.group])
+        self.assertEqual(following(self.user2, self.User), [])
+        follow(self.user1, self.user2, send_action=False)
+        self.assertEqual(len(followers(self.user2)), 1)
+        unfollow(self.user1, self.user2)
+        self.assertFalse(is_following(self.user1, self.user2))
+        self.assertEqual(user_stream(self.user1), [])
+
+    def test_coalescing_and_idempotency(self):
+        actstream_settings.COALESCE_VERBS = {'viewed': 60}
+        try:
+            for seconds in (0, 10, 20):
+                action.send(self.user3, verb='viewed', target=self.group,
+                            timestamp=self.testdate + timedelta(seconds=seconds))
+        finally:
+            actstream_settings.COALESCE_VERBS = {}
+        viewed = actor_stream(self.user3)
+        self.assertEqual(len(viewed), 1)
+        self.assertEqual(viewed[0].occurrences, 3)
+
+        first = action.send(self.user3, verb='paid', idempotency_key='k')[0][1]
+        second = action.send(self.user3, verb='paid', idempotency_key='k')[0][1]
+        self.assertTrue(first is second)
@@ -0,0 +1,45 @@
+from time import sleep
+
+from actstream.cache import LRUCache, cached_document, reference_cache
+from actstream.models import actor_stream
+from .base import DataTestCase
+
+
+class LRUCacheTestCase(DataTestCase):
+
+    def test_eviction(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['hits'], 2)
+
+    def test_ttl(self):
+        cache = LRUCache(2, ttl=0.01)
+        cache.set('a', 1)
+        sleep(0.02)
+        self.assertEqual(cache.get('a'), None)
+
+    def test_references(self):
+        reference_cache.maxsize = 100
+        try:
+            reference_cache.clear()
+            actor_stream(self.user1)[0].target
+            key = (self.group._class_name, self.group.pk)
+            self.assertEqual(cached_document(key), self.group)
+
+            cached = actor_stream(self.user1)[0].target
+            cached.name = 'Changed'
+            self.assertNotEqual(cached_document(key).name, 'Changed')
+            self.assertFalse(cached_document(key) is cached_document(key))
+
+            self.group.name = 'Renamed'
+            self.group.save()
+            self.assertEqual(cached_document(key), None)
+        finally:
+            reference_cache.maxsize = 0
+            reference_cache.clear()
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from actstream.actions import follow
+from actstream.digests import build_digests, digest
+from actstream.models import Digest
+from .base import DataTestCase
+
+
+class DigestsTestCase(DataTestCase):
+
+    def tearDown(self):
+        Digest.drop_collection()
+        super(DigestsTestCase, self).tearDown()
+
+    def test_build_digests(self):
+        follow(self.user3, self.group, actor_only=False)
+        end = self.testdate + timedelta(days=1)
+        self.assertEqual(build_digests('daily', self.testdate, end,
+                                       chunk_size=1), 2)
+        self.assertSetEqual(digest(self.user1, 'daily'), [
+            'John Two Dow started following CoolGroup %s ago' % self.timesince,
+            'John Two Dow joined CoolGroup %s ago' % self.timesince,
+        ])
+        self.assertEqual(len(digest(self.user3, 'daily')), 4)
+        self.assertEqual(len(digest(self.user3, 'daily', limit=1)), 1)
+        self.assertEqual(digest(self.user2, 'daily'), [])
@@ -0,0 +1,41 @@
+from io import BytesIO, StringIO
+
+from django.utils.six import text_type
+
+from actstream.export import export_documents, import_documents
+from actstream.models import Action, Follow
+from .base import DataTestCase
+
+
+class ExportTestCase(DataTestCase):
+
+    def roundtrip(self, document_class, buffer_class, format, **filters):
+        fileobj = buffer_class()
+        count = export_documents(document_class, fileobj, format=format, **filters)
+        fileobj.seek(0)
+        document_class.drop_collection()
+        self.assertEqual(import_documents(document_class, fileobj, format=format),
+                         (count, 0))
+        return count
+
+    def test_ndjson(self):
+        actions = list(map(text_type, Action.objects.all()))
+        self.assertEqual(self.roundtrip(Action, StringIO, 'ndjson'), 6)
+        self.assertEqual(list(map(text_type, Action.objects.all())), actions)
+
+    def test_bson(self):
+        self.assertEqual(self.roundtrip(Follow, BytesIO, 'bson'), 2)
+        self.assertEqual(list(Follow.objects(user=self.user1)),
+                         [Follow.objects.get(follow_object=self.user2)])
+
+    def test_filters(self):
+        self.assertEqual(self.roundtrip(Action, StringIO, 'ndjson',
+                                        verbs=['joined']), 2)
+        self.assertEqual(self.roundtrip(Action, StringIO, 'ndjson',
+                                        start=self.testdate.replace(year=2001)), 0)
+
+    def test_duplicates_are_skipped(self):
+        fileobj = StringIO()
+        export_documents(Action, fileobj)
+        fileobj.seek(0)
+        self.assertEqual(import_documents(Action, fileobj, batch_size=4), (0, 6))
@@ -0,0 +1,70 @@
+from mongoengine.django.auth import Group
+
+from actstream import hybrid
+from actstream import settings as actstream_settings
+from actstream.actions import follow, unfollow
+from actstream.models import FollowStats, InboxItem, user_stream
+from actstream.signals import action
+from .base import DataTestCase
+
+
+class HybridFeedTestCase(DataTestCase):
+
+    def setUp(self):
+        actstream_settings.HYBRID_FEED = True
+        actstream_settings.PULL_THRESHOLD = 2
+        hybrid._pull_keys['keys'] = None
+        super(HybridFeedTestCase, self).setUp()
+
+    def tearDown(self):
+        actstream_settings.HYBRID_FEED = False
+        actstream_settings.PULL_THRESHOLD = 10000
+        InboxItem.drop_collection()
+        FollowStats.drop_collection()
+        super(HybridFeedTestCase, self).tearDown()
+
+    def test_push(self):
+        self.assertSetEqual(user_stream(self.user1), [
+            'John Two Dow started following CoolGroup %s ago' % self.timesince,
+            'John Two Dow joined CoolGroup %s ago' % self.timesince,
+        ])
+        self.assertEqual(InboxItem.objects(user=self.user1.pk).count(), 2)
+
+    def test_tiers(self):
+        self.assertFalse(hybrid.is_pulled(self.user2))
+        follow(self.user3, self.user2)
+        self.assertTrue(hybrid.is_pulled(self.user2))
+        action.send(self.user2, verb='posted')
+        self.assertEqual(InboxItem.objects(user=self.user3.pk).count(), 2)
+        self.assertEqual(user_stream(self.user3)[0].verb, 'posted')
+        self.assertEqual(user_stream(self.user1, _limit=1)[0].verb, 'posted')
+
+        unfollow(self.user3, self.user2)
+        self.assertFalse(hybrid.is_pulled(self.user2))
+        self.assertEqual(FollowStats.objects.get(
+            key='%s:%s' % (self.User._class_name, self.user2.pk)).followers, 1)
+        self.assertEqual(user_stream(self.user3), [])
+
+    def test_rebuild_follow_stats(self):
+        FollowStats.drop_collection()
+        hybrid.rebuild_follow_stats()
+        self.assertEqual(FollowStats.objects.count(), 2)
+        self.assertEqual(FollowStats.objects(pull=True).count(), 0)
+
+    def test_with_user_activity(self):
+        self.assertIn(self.join_action,
+                      user_stream(self.user1, with_user_activity=True))
+
+    def test_rebuild_inboxes(self):
+        InboxItem.drop_collection()
+        hybrid.rebuild_follow_stats()
+        hybrid.rebuild_inboxes()
+        self.assertEqual(InboxItem.objects(user=self.user1.pk).count(), 2)
+
+    def test_refollow(self):
+        action.send(self.user1, verb='commented on', target=self.group)
+        self.assertEqual(InboxItem.objects(user=self.user2.pk).count(), 0)
+        follow(self.user2, self.group, send_action=False, actor_only=False)
+        self.assertEqual(InboxItem.objects(user=self.user2.pk).count(), 5)
+        self.assertEqual(FollowStats.objects.get(
+            key='%s:%s' % (Group._class_name, self.group.pk)).followers, 1)
@@ -0,0 +1,41 @@
+from django.core.exceptions import ImproperlyConfigured
+
+from actstream import indexes
+from actstream import settings as actstream_settings
+from actstream.actions import follow
+from actstream.models import Action, Follow
+from actstream.utils import db_field
+from .base import DataTestCase
+
+
+class IndexesTestCase(DataTestCase):
+
+    def tearDown(self):
+        actstream_settings.AUTO_CREATE_INDEXES = True
+        indexes._checked.clear()
+        super(IndexesTestCase, self).tearDown()
+
+    def test_plan_and_build(self):
+        name = '%s_1' % db_field(Action, 'verb')
+        self.assertEqual(indexes.plan(Action), ([], []))
+        indexes.drop(Action, name)
+        self.assertEqual(indexes.plan(Action), ([name], []))
+        self.assertEqual(indexes.build(Action), [name])
+        self.assertEqual(indexes.plan(Action), ([], []))
+
+    def test_report(self):
+        Follow._get_collection().create_index([('user', 1), ('started', -1)])
+        rows = dict((row['name'], row) for row in indexes.report(Follow))
+        self.assertFalse(rows['user_1_started_-1']['declared'])
+        self.assertTrue(rows['user_1']['redundant'])
+        self.assertEqual(rows['user_1']['covered_by'], ['user_1_started_-1'])
+        self.assertFalse(rows['follow_object_1_user_1']['redundant'])
+
+    def test_missing_unique_index(self):
+        actstream_settings.AUTO_CREATE_INDEXES = False
+        indexes.drop(Follow, 'follow_object_1_user_1')
+        self.assertRaises(ImproperlyConfigured, follow, self.user1,
+                          self.group, send_action=False)
+        indexes.build(Follow)
+        follow(self.user1, self.group, send_action=False)
+        self.assertEqual(Follow.objects(user=self.user1).count(), 2)
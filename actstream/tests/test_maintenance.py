@@ -0,0 +1,33 @@
+from mongoengine.django.auth import Group
+
+from actstream import maintenance
+from actstream.models import Action, Follow, MaintenanceCheckpoint
+from .base import DataTestCase
+
+
+class MaintenanceTestCase(DataTestCase):
+
+    def tearDown(self):
+        MaintenanceCheckpoint.drop_collection()
+        super(MaintenanceTestCase, self).tearDown()
+
+    def test_orphans(self):
+        Group._get_collection().remove({'_id': self.group.pk})
+        self.assertEqual(maintenance.run('orphaned_actions', batch_size=2),
+                         (6, 4))
+        self.assertEqual(Action.objects.count(), 2)
+        self.assertEqual(maintenance.run('orphaned_follows'), (2, 1))
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_resume(self):
+        self.assertEqual(maintenance.run('orphaned_actions'), (6, 0))
+        Group._get_collection().remove({'_id': self.group.pk})
+        self.assertEqual(maintenance.run('orphaned_actions'), (6, 4))
+        self.assertEqual(Action.objects.count(), 2)
+        MaintenanceCheckpoint._get_collection().update(
+            {'task': 'orphaned_actions'},
+            {'$set': {'done': False, 'last_id': None}}, multi=True)
+        self.assertEqual(maintenance.run('orphaned_actions'), (8, 4))
+        self.assertEqual(maintenance.run('orphaned_actions', restart=True),
+                         (2, 0))
+        self.assertRaises(ValueError, maintenance.run, 'unknown')
@@ -0,0 +1,58 @@
+from actstream import settings as actstream_settings
+from actstream.actions import follow, is_following, unfollow
+from actstream.membership import BloomFilter, follow_filters, stats
+from .base import DataTestCase
+
+
+class MembershipTestCase(DataTestCase):
+
+    def setUp(self):
+        actstream_settings.FOLLOW_FILTER_SIZE = 10
+        follow_filters.clear()
+        super(MembershipTestCase, self).setUp()
+
+    def tearDown(self):
+        actstream_settings.FOLLOW_FILTER_SIZE = 0
+        follow_filters.clear()
+        super(MembershipTestCase, self).tearDown()
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(100)
+        for i in range(100):
+            bloom.add('User:%d' % i)
+        self.assertTrue(all('User:%d' % i in bloom for i in range(100)))
+        false_positives = sum('Group:%d' % i in bloom for i in range(1000))
+        self.assertTrue(false_positives < 50)
+        self.assertTrue(bloom.error_rate() < 0.02)
+
+    def test_is_following(self):
+        self.assertTrue(is_following(self.user1, self.user2))
+        self.assertFalse(is_following(self.user1, self.group))
+        self.assertFalse(is_following(self.user1, self.user3))
+        follow(self.user1, self.group)
+        self.assertTrue(is_following(self.user1, self.group))
+        unfollow(self.user1, self.group)
+        self.assertFalse(is_following(self.user1, self.group))
+
+        result = stats()
+        self.assertEqual(result['users'], 1)
+        self.assertEqual(result['lookups'], 5)
+        self.assertEqual(result['negatives'], 3)
+        self.assertEqual(result['false_positives'], 0)
+        self.assertTrue(result['memory'] > 0)
+
+    def test_build_race(self):
+        build = follow_filters.build
+
+        def racing_build(user):
+            bloom = build(user)
+            if not racing_build.raced:
+                racing_build.raced = True
+                follow(self.user1, self.group, send_action=False)
+            return bloom
+        racing_build.raced = False
+        follow_filters.build = racing_build
+        try:
+            self.assertTrue(is_following(self.user1, self.group))
+        finally:
+            follow_filters.build = build
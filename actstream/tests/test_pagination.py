@@ -0,0 +1,65 @@
+from actstream import rollups
+from actstream import settings as actstream_settings
+from actstream.models import ActionCounter
+from actstream.pagination import paginate
+from actstream.signals import action
+from .base import DataTestCase
+
+
+class PaginationTestCase(DataTestCase):
+
+    def tearDown(self):
+        actstream_settings.STREAM_COUNT_CAP = 1000
+        super(PaginationTestCase, self).tearDown()
+
+    def test_probe(self):
+        page = paginate('user', self.user1, per_page=1)
+        self.assertEqual(len(page), 1)
+        self.assertTrue(page.has_next)
+        self.assertEqual(page.count, None)
+        page = paginate('user', self.user1, page=2, per_page=1)
+        self.assertFalse(page.has_next)
+        self.assertTrue(page.has_previous)
+
+    def test_counts(self):
+        page = paginate('any', self.group, count='exact')
+        self.assertEqual((page.count, page.num_pages), (4, 1))
+        actstream_settings.STREAM_COUNT_CAP = 3
+        page = paginate('any', self.group, per_page=2, count='capped')
+        self.assertEqual(page.count_display, '3+')
+        self.assertEqual(page.num_pages, None)
+        page = paginate('actor', self.user1, count='estimated')
+        self.assertEqual((page.count, page.exact), (3, True))
+        self.assertRaises(ValueError, paginate, 'actor', self.user1,
+                          count='all')
+        self.assertRaises(ValueError, paginate, 'actor', self.user1, page=0)
+
+    def test_viewer(self):
+        action.send(self.user1, verb='shared', audience=[self.user3])
+        for count in ('capped', 'exact'):
+            page = paginate('actor', self.user1, count=count)
+            self.assertEqual((len(page), page.count), (3, 3))
+            page = paginate('actor', self.user1, count=count,
+                            _viewer=self.user3)
+            self.assertEqual((len(page), page.count), (4, 4))
+
+
+class RollupPaginationTestCase(DataTestCase):
+
+    def setUp(self):
+        actstream_settings.ROLLUPS = True
+        super(RollupPaginationTestCase, self).setUp()
+
+    def tearDown(self):
+        actstream_settings.ROLLUPS = False
+        ActionCounter.drop_collection()
+        super(RollupPaginationTestCase, self).tearDown()
+
+    def test_estimated(self):
+        page = paginate('actor', self.user1, count='estimated')
+        self.assertEqual((page.count, page.exact), (3, False))
+        self.assertEqual(page.num_pages, None)
+        page = paginate('user', self.user1, count='estimated')
+        self.assertIs(page.exact, False)
+        self.assertEqual(page.count, rollups.total_of('actor', [self.user2]))
+        self.assertEqual(page.count, 2)
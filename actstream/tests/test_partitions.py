@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+from io import StringIO
+
+from django.core.exceptions import ImproperlyConfigured
+
+from actstream import maintenance
+from actstream import partitions
+from actstream import recency
+from actstream import settings as actstream_settings
+from actstream.export import export_documents
+from actstream.models import (Action, LastActivity, MaintenanceCheckpoint,
+                              actor_stream)
+from actstream.signals import action
+from .base import DataTestCase
+
+
+class PartitionsTestCase(DataTestCase):
+
+    def setUp(self):
+        actstream_settings.PARTITION_ACTIONS = True
+        partitions._partitions['names'] = None
+        super(PartitionsTestCase, self).setUp()
+
+    def tearDown(self):
+        actstream_settings.PARTITION_ACTIONS = False
+        partitions.drop_partitions(before=datetime.max)
+        super(PartitionsTestCase, self).tearDown()
+
+    def test_insert(self):
+        name = partitions.partition_name(self.testdate)
+        self.assertEqual(Action.objects.count(), 0)
+        self.assertEqual(partitions.partition_names(), [name, 'action'])
+        self.assertEqual(partitions.queryset_for(name).count(), 6)
+        self.assertEqual(len(actor_stream(self.user1)), 3)
+
+    def test_route(self):
+        later = self.testdate + timedelta(days=62)
+        action.send(self.user1, verb='posted', timestamp=later)
+        self.assertEqual(len(partitions.partition_names()), 3)
+        stream = actor_stream(self.user1, _limit=2)
+        self.assertEqual(len(stream), 2)
+        self.assertEqual(stream[0].verb, 'posted')
+        self.assertEqual(partitions.partitions_for(
+            Action.objects(timestamp__gte=later)._query),
+            [partitions.partition_name(later), 'action'])
+
+        dropped = partitions.drop_partitions(before=later)
+        self.assertEqual(dropped, [partitions.partition_name(self.testdate)])
+        self.assertEqual([a.verb for a in actor_stream(self.user1)],
+                         ['posted'])
+
+    def test_idempotency_key(self):
+        first = action.send(self.user1, verb='paid', idempotency_key='p1',
+                            timestamp=self.testdate)[0][1]
+        retried = action.send(self.user1, verb='paid', idempotency_key='p1',
+                              timestamp=self.testdate)[0][1]
+        later = action.send(self.user1, verb='paid', idempotency_key='p1',
+                            timestamp=self.testdate + timedelta(days=62))[0][1]
+        self.assertEqual(retried.pk, first.pk)
+        self.assertEqual(later.pk, first.pk)
+        self.assertEqual(len(actor_stream(self.user1, verb='paid')), 1)
+
+    def test_readers(self):
+        later = self.testdate + timedelta(days=62)
+        action.send(self.user1, verb='posted', timestamp=later)
+        groups = Action.objects.actor_aggregated(self.user1)
+        self.assertEqual([group.verb for group in groups][0], 'posted')
+        self.assertEqual(sum(group.count for group in groups), 4)
+
+        out = StringIO()
+        self.assertEqual(export_documents(Action, out), 7)
+
+        self.assertEqual(maintenance.run('orphaned_actions'), (7, 0))
+        MaintenanceCheckpoint.drop_collection()
+
+        recency.rebuild()
+        self.assertEqual(recency.recently_active(self.User)[0],
+                         (self.user1, later))
+        LastActivity.drop_collection()
+
+        self.assertRaises(ImproperlyConfigured,
+                          lambda: self.user1.actor_actions)
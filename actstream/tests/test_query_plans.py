@@ -0,0 +1,57 @@
+from actstream import plans
+from actstream.signals import action
+from .base import DataTestCase
+
+
+class QueryPlansTestCase(DataTestCase):
+
+    def setUp(self):
+        super(QueryPlansTestCase, self).setUp()
+        for i in range(50):
+            action.send(self.group, verb='announced')
+            action.send(self.user1, verb='commented on', target=self.group)
+            action.send(self.user3, verb='shared', action_object=self.group)
+
+    def test_stream_plans(self):
+        result = plans.stream_plans(self.user2, self.group, limit=10)
+        print('\n' + plans.report(result))
+        self.assertEqual(len(result), 9)
+        self.assertEqual(plans.check_plans(result), [])
+        for plan in result:
+            if plan.limit:
+                self.assertTrue(plan.returned <= plan.limit)
+
+    def test_or_stream_bound(self):
+        explanation = {
+            'queryPlanner': {'winningPlan': {
+                'stage': 'SORT', 'inputStage': {
+                    'stage': 'OR', 'inputStages': [
+                        {'stage': 'IXSCAN', 'indexName': 'actor_1_ts_-1'},
+                        {'stage': 'IXSCAN', 'indexName': 'target_1_ts_-1'},
+                    ]}}},
+            'executionStats': {'totalDocsExamined': 70, 'nReturned': 10}}
+        self.assertEqual(plans.check_plans(
+            [plans.Plan('user_stream', explanation, 10, clauses=3)]), [])
+        self.assertEqual(plans.check_plans(
+            [plans.Plan('user_stream', explanation, 10, clauses=2)]),
+            ['user_stream examined 70 documents, expected at most 40'])
+        self.assertEqual(plans.or_clauses(
+            {'public': True, '$or': [{'a': 1}, {'b': 1}, {'c': 1}]}), 3)
+
+    def test_or_branch_sort(self):
+        explanation = {
+            'queryPlanner': {'winningPlan': {
+                'stage': 'SORT_MERGE', 'inputStages': [
+                    {'stage': 'IXSCAN', 'indexName': 'actor_1_ts_-1'},
+                    {'stage': 'SORT', 'inputStage': {
+                        'stage': 'IXSCAN', 'indexName': 'public_1'}},
+                ]}},
+            'executionStats': {'totalDocsExamined': 10, 'nReturned': 10}}
+        self.assertEqual(plans.check_plans(
+            [plans.Plan('any_stream', explanation, 10, clauses=2)]),
+            ['any_stream sorts in memory'])
+        explanation['queryPlanner']['winningPlan']['inputStages'][1] = {
+            'stage': 'COLLSCAN'}
+        self.assertEqual(plans.check_plans(
+            [plans.Plan('any_stream', explanation, 10, clauses=2)]),
+            ['any_stream scans the collection'])
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from mongoengine.django.auth import Group
+
+from actstream import recency
+from actstream import settings as actstream_settings
+from actstream.models import LastActivity
+from actstream.signals import action
+from .base import DataTestCase
+
+
+class RecencyTestCase(DataTestCase):
+
+    def setUp(self):
+        actstream_settings.LAST_ACTIVITY = True
+        super(RecencyTestCase, self).setUp()
+        self.other = Group.objects.create(name='OtherGroup')
+
+    def tearDown(self):
+        actstream_settings.LAST_ACTIVITY = False
+        LastActivity.drop_collection()
+        super(RecencyTestCase, self).tearDown()
+
+    def test_recently_active(self):
+        later = self.testdate + timedelta(days=1)
+        action.send(self.user3, verb='joined', target=self.other,
+                    timestamp=later)
+        page = recency.recently_active(Group)
+        self.assertEqual([obj for obj, timestamp in page],
+                         [self.other, self.group])
+        self.assertEqual(page[0][1], later)
+
+        action.send(self.user1, verb='left', target=self.group,
+                    timestamp=self.testdate)
+        obj, timestamp = recency.recently_active(Group, limit=1)[0]
+        self.assertEqual(obj, self.other)
+        self.assertEqual(recency.recently_active(
+            Group, before=(timestamp, obj.pk)), [(self.group, self.testdate)])
+
+    def test_rebuild(self):
+        LastActivity.drop_collection()
+        recency.rebuild()
+        self.assertEqual(LastActivity.objects.count(), 4)
+        self.assertEqual(LastActivity.objects.get(
+            object_id=self.group.pk).timestamp, self.testdate)
@@ -0,0 +1,44 @@
+from mongoengine.django.auth import Group
+
+from actstream import settings as actstream_settings
+from actstream.actions import follow, unfollow
+from actstream.models import Follow, FollowSuggestions
+from actstream.recommendations import suggestions
+from .base import DataTestCase
+
+
+class RecommendationsTestCase(DataTestCase):
+
+    def setUp(self):
+        super(RecommendationsTestCase, self).setUp()
+        actstream_settings.SUGGESTION_CACHE_TTL = 3600
+
+    def tearDown(self):
+        actstream_settings.SUGGESTION_CACHE_TTL = 0
+        actstream_settings.SUGGESTION_FANOUT = 200
+        FollowSuggestions.drop_collection()
+        super(RecommendationsTestCase, self).tearDown()
+
+    def test_suggestions(self):
+        self.assertEqual(suggestions(self.user1), [(self.group, 1)])
+        self.assertEqual(suggestions(self.user1, self.User), [])
+        self.assertEqual(suggestions(self.user3), [])
+
+        follow(self.user3, self.group)
+        follow(self.user1, self.user3)
+        self.assertEqual(suggestions(self.user1, Group), [(self.group, 2)])
+        unfollow(self.user1, self.user3)
+        self.assertEqual(suggestions(self.user1), [(self.group, 1)])
+        follow(self.user1, self.group)
+        self.assertEqual(suggestions(self.user1), [])
+        unfollow(self.user1, self.group)
+        self.assertEqual(suggestions(self.user1), [(self.group, 1)])
+
+    def test_fanout(self):
+        actstream_settings.SUGGESTION_FANOUT = 1
+        Follow.objects(user=self.user1).update(set__started=self.testdate)
+        self.assertEqual(suggestions(self.user1), [(self.group, 1)])
+        follow(self.user1, self.user3, send_action=False)
+        self.assertEqual(suggestions(self.user1), [])
+        unfollow(self.user1, self.user3)
+        self.assertEqual(suggestions(self.user1), [(self.group, 1)])
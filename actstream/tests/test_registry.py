@@ -0,0 +1,29 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+from mongoengine.django.auth import Group
+
+from actstream.registry import check, metadata, register, unregister
+from actstream.serializers import ActivityStreamSerializer
+
+
+class RegistryTestCase(SimpleTestCase):
+
+    def tearDown(self):
+        unregister(Group)
+
+    def test_metadata(self):
+        self.assertRaises(ImproperlyConfigured, check, Group)
+        self.assertEqual(metadata(Group), None)
+        register(Group, serializer=lambda obj: {'id': obj.name})
+        group = Group(name='CoolGroup')
+        info = check(group)
+        self.assertIs(info, metadata(Group))
+        self.assertIs(info, metadata('Group'))
+        self.assertEqual(info.collection_name, 'group')
+        self.assertEqual(ActivityStreamSerializer().object_fragment(group),
+                         {'id': 'CoolGroup'})
+        self.assertRaises(RuntimeError, check, object())
+
+        unregister(Group)
+        self.assertEqual(metadata('Group'), None)
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from django.utils.six import text_type
+from django.utils.timezone import get_default_timezone, make_aware
+
+from actstream import settings as actstream_settings
+from actstream.models import Action
+from actstream.rendering import render, rendered_cache
+from .base import DataTestCase
+
+
+class RenderingTestCase(DataTestCase):
+
+    def tearDown(self):
+        actstream_settings.RENDER_CACHE_SIZE = 0
+        rendered_cache.clear()
+        super(RenderingTestCase, self).tearDown()
+
+    def test_render(self):
+        actions = list(Action.objects.all())
+        self.assertEqual(render(Action.objects.all()),
+                         [text_type(action) for action in actions])
+        self.assertEqual(render([]), [])
+
+    def test_cache(self):
+        actstream_settings.RENDER_CACHE_SIZE = 10
+        first = render(Action.objects.all())
+        self.user1.first_name = 'Jane'
+        self.user1.save()
+        self.assertEqual(render(Action.objects.all()), first)
+        self.assertEqual(rendered_cache.stats()['hits'], len(first))
+        rendered_cache.clear()
+        self.assertEqual(rendered_cache.maxsize, 10)
+        self.assertIn('Jane Dow commented on CoolGroup %s ago' % self.timesince,
+                      render(Action.objects.all()))
+
+    def test_aware_now(self):
+        now = datetime(2014, 1, 1)
+        aware = make_aware(now, get_default_timezone())
+        self.assertEqual(render(Action.objects.all(), now=aware),
+                         render(Action.objects.all(), now=now))
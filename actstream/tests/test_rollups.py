@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+from actstream import rollups
+from actstream import settings as actstream_settings
+from actstream.models import ActionCounter
+from actstream.signals import action
+from .base import DataTestCase
+
+
+class RollupsTestCase(DataTestCase):
+
+    def setUp(self):
+        actstream_settings.ROLLUPS = True
+        super(RollupsTestCase, self).setUp()
+
+    def tearDown(self):
+        actstream_settings.ROLLUPS = False
+        actstream_settings.ROLLUP_BUFFER_SIZE = 0
+        ActionCounter.drop_collection()
+        super(RollupsTestCase, self).tearDown()
+
+    def test_totals(self):
+        self.assertEqual(rollups.total('verb', 'joined'), 2)
+        self.assertEqual(rollups.total('actor', self.user1), 3)
+        self.assertEqual(rollups.total('target', self.group), 4)
+        self.assertEqual(rollups.total('actor', self.user3,
+                                       start=self.testdate + timedelta(days=1)), 0)
+
+    def test_series(self):
+        start = self.testdate - timedelta(days=1)
+        self.assertEqual(rollups.series('verb', 'joined', start, self.testdate),
+                         [(start, 0), (self.testdate, 2)])
+        hourly = rollups.series('verb', 'joined', self.testdate,
+                                self.testdate + timedelta(hours=2), period='hour')
+        self.assertEqual([count for _, count in hourly], [2, 0, 0])
+
+    def test_buffer(self):
+        actstream_settings.ROLLUP_BUFFER_SIZE = 100
+        timestamp = datetime(2000, 1, 2, 5)
+        for i in range(3):
+            action.send(self.user3, verb='liked', timestamp=timestamp)
+        self.assertEqual(rollups.total('verb', 'liked'), 0)
+        rollups.buffer.flush()
+        self.assertEqual(rollups.total('verb', 'liked'), 3)
+        self.assertEqual(ActionCounter.objects.get(
+            dimension='verb', key='liked').hours, {'5': 3})
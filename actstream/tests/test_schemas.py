@@ -0,0 +1,50 @@
+from mongoengine.django.auth import Group
+
+from actstream import indexes
+from actstream.models import Action, actor_stream
+from actstream.registry import RegistrationError, register
+from actstream.schemas import index_name
+from actstream.signals import action
+from .base import DataTestCase
+
+
+class SchemasTestCase(DataTestCase):
+
+    def setUp(self):
+        super(SchemasTestCase, self).setUp()
+        register(Group, data_schemas={'scored': {'score': float}})
+
+    def test_coercion(self):
+        scored = action.send(self.user1, verb='scored', target=self.group,
+                             score='4.5', comment='ok')[0][1]
+        self.assertEqual(Action.objects.get(pk=scored.pk).data,
+                         {'score': 4.5, 'comment': 'ok'})
+        self.assertRaises(ValueError, action.send, self.user1, verb='scored',
+                          score='high')
+        self.assertRaises(RegistrationError, register, self.User,
+                          data_schemas={'scored': {'score': int}})
+
+    def test_filters_and_indexes(self):
+        action.send(self.user1, verb='scored', score=2)
+        high = action.send(self.user1, verb='scored', score=5)[0][1]
+        action.send(self.user1, verb='joined', score=5)
+        self.assertEqual(list(actor_stream(self.user1, data__score__gte='3')),
+                         [high])
+        self.assertIn(index_name('scored', 'score'),
+                      Action._get_collection().index_information())
+        self.assertEqual(indexes.plan(Action), ([], []))
+
+    def test_several_verbs(self):
+        register(Group, data_schemas={'scored': {'score': float},
+                                      'rated': {'score': int}})
+        scored = action.send(self.user1, verb='scored', score='4.5')[0][1]
+        rated = action.send(self.user1, verb='rated', score='4')[0][1]
+        action.send(self.user1, verb='rated', score='2')
+        self.assertEqual(
+            set(actor_stream(self.user1, data__score__gte='3')),
+            set([scored, rated]))
+        self.assertEqual(list(actor_stream(self.user1, verb='rated',
+                                           data__score__gte='3')), [rated])
+        query = Action.objects.stream_queryset(
+            'actor', self.user1, data__score__gte='3')._query
+        self.assertEqual(len(query['$or']), 2)
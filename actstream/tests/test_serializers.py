@@ -0,0 +1,29 @@
+from actstream.models import Action, actor_stream
+from actstream.serializers import ActivityStreamSerializer
+from .base import DataTestCase
+
+
+class SerializerTestCase(DataTestCase):
+
+    def test_stream_page(self):
+        data = self.assertJSON(ActivityStreamSerializer().serialize(
+            actor_stream(self.user1)))
+        self.assertEqual(data['totalItems'], 3)
+        item, = [item for item in data['items']
+                 if item['verb'] == 'commented on']
+        self.assertEqual(item['actor']['displayName'], 'John Dow')
+        self.assertEqual(item['target'], {'objectType': 'group',
+                                          'id': str(self.group.pk),
+                                          'displayName': 'CoolGroup'})
+        self.assertEqual(item['published'], self.testdate.isoformat())
+        self.assertNotIn('object', item)
+
+    def test_queryset_batches(self):
+        serializer = ActivityStreamSerializer(batch_size=2)
+        resolved = []
+        object_fragment = serializer.object_fragment
+        serializer.object_fragment = lambda obj: resolved.append(obj) or object_fragment(obj)
+        items = list(serializer.iter_activities(Action.objects.public()))
+        self.assertEqual(len(items), 6)
+        self.assertEqual(len(resolved), len(set(resolved)))
+        self.assertEqual(len(resolved), 4)
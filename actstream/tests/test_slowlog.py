@@ -0,0 +1,50 @@
+from bson import ObjectId
+
+from actstream import settings as actstream_settings
+from actstream import slowlog
+from actstream.actions import is_following
+from actstream.models import Action, actor_stream, following, user_stream
+from .base import DataTestCase
+
+
+class SlowLogTestCase(DataTestCase):
+
+    def setUp(self):
+        super(SlowLogTestCase, self).setUp()
+        actstream_settings.SLOW_STREAM_LOG = True
+        slowlog.clear()
+
+    def tearDown(self):
+        actstream_settings.SLOW_STREAM_LOG = False
+        actstream_settings.SLOW_STREAM_THRESHOLD = 0.1
+        slowlog.clear()
+        super(SlowLogTestCase, self).tearDown()
+
+    def test_fingerprint(self):
+        small = Action.objects(id__in=[ObjectId() for i in range(5)])
+        large = Action.objects(id__in=[ObjectId() for i in range(8)])
+        self.assertEqual(slowlog.fingerprint(small), slowlog.fingerprint(large))
+        self.assertIn('<=10', slowlog.fingerprint(small))
+        self.assertNotEqual(
+            slowlog.fingerprint(small),
+            slowlog.fingerprint(Action.objects(id__in=[ObjectId()] * 20)))
+
+    def test_report(self):
+        actstream_settings.SLOW_STREAM_THRESHOLD = 0
+        actor_stream(self.user1)
+        actor_stream(self.user2)
+        user_stream(self.user1)
+        is_following(self.user1, self.user2)
+        entries = dict((entry.name, entry) for entry in slowlog.report())
+        self.assertEqual(set(entries), set(['actor', 'user', 'is_following']))
+        self.assertEqual(entries['actor'].calls, 2)
+        self.assertEqual(entries['actor'].slow_calls, 2)
+        self.assertIsNotNone(entries['actor'].plan)
+        self.assertIn('actor', slowlog.dump())
+
+    def test_following(self):
+        actstream_settings.SLOW_STREAM_THRESHOLD = 0
+        following(self.user1, self.User)
+        entry, = slowlog.report()
+        self.assertEqual(entry.name, 'following')
+        self.assertIn('_cls', entry.fingerprint)
@@ -0,0 +1,41 @@
+from actstream import settings as actstream_settings
+from actstream import unread
+from actstream.models import ReadState
+from actstream.signals import action
+from .base import DataTestCase
+
+
+class UnreadTestCase(DataTestCase):
+
+    def setUp(self):
+        actstream_settings.UNREAD_COUNTS = True
+        super(UnreadTestCase, self).setUp()
+
+    def tearDown(self):
+        actstream_settings.UNREAD_COUNTS = False
+        actstream_settings.UNREAD_CAP = 99
+        ReadState.drop_collection()
+        super(UnreadTestCase, self).tearDown()
+
+    def test_counts(self):
+        self.assertEqual(unread.unread_count(self.user1), 0)
+        self.assertEqual(unread.unread_count(self.user2), 0)
+        action.send(self.user2, verb='posted')
+        action.send(self.user3, verb='commented on', target=self.group)
+        action.send(self.group, verb='announced')
+        action.send(self.user2, verb='hidden', public=False)
+        self.assertEqual(unread.unread_count(self.user1), 1)
+        self.assertEqual(unread.unread_count(self.user2), 1)
+        self.assertEqual(unread.unread_count(self.user3), 0)
+
+        unread.mark_seen(self.user1)
+        self.assertEqual(unread.unread_count(self.user1), 0)
+        action.send(self.user2, verb='posted', timestamp=self.testdate)
+        self.assertEqual(unread.unread_count(self.user1), 0)
+
+    def test_cap(self):
+        actstream_settings.UNREAD_CAP = 2
+        unread.mark_seen(self.user1)
+        for i in range(3):
+            action.send(self.user2, verb='posted')
+        self.assertEqual(unread.unread_count(self.user1), 2)
@@ -0,0 +1,31 @@
+from actstream.compact import compact_document, expand_document
+from actstream.models import Verb
+from actstream.verbs import verbs
+from .base import ActivityBaseTestCase
+
+
+class VerbRegistryTestCase(ActivityBaseTestCase):
+
+    def tearDown(self):
+        verbs.clear()
+        Verb.drop_collection()
+        super(VerbRegistryTestCase, self).tearDown()
+
+    def test_interning(self):
+        joined = verbs.code_for('joined')
+        self.assertEqual(verbs.code_for('joined'), joined)
+        self.assertEqual(verbs.code_for('left'), joined + 1)
+        verbs.clear()
+        self.assertEqual(verbs.code_for('joined'), joined)
+        self.assertEqual(verbs.name_for(joined + 1), 'left')
+
+    def test_unknown(self):
+        self.assertEqual(verbs.code_for('never sent', create=False), None)
+        self.assertRaises(KeyError, verbs.name_for, 42)
+
+    def test_document_conversion(self):
+        doc = {'_id': 1, 'verb': 'joined', 'public': False, 'timestamp': None}
+        compacted = compact_document(doc)
+        self.assertEqual(compacted, {'_id': 1, 'v': verbs.code_for('joined'),
+                                     'f': 0, 'ts': None})
+        self.assertEqual(expand_document(compacted), doc)
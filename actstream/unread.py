@@ -0,0 +1,117 @@
+"""
+Unread counters and last seen markers of user streams.
+
+When ``ACTSTREAM_SETTINGS['UNREAD_COUNTS']`` is on, ``action_handler``
+increments the ``ReadState`` counter of every user following the actor of a
+new public action (or its target and action object, for follows that are not
+``actor_only``), so unread badges are read from one document instead of
+counting the user stream. Counters stop at ``UNREAD_CAP``.
+
+Example::
+
+    from actstream import unread
+
+    count = unread.unread_count(request.user)
+    if count >= unread.cap():
+        count = '%d+' % count
+    ...
+    unread.mark_seen(request.user)
+
+Users are tracked from their first ``unread_count`` or ``mark_seen`` call,
+actions recorded before that are not counted.
+"""
+from mongoengine.base import get_document
+
+from actstream import settings as actstream_settings
+
+try:
+    from django.utils import timezone
+    now = timezone.now
+except ImportError:
+    from datetime import datetime
+    now = datetime.now
+
+ROLES = ('actor', 'target', 'action_object')
+
+BATCH_SIZE = 1000
+
+
+def cap():
+    return actstream_settings.UNREAD_CAP
+
+
+def _collection():
+    return get_document('actstream.ReadState')._get_collection()
+
+
+def _increment(collection, user_ids, timestamp):
+    collection.update({
+        'user': {'$in': user_ids},
+        'unread': {'$lt': cap()},
+        'last_seen': {'$lt': timestamp},
+    }, {'$inc': {'unread': 1}}, multi=True)
+
+
+def record(action):
+    """
+    Counts action as unread for the tracked users whose stream it is in.
+    """
+    if not action.public:
+        return
+    Follow = get_document('actstream.Follow')
+    collection = _collection()
+    seen, batch = set(), []
+    for role in ROLES:
+        obj = getattr(action, role)
+        if obj is None:
+            continue
+        for user_id in Follow.objects.follower_ids(
+                obj, include_actor_only=role == 'actor'):
+            if user_id in seen:
+                continue
+            seen.add(user_id)
+            batch.append(user_id)
+            if len(batch) >= BATCH_SIZE:
+                _increment(collection, batch, action.timestamp)
+                batch = []
+    if batch:
+        _increment(collection, batch, action.timestamp)
+
+
+def read_state(user):
+    """
+    Returns the raw ``ReadState`` of user, starting to track it if needed.
+    """
+    collection = _collection()
+    state = collection.find_one({'user': user.pk})
+    if state is None:
+        collection.update({'user': user.pk}, {
+            '$setOnInsert': {'last_seen': now(), 'unread': 0},
+        }, upsert=True)
+        state = collection.find_one({'user': user.pk})
+    return state
+
+
+def unread_count(user):
+    """
+    Returns the number of unread actions in the stream of user, at most
+    ``UNREAD_CAP``.
+    """
+    return read_state(user)['unread']
+
+
+def last_seen(user):
+    """
+    Returns when user last saw their stream.
+    """
+    return read_state(user)['last_seen']
+
+
+def mark_seen(user, timestamp=None):
+    """
+    Marks the stream of user as seen up to timestamp (now by default) and
+    resets its unread counter.
+    """
+    _collection().update({'user': user.pk}, {
+        '$set': {'last_seen': timestamp or now(), 'unread': 0},
+    }, upsert=True)
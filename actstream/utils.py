@@ -0,0 +1,147 @@
+"""
+Helpers for working with raw (undereferenced) generic references.
+"""
+from bson import DBRef, ObjectId, SON
+
+from mongoengine import connection
+from mongoengine.base import get_document
+
+from actstream.cache import cache_document, cached_document, reference_cache
+
+
+def db_field(document_class, name):
+    """
+    Returns the name under which a field of document_class is stored.
+    """
+    return document_class._fields[name].db_field
+
+
+def generic_ref(obj):
+    """
+    Returns the SON stored by a ``GenericReferenceField`` for obj, a document
+    or a raw generic reference.
+    """
+    if isinstance(obj, dict):
+        return SON((('_cls', obj['_cls']), ('_ref', obj['_ref'])))
+    return SON((('_cls', obj._class_name),
+                ('_ref', DBRef(obj._get_collection_name(), obj.pk))))
+
+
+def ref_key(value):
+    """
+    Returns a hashable ``(class name, id)`` key for either a document or a
+    raw generic reference.
+    """
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        ref = value['_ref']
+        return value['_cls'], getattr(ref, 'id', ref)
+    return value._class_name, value.pk
+
+
+def ref_string(value):
+    """
+    Returns ``ref_key`` as a ``"ClassName:id"`` string.
+    """
+    return '%s:%s' % ref_key(value)
+
+
+def bulk_dereference(values):
+    """
+    Resolves raw generic references with one query per document class.
+
+    Returns a dict mapping ``ref_key`` to documents. Missing documents are
+    left out and documents passed in are used as they are. Documents in the
+    reference cache are not fetched again.
+    """
+    resolved, wanted = {}, {}
+    for value in values:
+        key = ref_key(value)
+        if key is None or key in resolved:
+            continue
+        if not isinstance(value, dict):
+            resolved[key] = value
+            continue
+        doc = cached_document(key) if reference_cache.maxsize else None
+        if doc is not None:
+            resolved[key] = doc
+        else:
+            wanted.setdefault(key[0], set()).add(key[1])
+    for cls_name, ids in wanted.items():
+        for pk, doc in get_document(cls_name).objects.in_bulk(list(ids)).items():
+            resolved[(cls_name, pk)] = doc
+            if reference_cache.maxsize:
+                cache_document((cls_name, pk), doc)
+    return resolved
+
+
+def dereference_actions(actions, roles=('actor', 'target', 'action_object')):
+    """
+    Resolves the generic references of a page of actions with one query per
+    document class instead of one per reference. Returns actions.
+    """
+    refs = []
+    for action in actions:
+        refs.extend(action._data.get(role) for role in roles)
+    resolved = bulk_dereference(refs)
+    for action in actions:
+        for role in roles:
+            value = action._data.get(role)
+            if isinstance(value, dict):
+                action._data[role] = resolved.get(ref_key(value))
+    return actions
+
+
+def split_id_range(collection, query, parts):
+    """
+    Splits the documents of collection (or of a list of collections)
+    matching query into up to parts ``(lowest, highest)`` ``_id`` ranges of
+    about equal time spans. Bounds are ``None`` at both ends; ``lowest`` is
+    inclusive and ``highest`` exclusive.
+    """
+    if not isinstance(collection, (list, tuple)):
+        collection = [collection]
+    firsts = [doc for doc in (
+        each.find_one(query, {'_id': 1}, sort=[('_id', 1)])
+        for each in collection) if doc is not None]
+    lasts = [doc for doc in (
+        each.find_one(query, {'_id': 1}, sort=[('_id', -1)])
+        for each in collection) if doc is not None]
+    if not firsts or parts < 2 or not all(
+            isinstance(doc['_id'], ObjectId) for doc in firsts + lasts):
+        return [(None, None)]
+    first = min(firsts, key=lambda doc: doc['_id'])
+    last = max(lasts, key=lambda doc: doc['_id'])
+    start = first['_id'].generation_time
+    step = (last['_id'].generation_time - start) // parts
+    if not step:
+        return [(None, None)]
+    bounds = [ObjectId.from_datetime(start + step * i) for i in range(1, parts)]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def id_range_query(query, lowest=None, highest=None):
+    """
+    Returns a copy of query limited to ``_id``s in ``[lowest, highest)``.
+    """
+    query = dict(query)
+    bounds = {}
+    if lowest is not None:
+        bounds['$gte'] = lowest
+    if highest is not None:
+        bounds['$lt'] = highest
+    if bounds:
+        query['_id'] = bounds
+    return query
+
+
+def reset_connections(*document_classes):
+    """
+    Drops MongoDB connections inherited from a parent process so that a
+    worker process opens its own.
+    """
+    for alias in list(connection._connections):
+        connection.disconnect(alias)
+    for document_class in document_classes:
+        document_class._collection = None
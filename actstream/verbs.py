@@ -0,0 +1,83 @@
+from threading import Lock
+
+from django.utils.six import text_type
+
+from mongoengine.base import get_document
+from pymongo.errors import DuplicateKeyError
+
+
+class VerbRegistry(object):
+    """
+    Maps verbs to the small integer codes stored by compact encoded actions.
+
+    Codes are kept in the ``Verb`` collection and cached in process; a code
+    never changes once it has been given out.
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.names = {}
+        self.lock = Lock()
+
+    @property
+    def collection(self):
+        return get_document('actstream.Verb')._get_collection()
+
+    def remember(self, code, name):
+        with self.lock:
+            self.codes[name] = code
+            self.names[code] = name
+        return code
+
+    def code_for(self, name, create=True):
+        """
+        Returns the code of a verb, allocating a new one if needed.
+
+        With ``create=False`` unknown verbs return ``None``.
+        """
+        name = text_type(name)
+        try:
+            return self.codes[name]
+        except KeyError:
+            pass
+        doc = self.collection.find_one({'name': name})
+        if doc is not None:
+            return self.remember(doc['_id'], name)
+        if not create:
+            return None
+        while True:
+            last = self.collection.find_one(sort=[('_id', -1)])
+            code = last['_id'] + 1 if last else 1
+            try:
+                self.collection.insert({'_id': code, 'name': name})
+            except DuplicateKeyError:
+                # Either someone else took this code or interned the verb
+                doc = self.collection.find_one({'name': name})
+                if doc is not None:
+                    return self.remember(doc['_id'], name)
+                continue
+            return self.remember(code, name)
+
+    def name_for(self, code):
+        """
+        Returns the verb stored under code.
+        """
+        try:
+            return self.names[code]
+        except KeyError:
+            pass
+        doc = self.collection.find_one({'_id': code})
+        if doc is None:
+            raise KeyError('Unknown verb code %r' % code)
+        self.remember(code, doc['name'])
+        return doc['name']
+
+    def clear(self):
+        """
+        Empties the in-process cache.
+        """
+        with self.lock:
+            self.codes.clear()
+            self.names.clear()
+
+verbs = VerbRegistry()
@@ -10,6 +10,9 @@ setup(name='django-activity-stream',
       author_email='justquick@gmail.com',
       url='http://github.com/justquick/django-activity-stream',
       packages=['actstream',
+                'actstream.backends',
+                'actstream.management',
+                'actstream.management.commands',
                 'actstream.tests'],
       package_data={'actstream': ['locale/*/LC_MESSAGES/*.po']},
       zip_safe=False,